@@ -1,15 +1,13 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-初始化日志读取器状态文件（Docker版本）
-读取 Docker 容器中的日志文件，将 last_positions 设置为文件大小（最新位置），
-将 last_files 设置为对应的日志文件名
+初始化日志读取器状态（Docker版本）
+读取 Docker 容器中的日志文件，将读取位置设置为文件大小（最新位置），
+并记录对应的日志文件名和 inode，写入 logs/log_reader_state.db
 """
 
 import os
-import json
 import subprocess
-from datetime import datetime
 import sys
 
 # 添加 lc_agent 目录到路径，以便导入 DockerLogReader
@@ -18,16 +16,12 @@ if lc_agent_path not in sys.path:
     sys.path.insert(0, lc_agent_path)
 
 try:
-    from agent import DockerLogReader, LOG_FILES_CONFIG
+    from agent import DockerLogReader, LOG_FILES_CONFIG, STATE_DB, docker_readers, save_log_reader_state
 except ImportError as e:
     print(f"错误：无法导入 agent 模块: {e}")
     print(f"请确保 lc_agent/agent.py 文件存在且可访问")
     sys.exit(1)
 
-# 日志状态文件路径（与 agent.py 保持一致）
-LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
-STATE_FILE = os.path.join(LOG_DIR, "log_reader_state.json")
-
 
 def get_docker_log_file_info(docker_reader: DockerLogReader, node_pattern: str):
     """
@@ -38,7 +32,7 @@ def get_docker_log_file_info(docker_reader: DockerLogReader, node_pattern: str):
         node_pattern: 节点匹配模式（如 'namenode', 'datanode'）
     
     Returns:
-        (文件大小, 文件名) 或 (None, None) 如果未找到
+        (文件大小, 文件名, inode) 或 (None, None, None) 如果未找到
     """
     try:
         # 检查容器是否运行
@@ -52,13 +46,13 @@ def get_docker_log_file_info(docker_reader: DockerLogReader, node_pattern: str):
         
         if check_result.returncode != 0 or docker_reader.container not in check_result.stdout:
             print(f"  [{docker_reader.container}] 容器未运行，无法获取日志文件信息")
-            return None, None
+            return None, None, None
         
         # 列出日志文件
         log_files = docker_reader.list_log_files(node_pattern)
         if not log_files:
             print(f"  [{docker_reader.container}] 未找到匹配的日志文件（模式: {node_pattern}）")
-            return None, None
+            return None, None, None
         
         # 获取文件修改时间，找到最新的文件
         log_files_with_time = []
@@ -69,46 +63,26 @@ def get_docker_log_file_info(docker_reader: DockerLogReader, node_pattern: str):
         
         if not log_files_with_time:
             print(f"  [{docker_reader.container}] 无法读取日志文件的时间信息")
-            return None, None
+            return None, None, None
         
         # 按修改时间排序，获取最新的日志文件
         log_files_with_time.sort(key=lambda x: x[1], reverse=True)
         latest_file = log_files_with_time[0][0]
         
-        # 获取文件大小（通过 docker exec 执行 stat 命令）
-        try:
-            if not os.path.isabs(latest_file):
-                file_path = os.path.join(docker_reader.log_path, latest_file)
-            else:
-                file_path = latest_file
-            
-            # 使用 stat 命令获取文件大小
-            result = subprocess.run(
-                f'docker exec {docker_reader.container} sh -c "stat -c %s {file_path} 2>&1"',
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            
-            if result.returncode == 0:
-                try:
-                    file_size = int(result.stdout.strip())
-                    print(f"  [{docker_reader.container}] 找到日志文件: {latest_file}, 大小: {file_size} 字节")
-                    return file_size, latest_file
-                except ValueError:
-                    print(f"  [{docker_reader.container}] 无法解析文件大小: {result.stdout.strip()}")
-                    return None, None
-            else:
-                print(f"  [{docker_reader.container}] 无法获取文件大小: {result.stderr}")
-                return None, None
-        except Exception as e:
-            print(f"  [{docker_reader.container}] 无法获取文件大小: {e}")
-            return None, None
+        # 获取文件大小和 inode（目录元数据探测结果）
+        file_info = (docker_reader.probe_log_files() or {}).get(os.path.basename(latest_file))
+        if not file_info:
+            print(f"  [{docker_reader.container}] 无法获取文件大小: {latest_file}")
+            return None, None, None
+        
+        file_size = file_info["size"]
+        print(f"  [{docker_reader.container}] 找到日志文件: {latest_file}, 大小: {file_size} 字节")
+        # 一并返回 inode，读取时据此检测初始化之后发生的轮转
+        return file_size, latest_file, file_info["inode"]
         
     except Exception as e:
         print(f"  [{docker_reader.container}] 错误: {e}")
-        return None, None
+        return None, None, None
 
 
 def main():
@@ -120,9 +94,9 @@ def main():
     num_log_files = len(LOG_FILES_CONFIG)  # 5个日志文件
     last_positions = [0] * num_log_files
     last_files = [None] * num_log_files
+    last_inodes = [None] * num_log_files
     
-    # 初始化Docker读取器（按container分组）
-    docker_readers = {}
+    # 初始化Docker读取器（按container分组，与 agent.py 共用）
     for log_config in LOG_FILES_CONFIG:
         if log_config["type"] == "docker":
             container = log_config.get("container")
@@ -149,10 +123,11 @@ def main():
                 print(f"  [{display_name}] ✗ Docker 读取器未初始化")
                 continue
             
-            file_size, file_name = get_docker_log_file_info(docker_reader, node_pattern)
+            file_size, file_name, inode = get_docker_log_file_info(docker_reader, node_pattern)
             if file_size is not None and file_name is not None:
                 last_positions[i] = file_size
                 last_files[i] = file_name
+                last_inodes[i] = inode
                 print(f"  [{display_name}] ✓ 设置位置: {file_size}, 文件: {file_name}")
             else:
                 print(f"  [{display_name}] ✗ 无法获取日志文件信息，保持默认值 0")
@@ -160,30 +135,18 @@ def main():
             # 其他类型（local/ssh）暂不支持，跳过
             print(f"  [{display_name}] ⚠ 跳过非Docker类型: {log_config['type']}")
     
-    # 保存状态到文件
-    print(f"\n保存状态到文件...")
+    # 保存状态（所有节点一次提交）
+    print(f"\n保存状态...")
     try:
-        # 确保日志目录存在
-        os.makedirs(LOG_DIR, exist_ok=True)
-        
-        state = {
-            'last_positions': last_positions,
-            'last_files': last_files,
-            'last_update': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'init_by': 'init_log_reader_state.py (Docker版本)'
-        }
-        
-        with open(STATE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(state, f, indent=2, ensure_ascii=False)
+        save_log_reader_state(last_positions, last_files, last_inodes)
         
-        print(f"  ✓ 状态已保存到: {STATE_FILE}")
+        print(f"  ✓ 状态已保存到: {STATE_DB}")
         print(f"\n状态内容:")
         print(f"  last_positions: {last_positions}")
         print(f"  last_files: {last_files}")
-        print(f"  last_update: {state['last_update']}")
         
     except Exception as e:
-        print(f"  ✗ 保存状态文件失败: {e}")
+        print(f"  ✗ 保存状态失败: {e}")
         return 1
     
     print("\n" + "=" * 60)
@@ -10,6 +10,10 @@ import json
 import re
 import logging
 import subprocess
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from typing import Dict, List, Optional, Tuple, Any
 from datetime import datetime
 import paramiko
@@ -27,6 +31,27 @@ website_search = TavilySearch(max_results=2, tavily_api_key=os.getenv("TAVILY_AP
 
 from langchain_community.tools.shell.tool import ShellTool
 
+try:
+    from .log_parser import parse_log_line, parse_log_lines, extract_timestamp
+    from .log_follower import (
+        LogFollowerManager,
+        open_docker_tail_stream,
+        open_local_tail_stream,
+        open_ssh_tail_stream
+    )
+    from .log_state_store import LogReaderStateStore
+    from .log_archive import LogArchive
+except ImportError:
+    from lc_agent.log_parser import parse_log_line, parse_log_lines, extract_timestamp
+    from lc_agent.log_follower import (
+        LogFollowerManager,
+        open_docker_tail_stream,
+        open_local_tail_stream,
+        open_ssh_tail_stream
+    )
+    from lc_agent.log_state_store import LogReaderStateStore
+    from lc_agent.log_archive import LogArchive
+
 shell = ShellTool()
 # ==================== 配置常量 ====================
 
@@ -129,7 +154,8 @@ SSH_CONFIG = {
 
 # 路径配置
 LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs")
-STATE_FILE = os.path.join(LOG_DIR, "log_reader_state.json")
+STATE_FILE = os.path.join(LOG_DIR, "log_reader_state.json")  # 旧版状态文件，首次启动时导入
+STATE_DB = os.path.join(LOG_DIR, "log_reader_state.db")
 os.makedirs(LOG_DIR, exist_ok=True)
 
 # 日志过滤配置
@@ -138,6 +164,24 @@ FILTER_CLASSPATH_LOGS = True  # 是否过滤classpath行
 
 # 日志读取配置
 DEFAULT_MAX_LINES = 200  # 默认读取日志行数
+LOG_READ_PARALLEL = True  # 是否并发读取所有节点日志
+LOG_READ_NODE_TIMEOUT = 15  # 单个节点读取超时（秒），从该节点实际开始读取时计时
+LOG_READ_POLL_DEADLINE = 30  # 一次完整读取的总截止时间（秒），同一容器的节点排队读取时由它兜底
+METADATA_PROBE_TTL = 2.0  # 日志目录元数据（文件名、大小、mtime、inode）缓存时间（秒）
+LOG_SNAPSHOT_TTL = 60.0  # 只读工具的日志快照缓存时间（秒），每轮对话开始时也会清空
+
+# 日志归档配置（get_cluster_logs 读取到的新日志写入本地压缩归档，供历史检索）
+LOG_ARCHIVE_ENABLED = os.getenv("LOG_ARCHIVE_ENABLED", "true").lower() in ("1", "true", "yes")
+LOG_ARCHIVE_DIR = os.path.join(LOG_DIR, "archive")
+LOG_ARCHIVE_RETENTION_DAYS = 7  # 归档保留天数
+
+# 日志跟随配置（开启后后台常驻 tail -F，工具直接读取内存缓冲区）
+LOG_FOLLOW_ENABLED = os.getenv("LOG_FOLLOW_ENABLED", "false").lower() in ("1", "true", "yes")
+LOG_FOLLOW_BUFFER_LINES = 5000  # 每个节点缓冲区保留的行数
+
+# 监控指标配置
+SAVE_METRICS_SNAPSHOT_FILE = os.getenv("SAVE_METRICS_SNAPSHOT_FILE", "false").lower() in ("1", "true", "yes")  # 是否每次生成 metrics_<时间>.txt
+METRIC_TREND_MAX_POINTS = 12  # 趋势查询返回的最多采样点数
 
 # vLLM 配置
 VLLM_BASE_URL = "http://10.157.197.76:8001/v1"
@@ -150,51 +194,294 @@ THIRD_PARTY_API_KEY = os.getenv("API_KEY", "")  # 第三方 API key（DeepSeek 
 # 全局变量
 ssh_readers = {}  # 保留用于兼容性
 docker_readers = {}  # Docker日志读取器
+log_follower_manager = LogFollowerManager(LOG_FOLLOW_BUFFER_LINES, DEFAULT_MAX_LINES)  # 日志跟随器
+
+# ==================== Docker exec 会话池 ====================
+
+EXEC_SESSION_ERROR = -1  # 会话无法建立或读写失败时的返回码
+EXEC_TIMEOUT = -2  # 命令超时时的返回码
+
+class DockerExecSession:
+    """
+    常驻的 docker exec 会话
+
+    每个容器保持一个 `docker exec -i <container> sh` 进程，通过 stdin/stdout 管道
+    依次发送命令，命令结束后输出带随机标记的结束行（包含返回码），
+    从而避免每次读取日志都重新创建进程和 exec 实例。
+    """
+
+    def __init__(self, container: str):
+        self.container = container
+        self.proc: Optional[subprocess.Popen] = None
+        self._buffer = bytearray()
+        self._cond = threading.Condition()
+        self._lock = threading.Lock()  # 同一会话内的命令串行执行
+        self._eof = False
+
+    def is_alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None and not self._eof
+
+    def start(self) -> bool:
+        """启动 docker exec 会话"""
+        self.close()
+        try:
+            self.proc = subprocess.Popen(
+                ["docker", "exec", "-i", self.container, "sh"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                bufsize=0
+            )
+        except Exception as e:
+            logging.warning(f"启动 docker exec 会话失败 (容器: {self.container}): {e}")
+            self.proc = None
+            return False
+
+        with self._cond:
+            self._buffer = bytearray()
+            self._eof = False
+        reader = threading.Thread(
+            target=self._read_loop,
+            args=(self.proc,),
+            name=f"docker-exec-{self.container}",
+            daemon=True
+        )
+        reader.start()
+
+        # 用一条空命令确认容器可用（容器未运行时 docker exec 会立即退出）
+        returncode, _ = self._run_locked(":", timeout=10)
+        if returncode != 0:
+            logging.warning(f"容器 {self.container} 未运行或无法 exec，会话不可用")
+            self.close()
+            return False
+        return True
+
+    def _read_loop(self, proc: subprocess.Popen):
+        """后台线程：持续读取 stdout 到缓冲区"""
+        try:
+            while True:
+                chunk = proc.stdout.read(65536)
+                if not chunk:
+                    break
+                with self._cond:
+                    if proc is not self.proc:
+                        break
+                    self._buffer.extend(chunk)
+                    self._cond.notify_all()
+        except Exception:
+            pass
+        finally:
+            with self._cond:
+                if proc is self.proc:
+                    self._eof = True
+                self._cond.notify_all()
+
+    def run(self, command: str, timeout: float = 10) -> Tuple[int, bytes]:
+        """
+        在会话中执行一条 shell 命令
+
+        Args:
+            command: shell 命令（stdin 已重定向到 /dev/null，stderr 合并到 stdout）
+            timeout: 超时时间（秒）
+
+        Returns:
+            (返回码, 输出字节)，会话不可用时返回码为 EXEC_SESSION_ERROR，命令超时时为 EXEC_TIMEOUT
+        """
+        with self._lock:
+            if not self.is_alive() and not self.start():
+                return EXEC_SESSION_ERROR, b""
+            return self._run_locked(command, timeout)
+
+    def _run_locked(self, command: str, timeout: float) -> Tuple[int, bytes]:
+        marker = f"__RCA_EOC_{uuid.uuid4().hex}__".encode()
+        # 标记前固定输出一个换行，解析时去掉，保证命令输出逐字节原样返回
+        script = (
+            f"( {command} ) </dev/null 2>&1\n"
+            f"printf '\\n%s:%d\\n' '{marker.decode()}' \"$?\"\n"
+        ).encode("utf-8")
+        try:
+            self.proc.stdin.write(script)
+            self.proc.stdin.flush()
+        except Exception as e:
+            logging.warning(f"向 docker exec 会话写入命令失败 (容器: {self.container}): {e}")
+            self.close()
+            return EXEC_SESSION_ERROR, b""
+
+        needle = b"\n" + marker + b":"
+
+        def _locate() -> Optional[Tuple[int, int]]:
+            idx = self._buffer.find(needle)
+            if idx == -1:
+                return None
+            line_end = self._buffer.find(b"\n", idx + len(needle))
+            return (idx, line_end) if line_end != -1 else None
+
+        with self._cond:
+            found = self._cond.wait_for(lambda: self._eof or _locate() is not None, timeout=timeout)
+            location = _locate() if found else None
+            if location is None:
+                status = "超时" if not found else "已断开"
+                logging.warning(f"docker exec 会话{status} (容器: {self.container})，命令: {command[:200]}")
+                output, eof = b"", True
+                returncode = EXEC_TIMEOUT if not found else EXEC_SESSION_ERROR
+            else:
+                idx, line_end = location
+                output = bytes(self._buffer[:idx])
+                returncode = int(self._buffer[idx + len(needle):line_end] or b"-1")
+                del self._buffer[:line_end + 1]
+                eof = False
+        if eof:
+            # 会话状态未知（可能有残留输出），直接丢弃，下次调用重新建立
+            self.close()
+            return returncode, b""
+        return returncode, output
+
+    def close(self):
+        """关闭会话"""
+        proc, self.proc = self.proc, None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+        except Exception:
+            pass
+        try:
+            proc.kill()
+            proc.wait(timeout=5)
+        except Exception:
+            pass
+
+
+class DockerSessionPool:
+    """按容器复用 DockerExecSession"""
+
+    def __init__(self):
+        self._sessions: Dict[str, DockerExecSession] = {}
+        self._lock = threading.Lock()
+
+    def get(self, container: str) -> DockerExecSession:
+        with self._lock:
+            session = self._sessions.get(container)
+            if session is None:
+                session = DockerExecSession(container)
+                self._sessions[container] = session
+            return session
+
+    def close_all(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+
+docker_session_pool = DockerSessionPool()
+
+
+def _quote_sh(value: str) -> str:
+    """为 sh 单引号包裹字符串"""
+    return "'" + value.replace("'", "'\"'\"'") + "'"
+
 
 # ==================== Docker 日志读取器类 ====================
 
 class DockerLogReader:
-    """通过 Docker exec 读取容器日志文件"""
+    """通过 Docker exec 读取容器日志文件（复用常驻 exec 会话）"""
     
-    def __init__(self, container: str, log_path: str):
+    def __init__(self, container: str, log_path: str, use_session: bool = True):
         self.container = container
         self.log_path = log_path
-        self._connected = True  # Docker exec不需要持久连接
+        self.use_session = use_session
+        self._connected = True  # 会话按需建立，失败时回退到一次性 docker exec
+        self._probe_lock = threading.Lock()
+        self._probe_cache: Optional[Dict[str, Dict[str, Any]]] = None
+        self._probe_time = 0.0
     
-    def list_log_files(self, node_pattern: Optional[str] = None) -> List[str]:
-        """列出容器中的日志文件"""
+    def _exec(self, command: str, timeout: float = 10) -> Tuple[int, bytes]:
+        """
+        在容器内执行 shell 命令
+
+        优先走常驻会话；会话无法建立或读写失败时回退到一次性 `docker exec sh -c`。
+        命令超时不回退：同一条命令再执行一次多半同样超时，只会让调用方等待两倍时间。
+
+        Returns:
+            (返回码, 输出字节)，超时时返回码为 EXEC_TIMEOUT
+        """
+        if self.use_session:
+            returncode, output = docker_session_pool.get(self.container).run(command, timeout=timeout)
+            if returncode != EXEC_SESSION_ERROR:
+                return returncode, output
         try:
-            # 首先检查容器是否运行
-            check_result = subprocess.run(
-                f'docker ps --format "{{{{.Names}}}}" | findstr /C:"{self.container}"',
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            
-            if check_result.returncode != 0 or self.container not in check_result.stdout:
-                logging.warning(f"容器 {self.container} 未运行，无法列出日志文件")
-                return []
-            
-            # 使用docker exec执行ls命令（兼容Windows PowerShell）
-            # 先尝试列出所有文件，包括.log和.audit文件
             result = subprocess.run(
-                f'docker exec {self.container} sh -c "ls -1 {self.log_path} 2>&1"',
-                shell=True,
+                ["docker", "exec", self.container, "sh", "-c", f"{command} 2>&1"],
                 capture_output=True,
-                text=True,
-                timeout=10
+                timeout=timeout
+            )
+            return result.returncode, result.stdout or result.stderr
+        except subprocess.TimeoutExpired:
+            logging.error(f"docker exec 超时 (容器: {self.container}): {command[:200]}")
+            return EXEC_TIMEOUT, b""
+    
+    def _full_path(self, file_path: str) -> str:
+        # 如果文件路径不是绝对路径，拼接日志目录；容器内路径统一使用正斜杠
+        if not file_path.startswith("/") and not os.path.isabs(file_path):
+            file_path = os.path.join(self.log_path, file_path)
+        return file_path.replace('\\', '/')
+
+    def probe_log_files(self, since: Optional[float] = None) -> Optional[Dict[str, Dict[str, Any]]]:
+        """
+        一次 exec 获取日志目录下所有文件的元数据
+        
+        同一容器的多个日志配置共享同一份结果：
+        - since 为 None 时，缓存在 METADATA_PROBE_TTL 秒内有效
+        - since 不为 None 时（time.monotonic() 时间戳），缓存只要在 since 之后采集即有效，
+          用于保证一次完整读取中每个容器只探测一次
+        
+        Returns:
+            {文件名: {"size": 字节数, "mtime": 修改时间, "inode": inode}}，失败返回 None
+        """
+        with self._probe_lock:
+            now = time.monotonic()
+            if self._probe_cache is not None:
+                if since is not None and self._probe_time >= since:
+                    return self._probe_cache
+                if since is None and now - self._probe_time < METADATA_PROBE_TTL:
+                    return self._probe_cache
+            
+            returncode, output = self._exec(
+                f"cd {_quote_sh(self.log_path)} && stat -c '%F|%s|%Y|%i|%n' -- * 2>/dev/null; true"
             )
+            if returncode != 0:
+                logging.warning(f"无法获取容器 {self.container} 的日志目录元数据（容器可能未运行）: {output.decode('utf-8', errors='ignore')}")
+                return None
             
-            if result.returncode != 0:
-                logging.warning(f"无法列出容器 {self.container} 的日志文件: {result.stderr}")
+            files = {}
+            for line in output.decode('utf-8', errors='ignore').splitlines():
+                parts = line.split('|', 4)
+                if len(parts) != 5 or not parts[0].startswith('regular'):
+                    continue
+                try:
+                    files[parts[4]] = {
+                        "size": int(parts[1]),
+                        "mtime": float(parts[2]),
+                        "inode": parts[3]
+                    }
+                except ValueError:
+                    continue
+            
+            self._probe_cache = files
+            self._probe_time = now
+            return files
+    
+    def list_log_files(self, node_pattern: Optional[str] = None) -> List[str]:
+        """列出容器中的日志文件"""
+        try:
+            files = self.probe_log_files()
+            if files is None:
                 return []
             
-            files = result.stdout.strip().split('\n')
-            files = [f for f in files if f.strip()]  # 移除空行
             # 包含.log和.audit文件（Hadoop的日志文件）
-            log_files = [f for f in files if f.endswith(".log") or f.endswith(".audit") or f.endswith(".out")]
+            log_files = sorted(f for f in files if f.endswith(".log") or f.endswith(".audit") or f.endswith(".out"))
             
             if node_pattern:
                 log_files = [f for f in log_files if node_pattern.lower() in f.lower()]
@@ -205,95 +492,96 @@ class DockerLogReader:
             return []
     
     def read_log_file(self, file_path: str, start_pos: int = 0, 
-                     max_lines: Optional[int] = None) -> Tuple[str, int]:
-        """从容器文件读取日志"""
+                     max_lines: Optional[int] = None,
+                     known_inode: Optional[str] = None) -> Tuple[str, int, Optional[str]]:
+        """
+        从容器文件按字节偏移增量读取日志
+        
+        - start_pos == 0 且指定 max_lines：读取文件末尾 max_lines 行（首次读取）
+        - 其他情况：从字节偏移 start_pos 开始向后读取（最多 max_lines 行）
+        - 通过 inode + 文件大小检测日志轮转，轮转后从新文件开头读取
+        - 只返回完整的行，返回的新位置是已读取内容末尾的精确字节偏移
+        
+        读取器本身不记录 inode：known_inode 由调用方传入与 start_pos 一起保存的值，
+        只读的查看不会影响下一次增量读取的轮转判断。
+        
+        Args:
+            known_inode: 读取到 start_pos 时文件的 inode（None 表示不按 inode 判断轮转）
+        
+        Returns:
+            (日志内容, 新的字节偏移, 读取时文件的 inode)
+        
+        Raises:
+            RuntimeError: 读取失败（文件不存在、容器不可达、exec 超时等），与"没有新内容"区分
+        """
         try:
-            # 如果文件路径不是绝对路径，拼接日志目录
-            if not os.path.isabs(file_path):
-                file_path = os.path.join(self.log_path, file_path)
+            file_path = self._full_path(file_path)
+            quoted_path = _quote_sh(file_path)
+            known_inode = known_inode or ""
+            tail_mode = start_pos == 0 and bool(max_lines)
+            line_limit = f" | head -n {int(max_lines)}" if max_lines else ""
+            
+            # 一次 exec 完成：stat（inode、大小）、轮转判断、按字节偏移读取
+            # 读取范围限定在 stat 时刻的文件大小以内，保证返回的偏移与内容一致
+            command = (
+                f"st=$(stat -c '%i %s' {quoted_path}) || exit 1; "
+                f"ino=${{st% *}}; sz=${{st#* }}; off={int(start_pos)}; "
+                f"if [ \"$sz\" -lt \"$off\" ] || {{ [ -n '{known_inode}' ] && [ \"$ino\" != '{known_inode}' ]; }}; then off=0; fi; "
+                f"echo \"$ino $sz $off\"; "
+            )
+            if tail_mode:
+                command += f"head -c \"$sz\" {quoted_path} | tail -n {int(max_lines)}"
+            else:
+                command += (
+                    f"if [ \"$sz\" -gt \"$off\" ]; then "
+                    f"tail -c +$((off + 1)) {quoted_path} | head -c $((sz - off)){line_limit}; fi"
+                )
             
-            # 确保路径使用正斜杠（容器内路径）
-            file_path = file_path.replace('\\', '/')
+            returncode, output = self._exec(command)
             
-            # 使用docker exec执行tail命令读取日志（兼容Windows PowerShell）
-            # 注意：start_pos的处理比较简化，实际应该更精确
-            if max_lines:
-                # 读取指定行数（从文件末尾或指定位置）
-                if start_pos == 0:
-                    # 从文件末尾读取
-                    # 转义文件路径中的特殊字符，使用单引号包裹路径
-                    escaped_path = file_path.replace("'", "'\"'\"'")
-                    result = subprocess.run(
-                        f'docker exec {self.container} sh -c "tail -n {max_lines} \'{escaped_path}\' 2>&1"',
-                        shell=True,
-                        capture_output=True,
-                        text=True,
-                        timeout=10
-                    )
-                else:
-                    # 从指定位置读取（简化处理：使用行号）
-                    escaped_path = file_path.replace("'", "'\"'\"'")
-                    result = subprocess.run(
-                        f'docker exec {self.container} sh -c "tail -n +{max(1, start_pos//100)} \'{escaped_path}\' 2>&1 | head -n {max_lines}"',
-                        shell=True,
-                        capture_output=True,
-                        text=True,
-                        timeout=10
-                    )
-            else:
-                # 读取全部（从指定位置）
-                escaped_path = file_path.replace("'", "'\"'\"'")
-                if start_pos == 0:
-                    result = subprocess.run(
-                        f'docker exec {self.container} sh -c "cat \'{escaped_path}\' 2>&1"',
-                        shell=True,
-                        capture_output=True,
-                        text=True,
-                        timeout=10
-                    )
-                else:
-                    result = subprocess.run(
-                        f'docker exec {self.container} sh -c "tail -c +{start_pos} \'{escaped_path}\' 2>&1"',
-                        shell=True,
-                        capture_output=True,
-                        text=True,
-                        timeout=10
-                    )
+            if returncode != 0:
+                error_msg = output.decode('utf-8', errors='ignore').strip()
+                raise RuntimeError(f"返回码 {returncode}: {error_msg}")
             
-            if result.returncode != 0:
-                error_msg = result.stderr if result.stderr else result.stdout
-                logging.error(f"读取日志文件失败 (容器: {self.container}, 文件: {file_path}, 返回码: {result.returncode}): {error_msg}")
-                return "", start_pos
+            header, _, data = output.partition(b"\n")
+            inode, size, offset = header.decode().split()
+            size, offset = int(size), int(offset)
+            if known_inode and inode != known_inode:
+                logging.info(f"检测到日志文件轮转（inode {known_inode} -> {inode}），从头读取: {file_path}")
+            elif offset != start_pos and not tail_mode:
+                logging.info(f"日志文件可能被截断或轮转，重置读取位置: {file_path}")
             
-            content = result.stdout
-            # 简单估算新位置（实际应该更精确）
-            new_pos = start_pos + len(content.encode('utf-8'))
+            # 只保留完整的行，未写完的最后一行留到下次读取
+            complete = data[:data.rfind(b"\n") + 1]
+            if tail_mode:
+                new_pos = size - (len(data) - len(complete))
+            else:
+                new_pos = offset + len(complete)
             
-            return content, new_pos
+            return complete.decode('utf-8', errors='ignore'), new_pos, inode
             
         except Exception as e:
             logging.error(f"读取日志文件失败 (容器: {self.container}, 文件: {file_path}): {e}")
             import traceback
             logging.debug(traceback.format_exc())
-            return "", start_pos
+            raise
     
     def get_file_mtime(self, file_path: str) -> Optional[float]:
         """获取容器内文件的修改时间"""
+        # 日志目录下的文件直接使用批量探测的结果
+        if "/" not in file_path and "\\" not in file_path:
+            files = self.probe_log_files()
+            if files is not None:
+                info = files.get(file_path)
+                return info["mtime"] if info else None
+        
         try:
-            if not os.path.isabs(file_path):
-                file_path = os.path.join(self.log_path, file_path)
-            
-            result = subprocess.run(
-                f'docker exec {self.container} sh -c "stat -c %Y {file_path} 2>&1"',
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
+            file_path = self._full_path(file_path)
+            returncode, output = self._exec(f"stat -c %Y {_quote_sh(file_path)}")
             
-            if result.returncode == 0:
+            if returncode == 0:
                 try:
-                    return float(result.stdout.strip())
+                    return float(output.decode('utf-8', errors='ignore').strip())
                 except ValueError:
                     return None
             return None
@@ -304,17 +592,9 @@ class DockerLogReader:
     def check_file_exists(self, file_path: str) -> bool:
         """检查容器内文件是否存在"""
         try:
-            if not os.path.isabs(file_path):
-                file_path = os.path.join(self.log_path, file_path)
-            
-            result = subprocess.run(
-                f'docker exec {self.container} sh -c "test -f {file_path} 2>&1"',
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            return result.returncode == 0
+            file_path = self._full_path(file_path)
+            returncode, _ = self._exec(f"test -f {_quote_sh(file_path)}")
+            return returncode == 0
         except Exception as e:
             logging.error(f"检查文件是否存在失败: {e}")
             return False
@@ -652,21 +932,7 @@ def should_filter_log_line(line: str, filter_info: bool = True, filter_classpath
     Returns:
         True表示应该过滤（跳过），False表示保留
     """
-    if not line.strip():
-        return False  # 空行保留
-    
-    # 过滤classpath行
-    if filter_classpath:
-        if re.search(r'STARTUP_MSG:\s+classpath\s*=', line, re.IGNORECASE):
-            return True
-    
-    # 过滤INFO级别日志
-    if filter_info:
-        # 匹配标准格式：时间戳 + INFO
-        if re.search(r'\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}[,\s]+\d+\s+INFO\s+', line):
-            return True
-    
-    return False  # 保留该行
+    return parse_log_line(line).should_filter(filter_info, filter_classpath)
 
 
 def read_latest_logs(path: str, last_pos: int, node_pattern: Optional[str] = None, max_lines: int = DEFAULT_MAX_LINES) -> Tuple[List[str], int]:
@@ -776,47 +1042,63 @@ def read_latest_logs_ssh(ssh_reader: SSHLogReader, last_pos: int,
         return [], last_pos, last_file
 
 
+def _latest_docker_log_file(docker_reader: DockerLogReader, node_pattern: Optional[str] = None,
+                            since: Optional[float] = None) -> Optional[str]:
+    """根据目录元数据选出匹配 node_pattern 的最新日志文件"""
+    files = docker_reader.probe_log_files(since=since) or {}
+    log_files = [
+        f for f in files
+        if (f.endswith(".log") or f.endswith(".audit") or f.endswith(".out"))
+        and (not node_pattern or node_pattern.lower() in f.lower())
+    ]
+    if not log_files:
+        return None
+    return max(sorted(log_files), key=lambda f: files[f]["mtime"])
+
+
 def read_latest_logs_docker(docker_reader: DockerLogReader, last_pos: int,
                             node_pattern: Optional[str] = None, max_lines: int = DEFAULT_MAX_LINES,
-                            last_file: Optional[str] = None) -> Tuple[List[str], int, Optional[str]]:
-    """通过 Docker exec 读取容器最新日志（强制从日志文件读取，不回退到docker_logs）"""
+                            last_file: Optional[str] = None,
+                            metadata_since: Optional[float] = None,
+                            last_inode: Optional[str] = None) -> Tuple[List[str], int, Optional[str], Optional[str]]:
+    """
+    通过 Docker exec 读取容器最新日志（强制从日志文件读取，不回退到docker_logs）
+    
+    metadata_since: 传给 DockerLogReader.probe_log_files，同一次读取中共享目录元数据
+    last_inode: 与 last_pos 一起保存的 inode，用于检测轮转
+    
+    Returns:
+        (日志行, 新位置, 当前文件, 当前文件的 inode)
+    
+    Raises:
+        RuntimeError: 未找到日志文件或读取失败；调用方保留原来的位置，只读查看不缓存该结果
+    """
     print(f"通过 Docker 读取容器日志: {docker_reader.container}")
     try:
         # 强制从日志文件读取，不回退到docker_logs
-        log_files = docker_reader.list_log_files(node_pattern)
+        # 一次探测拿到目录下所有文件的元数据，同容器的其它配置复用该结果
+        latest_file = _latest_docker_log_file(docker_reader, node_pattern, since=metadata_since)
         
-        if not log_files:
+        if not latest_file:
             # 如果没有找到日志文件，返回错误信息
-            error_msg = f"未找到日志文件（容器: {docker_reader.container}, 路径: {docker_reader.log_path}, 模式: {node_pattern}）"
-            logging.warning(error_msg)
-            return [], last_pos, last_file
-        
-        # 有日志文件，尝试读取文件
-        log_files_with_time = []
-        for f in log_files:
-            mtime = docker_reader.get_file_mtime(f)
-            if mtime:
-                log_files_with_time.append((f, mtime))
-        
-        if not log_files_with_time:
-            # 如果无法获取文件时间，使用第一个文件
-            logging.warning(f"无法获取日志文件修改时间，使用第一个文件: {log_files[0]}")
-            latest_file = log_files[0]
-        else:
-            log_files_with_time.sort(key=lambda x: x[1], reverse=True)
-            latest_file = log_files_with_time[0][0]
+            raise RuntimeError(
+                f"未找到日志文件（容器: {docker_reader.container}, 路径: {docker_reader.log_path}, 模式: {node_pattern}）"
+            )
         
         if last_file and last_file != latest_file:
             logging.info(f"检测到日志文件切换: {last_file} -> {latest_file}，重置读取位置")
             last_pos = 0
+            last_inode = None
         
         # 读取日志文件内容
-        content, new_pos = docker_reader.read_log_file(latest_file, last_pos, max_lines=max_lines)
+        content, new_pos, inode = docker_reader.read_log_file(
+            latest_file, last_pos, max_lines=max_lines, known_inode=last_inode
+        )
         
         if not content:
             # 文件为空，返回空列表
             logging.info(f"日志文件 {latest_file} 为空")
-            return [], new_pos, latest_file
+            return [], new_pos, latest_file, inode
         
         lines = content.splitlines(keepends=True)
         
@@ -828,17 +1110,17 @@ def read_latest_logs_docker(docker_reader: DockerLogReader, last_pos: int,
         
         # 如果过滤后有内容，返回过滤后的内容；否则返回原始内容
         if filtered_lines:
-            return filtered_lines, new_pos, latest_file
+            return filtered_lines, new_pos, latest_file, inode
         else:
             # 过滤后没有内容，返回原始内容（不过滤）
             logging.info(f"日志文件 {latest_file} 过滤后无内容，返回原始内容")
-            return lines, new_pos, latest_file
+            return lines, new_pos, latest_file, inode
         
     except Exception as e:
         error_msg = f"读取容器日志文件失败（容器: {docker_reader.container}, 路径: {docker_reader.log_path}）: {str(e)}"
         logging.error(error_msg)
-        # 出错时返回空列表，不回退到docker_logs
-        return [], last_pos, last_file
+        # 不回退到docker_logs；失败不能当作"无新日志"返回，否则会被快照缓存
+        raise RuntimeError(error_msg) from e
 
 
 def init_ssh_readers():
@@ -881,52 +1163,299 @@ def init_docker_readers():
                 )
 
 
-def load_log_reader_state(num_log_files: int) -> Tuple[List[int], List[Optional[str]]]:
-    """从文件加载日志读取器的状态"""
+def _filter_followed_line(line: str) -> bool:
+    return should_filter_log_line(line, FILTER_INFO_LOGS, FILTER_CLASSPATH_LOGS)
+
+
+def _make_follow_stream_opener(log_config: Dict[str, Any]):
+    """
+    根据日志配置构造打开 tail -F 日志流的函数（每次重连时重新定位最新文件）
+
+    返回的函数接收 (先载入的历史行数, 续读位置)：首次打开时由跟随器传入 (DEFAULT_MAX_LINES, None)，
+    重连时传入 (0, 上次读到的位置)，文件已轮转时由日志流先读完旧文件
+    """
+    log_path = log_config["log_path"]
+    node_pattern = log_config.get("node_pattern")
+    
+    if log_config["type"] == "docker":
+        container = log_config.get("container")
+        
+        def open_stream(backlog_lines: int, position: Optional[Tuple[str, str, int]]):
+            docker_reader = docker_readers.get(container)
+            latest_file = _latest_docker_log_file(docker_reader, node_pattern) if docker_reader else None
+            if not latest_file:
+                return None
+            return open_docker_tail_stream(container, f"{log_path.rstrip('/')}/{latest_file}", backlog_lines, position)
+        return open_stream
+    
+    if log_config["type"] == "local":
+        def open_stream(backlog_lines: int, position: Optional[Tuple[str, str, int]]):
+            try:
+                log_files = [
+                    f for f in os.listdir(log_path)
+                    if f.endswith(".log") and (not node_pattern or node_pattern.lower() in f.lower())
+                ]
+            except OSError:
+                return None
+            if not log_files:
+                return None
+            latest_file = max(log_files, key=lambda f: os.path.getmtime(os.path.join(log_path, f)))
+            return open_local_tail_stream(os.path.join(log_path, latest_file), backlog_lines, position)
+        return open_stream
+    
+    host = log_config.get("host")
+    
+    def open_stream(backlog_lines: int, position: Optional[Tuple[str, str, int]]):
+        ssh_reader = ssh_readers.get(host) if host else None
+        if not ssh_reader or not ssh_reader.connect():
+            return None
+        log_files = ssh_reader.list_log_files(node_pattern)
+        mtimes = [(f, ssh_reader.get_file_mtime(f)) for f in log_files]
+        mtimes = [(f, m) for f, m in mtimes if m]
+        if not mtimes:
+            return None
+        latest_file = max(mtimes, key=lambda x: x[1])[0]
+        return open_ssh_tail_stream(ssh_reader.client, f"{log_path.rstrip('/')}/{latest_file}", backlog_lines, position)
+    return open_stream
+
+
+def start_log_followers() -> int:
+    """
+    为 LOG_FILES_CONFIG 中的每个条目启动后台日志跟随器
+    
+    Returns:
+        新启动的跟随器数量（已在运行的不会重复启动）
+    """
+    print("启动日志跟随器")
+    init_ssh_readers()
+    init_docker_readers()
+    
+    started = 0
+    for log_config in LOG_FILES_CONFIG:
+        if log_follower_manager.start(
+            log_config["name"],
+            _make_follow_stream_opener(log_config),
+            line_filter=_filter_followed_line
+        ):
+            started += 1
+    return started
+
+
+def stop_log_followers():
+    """停止所有日志跟随器"""
+    log_follower_manager.stop_all()
+
+
+_log_state_store: Optional[LogReaderStateStore] = None
+_log_state_store_lock = threading.Lock()
+
+
+def get_log_state_store() -> LogReaderStateStore:
+    """获取日志读取状态存储（首次调用时创建，并导入旧版 JSON 状态文件）"""
+    global _log_state_store
+    with _log_state_store_lock:
+        if _log_state_store is None:
+            store = LogReaderStateStore(STATE_DB)
+            if store.is_empty() and os.path.exists(STATE_FILE):
+                store.import_legacy_json(STATE_FILE, [config["name"] for config in LOG_FILES_CONFIG])
+            _log_state_store = store
+        return _log_state_store
+
+
+def load_log_reader_state(num_log_files: int) -> Tuple[List[int], List[Optional[str]], List[Optional[str]]]:
+    """
+    加载日志读取器的状态（按节点名对应到 LOG_FILES_CONFIG 的顺序）
+
+    Args:
+        num_log_files: 日志条目数量
+
+    Returns:
+        (读取位置列表, 文件列表, inode 列表)；inode 与读取位置一起保存，重启期间发生的轮转也能被检测到
+    """
     print("从文件加载日志读取器的状态")
+    last_positions = [0] * num_log_files
+    last_files: List[Optional[str]] = [None] * num_log_files
+    last_inodes: List[Optional[str]] = [None] * num_log_files
     try:
-        if os.path.exists(STATE_FILE):
-            with open(STATE_FILE, 'r', encoding='utf-8') as f:
-                state = json.load(f)
-                last_positions = state.get('last_positions', [0] * num_log_files)
-                last_files = state.get('last_files', [None] * num_log_files)
-                
-                if len(last_positions) != num_log_files:
-                    last_positions = [0] * num_log_files
-                if len(last_files) != num_log_files:
-                    last_files = [None] * num_log_files
-                
-                return last_positions, last_files
-        else:
-            return [0] * num_log_files, [None] * num_log_files
+        states = get_log_state_store().load()
     except Exception as e:
         logging.warning(f"加载状态文件失败: {e}，使用默认值")
-        return [0] * num_log_files, [None] * num_log_files
+        return last_positions, last_files, last_inodes
+
+    for i, log_config in enumerate(LOG_FILES_CONFIG[:num_log_files]):
+        state = states.get(log_config["name"])
+        if not state:
+            continue
+        last_positions[i] = state["offset"]
+        last_files[i] = state["file"]
+        last_inodes[i] = state["inode"]
+    return last_positions, last_files, last_inodes
+
 
+def save_log_reader_state(last_positions: List[int], last_files: List[Optional[str]],
+                          last_inodes: Optional[List[Optional[str]]] = None,
+                          previous_positions: Optional[List[int]] = None,
+                          previous_files: Optional[List[Optional[str]]] = None) -> List[bool]:
+    """
+    保存日志读取器的状态（所有节点一次提交）
 
-def save_log_reader_state(last_positions: List[int], last_files: List[Optional[str]]):
-    """保存日志读取器的状态到文件"""
+    Args:
+        last_positions: 各节点的读取位置
+        last_files: 各节点当前读取的文件
+        last_inodes: 各节点当前文件的 inode（读取到 last_positions 时的值）
+        previous_positions: 本次读取前加载的读取位置；与 previous_files 一起指定时，
+                            只保存数据库中的位置仍为该值的节点（其它会话已提交的节点跳过）
+        previous_files: 本次读取前加载的文件
+
+    Returns:
+        各节点的状态是否已保存（顺序与 LOG_FILES_CONFIG 一致）
+    """
     print("保存日志读取器的状态到文件")
+    states = {}
+    expected = None if previous_positions is None or previous_files is None else {}
+    for i, log_config in enumerate(LOG_FILES_CONFIG[:len(last_positions)]):
+        current_file = last_files[i] if i < len(last_files) else None
+        inode = last_inodes[i] if last_inodes and i < len(last_inodes) and current_file else None
+        states[log_config["name"]] = {"file": current_file, "inode": inode, "offset": last_positions[i]}
+        if expected is not None:
+            expected[log_config["name"]] = {"file": previous_files[i], "offset": previous_positions[i]}
     try:
-        os.makedirs(LOG_DIR, exist_ok=True)
-        
-        state = {
-            'last_positions': last_positions,
-            'last_files': last_files,
-            'last_update': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
-        
-        with open(STATE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(state, f, indent=2, ensure_ascii=False)
+        saved = set(get_log_state_store().save(states, expected=expected))
     except Exception as e:
         logging.warning(f"保存状态文件失败: {e}")
+        saved = set()
+    return [log_config["name"] in saved for log_config in LOG_FILES_CONFIG[:len(last_positions)]]
+
+
+_log_archive: Optional[LogArchive] = None
+_log_archive_lock = threading.Lock()
+
+
+def get_log_archive() -> Optional[LogArchive]:
+    """获取日志归档（LOG_ARCHIVE_ENABLED 关闭或初始化失败时返回 None）"""
+    global _log_archive
+    if not LOG_ARCHIVE_ENABLED:
+        return None
+    with _log_archive_lock:
+        if _log_archive is None:
+            try:
+                _log_archive = LogArchive(LOG_ARCHIVE_DIR, retention_days=LOG_ARCHIVE_RETENTION_DAYS)
+            except Exception as e:
+                logging.warning(f"初始化日志归档失败: {e}")
+                return None
+        return _log_archive
+
+
+def archive_log_chunks(chunks: List[Optional[str]], saved: List[bool]):
+    """
+    把本次新读取到的日志追加到归档（失败只记录警告，不影响读取）
+
+    只归档读取位置已保存的节点：超时、失败或被其它会话抢先提交的节点下次会重新读取同一段日志，
+    此时归档会重复。
+
+    Args:
+        chunks: read_all_cluster_logs 返回的各节点日志内容（顺序与 LOG_FILES_CONFIG 一致）
+        saved: save_log_reader_state 的返回值
+    """
+    archive = get_log_archive()
+    if not archive:
+        return
+    for log_config, chunk, is_saved in zip(LOG_FILES_CONFIG, chunks, saved):
+        if not chunk or not is_saved:
+            continue
+        try:
+            archive.append(log_config["name"], chunk)
+        except Exception as e:
+            logging.warning(f"写入日志归档失败 (节点: {log_config['name']}): {e}")
+
+
+def _read_log_entry(log_config: Dict[str, Any], last_pos: int, last_file: Optional[str],
+                    max_lines: int, metadata_since: Optional[float] = None,
+                    last_inode: Optional[str] = None) -> Tuple[str, int, Optional[str], Optional[str]]:
+    """
+    读取单个 LOG_FILES_CONFIG 条目的日志，返回 (日志内容, 新位置, 当前文件, 当前文件的 inode)
+
+    无法连接时抛出 RuntimeError，调用方保留原来的位置
+    """
+    log_path = log_config["log_path"]
+    node_pattern = log_config.get("node_pattern")
+    
+    # 跟随模式：直接消费内存缓冲区中的新日志，不发起远程读取
+    if log_follower_manager.is_following(log_config["name"]):
+        lines = log_follower_manager.read_new(log_config["name"], max_lines=max_lines)
+        return "".join(lines), last_pos, last_file, last_inode
+    
+    if log_config["type"] == "local":
+        lines, new_pos = read_latest_logs(
+            log_path, 
+            last_pos=last_pos,
+            node_pattern=node_pattern,
+            max_lines=max_lines
+        )
+        return "".join(lines), new_pos, None, None
+    elif log_config["type"] == "docker":
+        container = log_config.get("container")
+        docker_reader = docker_readers.get(container) if container else None
+        
+        if docker_reader:
+            lines, new_pos, current_file, inode = read_latest_logs_docker(
+                docker_reader,
+                last_pos=last_pos,
+                node_pattern=node_pattern,
+                max_lines=max_lines,
+                last_file=last_file,
+                metadata_since=metadata_since,
+                last_inode=last_inode
+            )
+            return "".join(lines), new_pos, current_file, inode
+        raise RuntimeError(f"无法连接到容器 {container}")
+    else:  # ssh类型（已废弃，保留用于兼容性）
+        host = log_config.get("host")
+        ssh_reader = ssh_readers.get(host) if host else None
+        
+        if ssh_reader:
+            lines, new_pos, current_file = read_latest_logs_ssh(
+                ssh_reader,
+                last_pos=last_pos,
+                node_pattern=node_pattern,
+                max_lines=max_lines,
+                last_file=last_file
+            )
+            return "".join(lines), new_pos, current_file, None
+        raise RuntimeError(f"无法连接到 {host}")
 
 
 def read_all_cluster_logs(max_lines: int = DEFAULT_MAX_LINES, 
                           last_positions: Optional[List[int]] = None,
-                          last_files: Optional[List[Optional[str]]] = None) -> Tuple[Dict[str, str], List[int], List[Optional[str]]]:
-    """读取所有5个节点的日志"""
-    print("读取所有5个节点的日志")
+                          last_files: Optional[List[Optional[str]]] = None,
+                          parallel: Optional[bool] = None,
+                          node_timeout: float = LOG_READ_NODE_TIMEOUT,
+                          deadline: float = LOG_READ_POLL_DEADLINE,
+                          last_inodes: Optional[List[Optional[str]]] = None
+                          ) -> Tuple[Dict[str, str], List[int], List[Optional[str]], List[Optional[str]],
+                                     List[Optional[str]]]:
+    """
+    读取所有节点的日志
+    
+    Args:
+        max_lines: 每个节点最多读取的行数
+        last_positions: 上次读取位置（与 LOG_FILES_CONFIG 顺序一致）
+        last_files: 上次读取的文件名（与 LOG_FILES_CONFIG 顺序一致）
+        last_inodes: 上次读取的文件的 inode（与 LOG_FILES_CONFIG 顺序一致）
+        parallel: 是否并发读取（None 表示使用 LOG_READ_PARALLEL）
+        node_timeout: 并发模式下单个节点的超时时间（秒），从该节点实际开始读取时计时
+        deadline: 并发模式下整次读取的截止时间（秒），从本次读取开始时计时
+    
+    并发模式按连接分组：同一容器（或 SSH 主机）的条目共用一个会话，在同一个线程中依次读取，
+    不同分组之间并发。排在后面的条目不会因为等待前面的条目而被计入单节点超时，
+    但前面的条目卡住时，后面的条目最多等到整次读取的截止时间。
+    
+    Returns:
+        (日志字典, 新位置列表, 新文件列表, 新 inode 列表, 新日志内容列表)，顺序与 LOG_FILES_CONFIG 一致；
+        超时或失败的节点保留原来的位置，下次重新读取，其日志内容为 None。
+        读取线程不写归档：保存读取位置后由调用方把新日志内容交给 archive_log_chunks
+    """
+    print("读取所有节点的日志")
     logs = {}
     num_log_files = len(LOG_FILES_CONFIG)
     
@@ -934,106 +1463,215 @@ def read_all_cluster_logs(max_lines: int = DEFAULT_MAX_LINES,
         last_positions = [0] * num_log_files
     if last_files is None:
         last_files = [None] * num_log_files
+    if last_inodes is None:
+        last_inodes = [None] * num_log_files
     
     if len(last_positions) != num_log_files:
         last_positions = [0] * num_log_files
     if len(last_files) != num_log_files:
         last_files = [None] * num_log_files
+    if len(last_inodes) != num_log_files:
+        last_inodes = [None] * num_log_files
+    
+    if parallel is None:
+        parallel = LOG_READ_PARALLEL
     
     init_ssh_readers()  # 保留用于兼容性
     init_docker_readers()  # 初始化Docker读取器
     
     new_positions = []
     new_files = []
+    new_inodes = []
+    new_chunks: List[Optional[str]] = []
+    # 本次读取开始时间：同一容器的目录元数据在本次读取内只探测一次
+    poll_start = time.monotonic()
+    
+    if not parallel or num_log_files <= 1:
+        for i, log_config in enumerate(LOG_FILES_CONFIG):
+            node_name = log_config["display_name"]
+            try:
+                log_content, new_pos, current_file, inode = _read_log_entry(
+                    log_config, last_positions[i], last_files[i], max_lines, poll_start, last_inodes[i]
+                )
+                logs[node_name] = log_content if log_content else "无新日志"
+                new_positions.append(new_pos)
+                new_files.append(current_file)
+                new_inodes.append(inode)
+                new_chunks.append(log_content)
+            except Exception as e:
+                logs[node_name] = f"读取日志失败: {str(e)}"
+                new_positions.append(last_positions[i])
+                new_files.append(last_files[i])
+                new_inodes.append(last_inodes[i])
+                new_chunks.append(None)
+        
+        return logs, new_positions, new_files, new_inodes, new_chunks
     
+    # 并发模式：不同连接同时读取，同一连接的条目在一个线程中依次读取（它们本来就串行使用同一个会话）
+    poll_deadline = poll_start + deadline
+    groups: Dict[Tuple, List[int]] = {}
     for i, log_config in enumerate(LOG_FILES_CONFIG):
-        node_name = log_config["display_name"]
-        log_path = log_config["log_path"]
-        node_pattern = log_config.get("node_pattern")
+        if log_config["type"] == "docker":
+            key = ("docker", log_config.get("container"))
+        elif log_config["type"] == "ssh":
+            key = ("ssh", log_config.get("host"))
+        else:
+            key = ("local", i)
+        groups.setdefault(key, []).append(i)
+    
+    futures: List[Future] = [Future() for _ in range(num_log_files)]
+    started: Dict[int, float] = {}  # 条目实际开始读取的时间
+    
+    def read_group(indices: List[int]):
+        for idx in indices:
+            entry_future = futures[idx]
+            if not entry_future.set_running_or_notify_cancel():
+                continue  # 等待期间已超时，跳过
+            started[idx] = time.monotonic()
+            try:
+                entry_future.set_result(_read_log_entry(
+                    LOG_FILES_CONFIG[idx], last_positions[idx], last_files[idx], max_lines, poll_start,
+                    last_inodes[idx]
+                ))
+            except Exception as e:
+                entry_future.set_exception(e)
+    
+    def wait_entry(idx: int):
+        while True:
+            start = started.get(idx)
+            limit = poll_deadline if start is None else min(poll_deadline, start + node_timeout)
+            remaining = limit - time.monotonic()
+            if remaining <= 0:
+                raise FutureTimeoutError()
+            try:
+                # 还没开始读取时短暂等待后重新计算截止时间
+                return futures[idx].result(timeout=remaining if start is not None else min(remaining, 0.2))
+            except FutureTimeoutError:
+                if start is not None:
+                    raise
+    
+    executor = ThreadPoolExecutor(max_workers=min(32, len(groups)), thread_name_prefix="log-reader")
+    try:
+        for indices in groups.values():
+            executor.submit(read_group, indices)
         
-        try:
-            if log_config["type"] == "local":
-                lines, new_pos = read_latest_logs(
-                    log_path, 
-                    last_pos=last_positions[i],
-                    node_pattern=node_pattern,
-                    max_lines=max_lines
-                )
-                log_content = "".join(lines)
+        for i, (log_config, future) in enumerate(zip(LOG_FILES_CONFIG, futures)):
+            node_name = log_config["display_name"]
+            try:
+                log_content, new_pos, current_file, inode = wait_entry(i)
+                logs[node_name] = log_content if log_content else "无新日志"
                 new_positions.append(new_pos)
-                new_files.append(None)
-            elif log_config["type"] == "docker":
-                container = log_config.get("container")
-                docker_reader = docker_readers.get(container) if container else None
-                
-                if docker_reader:
-                    lines, new_pos, current_file = read_latest_logs_docker(
-                        docker_reader,
-                        last_pos=last_positions[i],
-                        node_pattern=node_pattern,
-                        max_lines=max_lines,
-                        last_file=last_files[i]
-                    )
-                    log_content = "".join(lines)
-                    new_positions.append(new_pos)
-                    new_files.append(current_file)
-                else:
-                    log_content = f"无法连接到容器 {container}"
-                    new_positions.append(last_positions[i])
-                    new_files.append(last_files[i])
-            else:  # ssh类型（已废弃，保留用于兼容性）
-                host = log_config.get("host")
-                ssh_reader = ssh_readers.get(host) if host else None
-                
-                if ssh_reader:
-                    lines, new_pos, current_file = read_latest_logs_ssh(
-                        ssh_reader,
-                        last_pos=last_positions[i],
-                        node_pattern=node_pattern,
-                        max_lines=max_lines,
-                        last_file=last_files[i]
-                    )
-                    log_content = "".join(lines)
-                    new_positions.append(new_pos)
-                    new_files.append(current_file)
-                else:
-                    log_content = f"无法连接到 {host}"
-                    new_positions.append(last_positions[i])
-                    new_files.append(last_files[i])
-            
-            logs[node_name] = log_content if log_content else "无新日志"
-            
-        except Exception as e:
-            logs[node_name] = f"读取日志失败: {str(e)}"
-            new_positions.append(last_positions[i])
-            new_files.append(last_files[i])
+                new_files.append(current_file)
+                new_inodes.append(inode)
+                new_chunks.append(log_content)
+            except FutureTimeoutError:
+                future.cancel()
+                logging.warning(f"读取节点 {node_name} 日志超时")
+                logs[node_name] = "读取日志失败: 读取超时"
+                new_positions.append(last_positions[i])
+                new_files.append(last_files[i])
+                new_inodes.append(last_inodes[i])
+                new_chunks.append(None)
+            except Exception as e:
+                logs[node_name] = f"读取日志失败: {str(e)}"
+                new_positions.append(last_positions[i])
+                new_files.append(last_files[i])
+                new_inodes.append(last_inodes[i])
+                new_chunks.append(None)
+    finally:
+        # 不等待超时的读取线程，避免拖过截止时间
+        executor.shutdown(wait=False, cancel_futures=True)
     
-    return logs, new_positions, new_files
+    return logs, new_positions, new_files, new_inodes, new_chunks
 
 
-def get_node_log_by_name(node_name: str) -> str:
-    """根据节点名称获取日志"""
-    print(f"根据节点名称获取日志: {node_name}")
+class LogSnapshotCache:
+    """
+    只读工具的日志快照缓存
+
+    按 (节点名, 文件, 起始偏移, 行数) 缓存读取结果：同一轮对话中 search_logs_by_keyword、
+    get_error_logs_summary 等工具多次读取同一节点时复用已获取的内容。
+    同一 key 并发读取时只发起一次远程读取。
+    """
+
+    def __init__(self, ttl: float = LOG_SNAPSHOT_TTL):
+        self.ttl = ttl
+        self._entries: Dict[Tuple, Tuple[float, str]] = {}
+        self._loading: Dict[Tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key: Tuple, loader) -> str:
+        """
+        Args:
+            key: (节点名, 文件, 起始偏移, 行数)
+            loader: 读取函数，返回 (日志内容, 是否可缓存)；读取失败的结果不缓存
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() - entry[0] < self.ttl:
+                return entry[1]
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry and time.monotonic() - entry[0] < self.ttl:
+                    return entry[1]
+            try:
+                content, cacheable = loader()
+                if cacheable:
+                    with self._lock:
+                        self._entries[key] = (time.monotonic(), content)
+                return content
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+log_snapshot_cache = LogSnapshotCache()
+
+
+def clear_log_snapshot_cache():
+    """清空日志快照缓存（每轮对话开始时调用，保证新一轮读取到最新日志）"""
+    log_snapshot_cache.clear()
+
+
+def find_log_config(node_name: str) -> Optional[Dict[str, Any]]:
+    """根据节点名称（如 s1 NameNode、datanode1）查找 LOG_FILES_CONFIG 条目"""
     node_name_lower = node_name.lower()
-    target_config = None
-    
     for config in LOG_FILES_CONFIG:
         display_name = config.get("display_name", "").lower()
         if (node_name_lower in display_name or 
             display_name in node_name_lower or
             (node_name_lower == "namenode" and "namenode" in display_name) or
             (node_name_lower == "secondarynamenode" and "secondarynamenode" in display_name)):
-            target_config = config
-            break
+            return config
+    return None
+
+
+def get_node_log_by_name(node_name: str) -> str:
+    """根据节点名称获取日志"""
+    print(f"根据节点名称获取日志: {node_name}")
+    target_config = find_log_config(node_name)
     
     if not target_config:
         # 更新支持的节点列表
         supported_nodes = [config["display_name"] for config in LOG_FILES_CONFIG]
         return f"未找到节点: {node_name}。支持的节点: {', '.join(supported_nodes)}"
     
+    # 跟随模式：直接返回缓冲区中最近的日志
+    if log_follower_manager.is_following(target_config["name"]):
+        lines = log_follower_manager.get_recent(target_config["name"], DEFAULT_MAX_LINES)
+        log_content = "".join(lines)
+        return log_content if log_content else "无新日志"
+    
     # 加载状态
     num_log_files = len(LOG_FILES_CONFIG)
-    last_positions, last_files = load_log_reader_state(num_log_files)
+    last_positions, last_files, last_inodes = load_log_reader_state(num_log_files)
     
     # 找到目标节点的索引
     target_idx = None
@@ -1045,56 +1683,68 @@ def get_node_log_by_name(node_name: str) -> str:
     if target_idx is None:
         return f"未找到节点配置: {node_name}"
     
-    # 读取该节点的日志
-    log_path = target_config["log_path"]
-    node_pattern = target_config.get("node_pattern")
+    # 读取该节点的日志（同一范围的读取结果在快照缓存中复用）
+    last_pos = last_positions[target_idx]
+    last_file = last_files[target_idx]
+    last_inode = last_inodes[target_idx]
+    cache_key = (target_config["name"], last_file, last_pos, DEFAULT_MAX_LINES)
     
     try:
-        if target_config["type"] == "local":
-            lines, _ = read_latest_logs(
-                log_path,
-                last_pos=last_positions[target_idx],
-                node_pattern=node_pattern,
-                max_lines=DEFAULT_MAX_LINES
-            )
-            log_content = "".join(lines)
-        elif target_config["type"] == "docker":
-            container = target_config.get("container")
-            init_docker_readers()
-            docker_reader = docker_readers.get(container) if container else None
-            
-            if docker_reader:
-                lines, _, _ = read_latest_logs_docker(
-                    docker_reader,
-                    last_pos=last_positions[target_idx],
-                    node_pattern=node_pattern,
-                    max_lines=DEFAULT_MAX_LINES,
-                    last_file=last_files[target_idx]
-                )
-                log_content = "".join(lines)
-            else:
-                log_content = f"无法连接到容器 {container}"
-        else:  # ssh类型（已废弃，保留用于兼容性）
-            host = target_config.get("host")
-            init_ssh_readers()
-            ssh_reader = ssh_readers.get(host) if host else None
-            
-            if ssh_reader:
-                lines, _, _ = read_latest_logs_ssh(
-                    ssh_reader,
-                    last_pos=last_positions[target_idx],
-                    node_pattern=node_pattern,
-                    max_lines=DEFAULT_MAX_LINES,
-                    last_file=last_files[target_idx]
-                )
-                log_content = "".join(lines)
-            else:
-                log_content = f"无法连接到 {host}"
-        
+        log_content = log_snapshot_cache.get_or_load(
+            cache_key,
+            lambda: _read_node_log_snapshot(target_config, last_pos, last_file, last_inode)
+        )
         return log_content if log_content else "无新日志"
     except Exception as e:
         return f"读取日志失败: {str(e)}"
 
+
+def _read_node_log_snapshot(target_config: Dict[str, Any], last_pos: int,
+                            last_file: Optional[str], last_inode: Optional[str] = None) -> Tuple[str, bool]:
+    """读取节点日志（不移动读取位置），返回 (日志内容, 是否可缓存)；Docker 读取失败时抛出异常，结果不缓存"""
+    log_path = target_config["log_path"]
+    node_pattern = target_config.get("node_pattern")
+    
+    if target_config["type"] == "local":
+        lines, _ = read_latest_logs(
+            log_path,
+            last_pos=last_pos,
+            node_pattern=node_pattern,
+            max_lines=DEFAULT_MAX_LINES
+        )
+        return "".join(lines), True
+    elif target_config["type"] == "docker":
+        container = target_config.get("container")
+        init_docker_readers()
+        docker_reader = docker_readers.get(container) if container else None
+        
+        if docker_reader:
+            lines, _, _, _ = read_latest_logs_docker(
+                docker_reader,
+                last_pos=last_pos,
+                node_pattern=node_pattern,
+                max_lines=DEFAULT_MAX_LINES,
+                last_file=last_file,
+                last_inode=last_inode
+            )
+            return "".join(lines), True
+        return f"无法连接到容器 {container}", False
+    else:  # ssh类型（已废弃，保留用于兼容性）
+        host = target_config.get("host")
+        init_ssh_readers()
+        ssh_reader = ssh_readers.get(host) if host else None
+        
+        if ssh_reader:
+            lines, _, _ = read_latest_logs_ssh(
+                ssh_reader,
+                last_pos=last_pos,
+                node_pattern=node_pattern,
+                max_lines=DEFAULT_MAX_LINES,
+                last_file=last_file
+            )
+            return "".join(lines), True
+        return f"无法连接到 {host}", False
+
 # ==================== LLM 配置 ====================
 
 def create_llm(model_name: str = "qwen-8b") -> ChatOpenAI:
@@ -1192,15 +1842,24 @@ def get_cluster_logs() -> str:
     print("调用get_cluster_logs工具")
     try:
         num_log_files = len(LOG_FILES_CONFIG)
-        last_positions, last_files = load_log_reader_state(num_log_files)
+        # 读取远程日志期间不持有状态库的锁；保存时比较并设置，
+        # 并发的会话/进程读到同一段日志时只有先保存的一方推进读取位置
+        last_positions, last_files, last_inodes = load_log_reader_state(num_log_files)
         
-        all_logs, new_positions, new_files = read_all_cluster_logs(
+        all_logs, new_positions, new_files, new_inodes, new_chunks = read_all_cluster_logs(
             max_lines=DEFAULT_MAX_LINES,
             last_positions=last_positions,
-            last_files=last_files
+            last_files=last_files,
+            last_inodes=last_inodes
         )
         
-        save_log_reader_state(new_positions, new_files)
+        saved = save_log_reader_state(
+            new_positions, new_files, new_inodes,
+            previous_positions=last_positions,
+            previous_files=last_files
+        )
+        # 只归档读取位置已提交的日志，避免超时/并发重读时重复归档
+        archive_log_chunks(new_chunks, saved)
         
         # 构建带思考检查点的返回内容
         result = []
@@ -1289,9 +1948,10 @@ def get_monitoring_metrics() -> str:
     """
     print("调用get_monitoring_metrics工具")
     try:
-        from .monitor_collector import collect_all_metrics, format_metrics_for_display
+        from .monitor_collector import get_latest_metrics, format_metrics_for_display
         
-        metrics = collect_all_metrics()
+        # 读取后台调度器的最新采集结果（结果过旧时才重新采集）
+        metrics = get_latest_metrics()
         html_content = format_metrics_for_display(metrics)
         
         # 将 HTML 转换为纯文本（移除 HTML 标签，保留内容）
@@ -1299,6 +1959,9 @@ def get_monitoring_metrics() -> str:
         text_content = text_content.replace('✅', '[正常]')
         text_content = text_content.replace('⚠️', '[异常]')
         text_content = text_content.replace('❌', '[错误]')
+        if not SAVE_METRICS_SNAPSHOT_FILE:
+            # 指标历史已写入时序存储（metrics/metrics.db），不再每次生成文本快照
+            return text_content
         try:
             # 确定metrics目录路径（相对于当前文件：rca/lc_agent/agent.py -> rca/metrics）
             current_dir = os.path.dirname(os.path.abspath(__file__))  # rca/lc_agent
@@ -1326,34 +1989,104 @@ def get_monitoring_metrics() -> str:
         return f"获取监控指标失败: {str(e)}"
 
 
-@tool("search_logs_by_keyword", description="在指定节点日志中搜索关键词，快速定位问题")
-def search_logs_by_keyword(node_name: str, keyword: str, max_results: int = 50) -> str:
+@tool("get_metric_trend", description="查询监控指标最近一段时间的变化趋势（如堆内存增长、复制不足数据块变化），读取本地历史数据，不重新采集")
+def get_metric_trend(metric: str, node_name: str = "namenode", window_minutes: int = 60) -> str:
+    """
+    查询监控指标的历史趋势。
+    
+    Args:
+        metric: 指标键（如 heap_memory_usage, under_replicated_blocks, storage_usage, live_datanodes, up）
+        node_name: 节点名称（namenode, datanode1, datanode2）
+        window_minutes: 时间窗口（分钟，默认60）
+    
+    Returns:
+        趋势摘要（起止值、最小/最大/平均值、变化量）和按时间采样的数据点
+    """
+    print(f"调用get_metric_trend工具: metric={metric}, node={node_name}, window={window_minutes}分钟")
+    try:
+        from .monitor_collector import get_metric_store
+        
+        store = get_metric_store()
+        if not store:
+            return "指标时序存储未启用（METRIC_STORE_ENABLED=false）"
+        
+        node = node_name.strip().lower().replace(" ", "")
+        series = f"{node}.{metric.strip()}"
+        summary = store.summarize(series, window=window_minutes * 60)
+        if not summary:
+            available = [name.split(".", 1)[1] for name in store.list_series(f"{node}.")]
+            if not available:
+                return f"没有节点 {node_name} 的历史指标数据（需要先采集监控指标）"
+            return f"最近 {window_minutes} 分钟没有 {series} 的数据。该节点可用的指标: {', '.join(available)}"
+        
+        start = datetime.fromtimestamp(summary["start"]).strftime('%Y-%m-%d %H:%M:%S')
+        end = datetime.fromtimestamp(summary["end"]).strftime('%Y-%m-%d %H:%M:%S')
+        result = [
+            f"[指标趋势] {series}（最近 {window_minutes} 分钟，{summary['count']} 个数据点，{start} ~ {end}）",
+            f"起始值: {summary['first']:.2f}，最新值: {summary['last']:.2f}，变化: {summary['delta']:+.2f}",
+            f"最小值: {summary['min']:.2f}，最大值: {summary['max']:.2f}，平均值: {summary['avg']:.2f}",
+            "",
+            "采样数据:"
+        ]
+        points = store.query(series, window=window_minutes * 60)
+        step = max(1, -(-len(points) // METRIC_TREND_MAX_POINTS))
+        sampled = points[::step]
+        if sampled[-1] != points[-1]:
+            sampled.append(points[-1])
+        for ts, value in sampled:
+            result.append(f"  {datetime.fromtimestamp(ts).strftime('%H:%M:%S')}  {value:.2f}")
+        return "\n".join(result)
+    except Exception as e:
+        return f"查询指标趋势失败: {str(e)}"
+
+
+@tool("search_logs_by_keyword", description="在指定节点日志中搜索关键词，快速定位问题；可指定时间范围（如 2024-01-01 12:00:00）检索历史归档日志")
+def search_logs_by_keyword(node_name: str, keyword: str, max_results: int = 50,
+                           start_time: Optional[str] = None, end_time: Optional[str] = None) -> str:
     """
     在指定节点日志中搜索关键词。
     
     Args:
         node_name: 节点名称（如：s1 NameNode, s2 DataNode）
-        keyword: 搜索关键词（如：ERROR, WARN, Exception）
+        keyword: 搜索关键词（如：ERROR, WARN, Exception, blk_1073741825）
         max_results: 最大返回结果数（默认50）
+        start_time: 起始时间（可选，如 2024-01-01 12:00:00），指定后只返回该时间之后的日志
+        end_time: 结束时间（可选，可只写到日期，如 2024-01-01）
     
     Returns:
-        匹配的日志行及其上下文（时间戳、级别、消息）
+        匹配的日志行及其上下文（时间戳、级别、消息）；历史归档中的匹配单独列出
     """
-    print(f"调用search_logs_by_keyword工具: node={node_name}, keyword={keyword}, max_results={max_results}")
+    print(f"调用search_logs_by_keyword工具: node={node_name}, keyword={keyword}, max_results={max_results}, "
+          f"start_time={start_time}, end_time={end_time}")
     try:
         # 1. 获取节点日志
         log_content = get_node_log_by_name(node_name)
         
-        if not log_content or log_content.startswith("未找到节点") or log_content.startswith("读取日志失败"):
+        if not log_content or log_content.startswith("未找到节点"):
             return f"无法获取 {node_name} 的日志: {log_content}"
         
+        # 读取实时日志失败时仍检索历史归档，只在结果中说明
+        live_error = None
+        if log_content.startswith("读取日志失败"):
+            live_error = log_content
+            log_content = ""
+        
         # 2. 搜索关键词
-        lines = log_content.split('\n')
+        lines = log_content.split('\n') if log_content else []
         matches = []
         keyword_lower = keyword.lower()
-        
-        for i, line in enumerate(lines):
-            if keyword_lower in line.lower():
+        time_filtered = bool(start_time or end_time)
+        range_start = start_time.replace('T', ' ') if start_time else None
+        range_end = end_time.replace('T', ' ') if end_time else None
+        
+        for i, parsed in enumerate(parse_log_lines(lines)):
+            line = parsed.raw
+            if keyword_lower in parsed.lower:
+                if time_filtered:
+                    timestamp = parsed.timestamp
+                    if not timestamp or (range_start and timestamp < range_start) or \
+                            (range_end and timestamp[:len(range_end)] > range_end):
+                        continue
                 # 获取上下文（前后各2行）
                 start = max(0, i - 2)
                 end = min(len(lines), i + 3)
@@ -1368,12 +2101,27 @@ def search_logs_by_keyword(node_name: str, keyword: str, max_results: int = 50)
                 if len(matches) >= max_results:
                     break
         
-        # 3. 格式化返回
-        if not matches:
-            return f"在 {node_name} 的日志中未找到关键词 '{keyword}'（共搜索了 {len(lines)} 行）"
+        # 3. 检索历史归档（get_cluster_logs 已读取过的日志）
+        archive_matches = []
+        archive = get_log_archive()
+        target_config = find_log_config(node_name)
+        if archive and target_config:
+            archive_matches = archive.search(
+                target_config["name"], keyword,
+                start_time=start_time, end_time=end_time, max_results=max_results
+            )
+        
+        # 4. 格式化返回
+        if not matches and not archive_matches:
+            if live_error:
+                return f"无法获取 {node_name} 的实时日志（{live_error}），历史归档中也未找到关键词 '{keyword}'"
+            return f"在 {node_name} 的日志中未找到关键词 '{keyword}'（共搜索了 {len(lines)} 行，并检索了历史归档）"
         
         result = []
-        result.append(f"在 {node_name} 的日志中找到 {len(matches)} 条匹配 '{keyword}' 的记录（共搜索 {len(lines)} 行）：\n")
+        if live_error:
+            result.append(f"无法获取 {node_name} 的实时日志: {live_error}\n")
+        else:
+            result.append(f"在 {node_name} 的日志中找到 {len(matches)} 条匹配 '{keyword}' 的记录（共搜索 {len(lines)} 行）：\n")
         result.append("=" * 80)
         
         for idx, match in enumerate(matches, 1):
@@ -1385,6 +2133,14 @@ def search_logs_by_keyword(node_name: str, keyword: str, max_results: int = 50)
         if len(matches) >= max_results:
             result.append(f"\n[提示] 已显示前 {max_results} 条匹配结果，可能还有更多结果。")
         
+        if archive_matches:
+            result.append(f"\n[历史归档] 找到 {len(archive_matches)} 条匹配 '{keyword}' 的记录（按时间顺序）：")
+            result.append("=" * 80)
+            for _, line in archive_matches:
+                result.append(line)
+            if len(archive_matches) >= max_results:
+                result.append(f"\n[提示] 历史归档只显示最近的 {max_results} 条，可缩小时间范围查看更早的结果。")
+        
         return "\n".join(result)
     except Exception as e:
         error_msg = f"搜索日志失败: {str(e)}"
@@ -1434,37 +2190,25 @@ def get_error_logs_summary(node_name: Optional[str] = None) -> str:
                 lines = log_content.split('\n')
                 errors = []
                 warnings = []
+                error_types = {}
                 
-                # 解析日志，查找错误和警告
-                for i, line in enumerate(lines):
-                    line_upper = line.upper()
-                    
-                    # 检查是否是错误
-                    if any(keyword in line_upper for keyword in ['ERROR', 'FATAL', 'CRITICAL', 'EXCEPTION']):
+                # 每行只解析一次，分类和时间戳都来自同一个解析结果
+                for i, parsed in enumerate(parse_log_lines(lines)):
+                    severity = parsed.severity
+                    if severity == 'error':
                         errors.append({
                             'line_num': i + 1,
-                            'line': line.strip(),
-                            'timestamp': _extract_timestamp(line)
+                            'line': parsed.raw.strip(),
+                            'timestamp': parsed.timestamp
                         })
-                    # 检查是否是警告
-                    elif 'WARN' in line_upper:
+                        error_types[parsed.error_type] = error_types.get(parsed.error_type, 0) + 1
+                    elif severity == 'warning':
                         warnings.append({
                             'line_num': i + 1,
-                            'line': line.strip(),
-                            'timestamp': _extract_timestamp(line)
+                            'line': parsed.raw.strip(),
+                            'timestamp': parsed.timestamp
                         })
                 
-                # 统计错误类型
-                error_types = {}
-                for err in errors:
-                    # 尝试提取错误类型（简单方法：取第一个单词或关键词）
-                    error_type = "Unknown"
-                    for keyword in ['ERROR', 'FATAL', 'CRITICAL', 'EXCEPTION']:
-                        if keyword in err['line'].upper():
-                            error_type = keyword
-                            break
-                    error_types[error_type] = error_types.get(error_type, 0) + 1
-                
                 all_summaries.append({
                     'node': node,
                     'status': 'success',
@@ -1537,21 +2281,8 @@ def get_error_logs_summary(node_name: Optional[str] = None) -> str:
 
 
 def _extract_timestamp(line: str) -> Optional[str]:
-    """从日志行中提取时间戳（简单实现）"""
-    # 尝试匹配常见的时间戳格式
-    # 例如: 2024-01-01 12:00:00, 2024-01-01T12:00:00, 01/01/2024 12:00:00
-    patterns = [
-        r'\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}',
-        r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}',
-        r'\d{2}/\d{2}/\d{4}\s+\d{2}:\d{2}:\d{2}',
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, line)
-        if match:
-            return match.group(0)
-    
-    return None
+    """从日志行中提取时间戳"""
+    return extract_timestamp(line)
 
 
 # ==================== Hadoop集群操作工具 ====================
@@ -1767,7 +2498,9 @@ def create_agent_instance(model_name: str = "qwen-8b"):
     print(f"[DEBUG] 开始创建Agent实例 - 模型: {model_name}")
     
     llm = create_llm(model_name)
-    tools = [get_cluster_logs, get_node_log, get_monitoring_metrics, website_search, hadoop_cluster_operation,]
+    if LOG_FOLLOW_ENABLED:
+        start_log_followers()
+    tools = [get_cluster_logs, get_node_log, get_monitoring_metrics, get_metric_trend, website_search, hadoop_cluster_operation,]
  
     
     system_prompt = """你是HDFS集群问题诊断专家。
@@ -2032,8 +2765,8 @@ def export_to_word(analysis_result: str, output_path: str) -> str:
         doc.add_heading('集群监控指标', 1)
         
         try:
-            from .monitor_collector import collect_all_metrics
-            metrics_data = collect_all_metrics()
+            from .monitor_collector import get_latest_metrics
+            metrics_data = get_latest_metrics()
             
             # NameNode 指标表格
             doc.add_heading('NameNode 监控指标', 2)
@@ -2227,11 +2960,11 @@ def export_to_pdf(analysis_result: str, output_path: str) -> str:
         story.append(Paragraph('集群监控指标', heading_style))
         
         try:
-            from .monitor_collector import collect_all_metrics
+            from .monitor_collector import get_latest_metrics
             from reportlab.platypus import Table, TableStyle
             from reportlab.lib import colors
             
-            metrics_data = collect_all_metrics()
+            metrics_data = get_latest_metrics()
             
             # NameNode 指标表格
             story.append(Paragraph('NameNode 监控指标', heading_style))
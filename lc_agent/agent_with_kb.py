@@ -18,6 +18,7 @@ try:
         get_cluster_logs,
         get_node_log,
         get_monitoring_metrics,
+        get_metric_trend,
         website_search,
         hadoop_cluster_operation,
         create_llm
@@ -30,6 +31,7 @@ except ImportError:
         get_cluster_logs,
         get_node_log,
         get_monitoring_metrics,
+        get_metric_trend,
         website_search,
         hadoop_cluster_operation,
         create_llm
@@ -77,6 +79,7 @@ def create_agent_with_kb(model_name: str = "qwen-8b"):
         get_cluster_logs,
         get_node_log,
         get_monitoring_metrics,
+        get_metric_trend,
         website_search,
         hadoop_cluster_operation,
     ]
@@ -85,7 +88,9 @@ def create_agent_with_kb(model_name: str = "qwen-8b"):
     tools = base_tools + [search_diagnosis_knowledge_tool]
     
     # 注册所有工具到工具匹配器（用于智能工具选择）
+    # 批量注册：缓存未命中的工具描述一次性编码
     tool_registry = get_tool_registry()
+    tool_entries = []
     for tool_func in tools:
         # 获取工具的描述
         if hasattr(tool_func, 'description'):
@@ -95,11 +100,12 @@ def create_agent_with_kb(model_name: str = "qwen-8b"):
         else:
             description = f"工具: {tool_func.__name__}"
         
-        tool_registry.register_tool(
-            tool_name=tool_func.name if hasattr(tool_func, 'name') else tool_func.__name__,
-            tool_func=tool_func,
-            description=description
-        )
+        tool_entries.append((
+            tool_func.name if hasattr(tool_func, 'name') else tool_func.__name__,
+            tool_func,
+            description
+        ))
+    tool_registry.register_tools(tool_entries)
     
     # 增强的系统提示词
     system_prompt = """你是HDFS集群问题诊断专家，具备以下能力：
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BM25 倒排索引
+Hadoop 故障大多体现为精确的词：异常类名（ReplicaNotFoundException、java.net.ConnectException）、
+block ID、主机名/IP 等，句子嵌入模型对这类词不敏感。知识库在 FAISS 旁边维护一个 BM25 倒排索引，
+检索时与向量检索的结果按倒数排名融合（RRF）；查询本身就是堆栈/异常签名时只做词法检索，不调用嵌入模型。
+（独立模块，不依赖其他文件）
+
+词的切分：
+- 标识符（小写），驼峰拆分后的各部分：ReplicaNotFoundException -> replicanotfoundexception、replica、not、found、exception
+- 带点的完整类名：java.net.ConnectException -> java.net.connectexception（同时也有 java、net、connectexception ...）
+- block ID 及其不带生成戳的前缀：blk_1073741825_1001 -> blk_1073741825_1001、blk_1073741825
+- IPv4 地址、3 位以上的数字（端口、ID 等）
+- 中文：相邻两字（单独一个字时为单字）
+"""
+
+import math
+import heapq
+import pickle
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_DOTTED_RE = re.compile(r'[A-Za-z_$][A-Za-z0-9_$]*(?:\.[A-Za-z_$][A-Za-z0-9_$]*)+')
+_WORD_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_$]*')
+# 驼峰拆分：IOException -> IO, Exception
+_CAMEL_RE = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+_IP_RE = re.compile(r'\d{1,3}(?:\.\d{1,3}){3}')
+_NUMBER_RE = re.compile(r'(?<![A-Za-z0-9_.])\d{3,}(?![A-Za-z0-9_])')
+_BLOCK_ID_RE = re.compile(r'^(blk_-?\d+)_\d+$', re.IGNORECASE)
+_CJK_RE = re.compile(r'[\u4e00-\u9fff]+')
+
+# 签名查询：堆栈帧、异常类名开头的行、带异常类名或 block ID 的日志行
+_EXCEPTION_RE = re.compile(r'(?:[a-z][A-Za-z0-9_$]*\.)*[A-Z][A-Za-z0-9_$]*(?:Exception|Error|Throwable)\b')
+_FRAME_RE = re.compile(r'^\s*at\s+[\w$.<>]+\(.*\)\s*$')
+_ELLIPSIS_FRAME_RE = re.compile(r'^\s*\.\.\.\s*\d+\s+more\s*$')
+_EXCEPTION_LINE_RE = re.compile(
+    r'^\s*(?:Caused by:\s*|Exception in thread "[^"]*"\s*)?' + _EXCEPTION_RE.pattern
+)
+_LOG_LINE_RE = re.compile(r'^\s*\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}')
+_BLOCK_RE = re.compile(r'\bblk_-?\d+(?:_\d+)?\b')
+
+
+def lexical_terms(text: str) -> List[str]:
+    """把文本切分为 BM25 的词（可重复，用于计算词频）"""
+    terms = []
+    for dotted in _DOTTED_RE.findall(text):
+        terms.append(dotted.lower())
+    for word in _WORD_RE.findall(text):
+        if len(word) >= 2:
+            terms.append(word.lower())
+        parts = _CAMEL_RE.findall(word.replace("_", " ").replace("$", " "))
+        if len(parts) > 1:
+            terms.extend(part.lower() for part in parts if len(part) >= 2 and not part.isdigit())
+        block = _BLOCK_ID_RE.match(word)
+        if block:
+            terms.append(block.group(1).lower())
+    terms.extend(_IP_RE.findall(text))
+    terms.extend(_NUMBER_RE.findall(text))
+    for run in _CJK_RE.findall(text):
+        if len(run) == 1:
+            terms.append(run)
+        terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def is_signature_query(query: str) -> bool:
+    """
+    查询是否为堆栈/异常签名（可以只做词法检索）
+
+    每个非空行都是以下之一，且不含中文：
+    堆栈帧（at ...(...)）、"... N more"、以异常类名开头的行（可带 "Caused by:"）、
+    带异常类名或 block ID 的日志行、block ID
+    """
+    if not query or not query.strip() or _CJK_RE.search(query):
+        return False
+    for line in query.splitlines():
+        if not line.strip():
+            continue
+        if _FRAME_RE.match(line) or _ELLIPSIS_FRAME_RE.match(line) or _EXCEPTION_LINE_RE.match(line):
+            continue
+        if _LOG_LINE_RE.match(line) and (_EXCEPTION_RE.search(line) or _BLOCK_RE.search(line)):
+            continue
+        if _BLOCK_RE.fullmatch(line.strip()):
+            continue
+        return False
+    return True
+
+
+class BM25Index:
+    """BM25 倒排索引（文档以知识库的 docstore ID 标识）"""
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}  # 词 -> {文档ID: 词频}
+        self._doc_len: Dict[str, int] = {}
+        self._total_len = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._doc_len
+
+    def add_many(self, ids: Iterable[str], texts: Iterable[str]):
+        """添加文档（已存在的 ID 跳过）"""
+        with self._lock:
+            for doc_id, text in zip(ids, texts):
+                if doc_id in self._doc_len:
+                    continue
+                counts = Counter(lexical_terms(text))
+                for term, tf in counts.items():
+                    self._postings.setdefault(term, {})[doc_id] = tf
+                length = sum(counts.values())
+                self._doc_len[doc_id] = length
+                self._total_len += length
+
+    def _idf(self, df: int) -> float:
+        n = len(self._doc_len)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, top_k: int = 10, min_match: float = 0.0) -> List[Tuple[str, float, float]]:
+        """
+        检索
+
+        Args:
+            query: 查询字符串
+            top_k: 返回的文档数
+            min_match: 文档命中的查询词 IDF 之和占（索引中出现过的）查询词 IDF 之和的最小比例（0~1），
+                       过滤只命中 "exception" 这类常见词的文档；"怎么处理" 这类索引中没有的词不计入
+
+        Returns:
+            [(文档ID, BM25 分数, 覆盖比例)]，按 BM25 分数降序；覆盖比例即 min_match 比较的值（0~1）
+        """
+        terms = set(lexical_terms(query))
+        if not terms:
+            return []
+        with self._lock:
+            if not self._doc_len:
+                return []
+            avg_len = self._total_len / len(self._doc_len)
+            scores: Dict[str, float] = {}
+            matched: Dict[str, float] = {}
+            total_idf = 0.0
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = self._idf(len(postings))
+                total_idf += idf
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[doc_id] / avg_len)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+                    matched[doc_id] = matched.get(doc_id, 0.0) + idf
+        min_idf = min_match * total_idf
+        return heapq.nlargest(
+            top_k,
+            ((doc_id, score, matched[doc_id] / total_idf) for doc_id, score in scores.items()
+             if matched[doc_id] >= min_idf),
+            key=lambda x: x[1]
+        )
+
+    def save(self, path: str):
+        with self._lock:
+            with open(path, "wb") as f:
+                pickle.dump((self._postings, self._doc_len, self._total_len), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        index = cls()
+        # 本地文件由本程序生成，直接反序列化
+        with open(path, "rb") as f:
+            index._postings, index._doc_len, index._total_len = pickle.load(f)
+        return index
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], top_k: int, k: int = 60) -> List[Tuple[str, float]]:
+    """
+    倒数排名融合（RRF）：分数 = Σ 1 / (k + 排名)，再除以各列表都排第一时的分数，归一化到 0~1
+
+    分数只反映排名，不同次融合的分数不可比较；合并多个来源（如多个知识库）时应先合并为一个排名再融合一次。
+
+    Args:
+        rankings: 多个排好序的 ID 列表（空列表也计入归一化：只在一个列表中排第一的 ID 得分为 1/len(rankings)）
+        top_k: 返回的 ID 数
+        k: RRF 平滑常数
+
+    Returns:
+        [(ID, 融合分数)]，按分数降序
+    """
+    if not any(rankings):
+        return []
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    best = len(rankings) / (k + 1)
+    return [(item, score / best) for item, score in heapq.nlargest(top_k, scores.items(), key=lambda x: x[1])]
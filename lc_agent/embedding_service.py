@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+句子嵌入服务
+整个进程共享一个延迟加载的 SentenceTransformer 模型（工具匹配和知识库共用），
+提供批量 encode 接口，并按文本哈希缓存嵌入向量：
+- 内存 LRU 缓存：重复的查询/工具描述直接命中
+- 磁盘缓存（SQLite）：进程重启后已计算过的文本不再重新编码
+（独立模块，不依赖其他文件）
+"""
+
+import os
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# 设置sentence-transformers模型缓存目录为D:\models
+# Windows路径处理：使用 os.path.join("D:\\", "models") 或直接使用 "D:\\models"
+MODEL_CACHE_DIR = os.path.join("D:\\", "models")  # Windows正确格式
+os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+# 设置环境变量（sentence-transformers会使用这个目录）
+os.environ['TRANSFORMERS_CACHE'] = MODEL_CACHE_DIR
+os.environ['HF_HOME'] = MODEL_CACHE_DIR
+
+# 如果使用sentence-transformers
+try:
+    from sentence_transformers import SentenceTransformer
+    SENTENCE_TRANSFORMER_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMER_AVAILABLE = False
+    logging.warning("sentence-transformers未安装，将使用简化版嵌入模型")
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 模型配置：优先使用项目内的本地模型，否则使用在线模型（下载到 MODEL_CACHE_DIR）
+LOCAL_MODEL_PATH = os.path.join(_PROJECT_ROOT, "models/sentence-transformer")
+ONLINE_MODEL_NAME = 'sentence-transformers/all-mpnet-base-v2'
+SIMPLE_EMBEDDING_DIM = 384  # 模型不可用时简化版嵌入的维度
+
+# 缓存配置
+EMBEDDING_BATCH_SIZE = 32  # 每批编码的文本数
+EMBEDDING_LRU_SIZE = 4096  # 内存缓存的向量条数
+EMBEDDING_DISK_CACHE_ENABLED = os.getenv("EMBEDDING_DISK_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+EMBEDDING_DISK_CACHE_PATH = os.path.join(_PROJECT_ROOT, "models", "embedding_cache.db")
+BUSY_TIMEOUT = 30  # 等待其它进程释放写锁的时间（秒）
+
+
+class EmbeddingDiskCache:
+    """嵌入向量磁盘缓存（SQLite，键为 模型标识 + 文本 的哈希）"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL
+                ) WITHOUT ROWID
+                """
+            )
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        conn = self._connect()
+        try:
+            # 分批查询，避免超过 SQLite 参数个数上限
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        finally:
+            conn.close()
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        if not items:
+            return
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    ((key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items())
+                )
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+
+class EmbeddingService:
+    """进程共享的句子嵌入服务"""
+
+    def __init__(self, model_path: Optional[str] = None, lru_size: int = EMBEDDING_LRU_SIZE,
+                 disk_cache_path: Optional[str] = None):
+        """
+        Args:
+            model_path: 模型路径或名称，默认使用 LOCAL_MODEL_PATH（存在时）或 ONLINE_MODEL_NAME
+            lru_size: 内存缓存的向量条数
+            disk_cache_path: 磁盘缓存路径，为 None 时不使用磁盘缓存
+        """
+        if model_path is None:
+            model_path = LOCAL_MODEL_PATH if os.path.exists(LOCAL_MODEL_PATH) else ONLINE_MODEL_NAME
+        self.model_path = model_path
+        self.lru_size = lru_size
+        self._model = None
+        self._model_loaded = False
+        self._load_lock = threading.Lock()
+        self._lru: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lru_lock = threading.Lock()
+        self._disk_cache = None
+        if disk_cache_path:
+            try:
+                self._disk_cache = EmbeddingDiskCache(disk_cache_path)
+            except Exception as e:
+                logging.warning(f"初始化嵌入向量磁盘缓存失败: {e}")
+
+    # ==================== 模型 ====================
+
+    @property
+    def model(self):
+        """SentenceTransformer 模型（首次访问时加载；不可用时为 None）"""
+        if not self._model_loaded:
+            with self._load_lock:
+                if not self._model_loaded:
+                    self._model = self._load_model()
+                    self._model_loaded = True
+        return self._model
+
+    def _load_model(self):
+        if not SENTENCE_TRANSFORMER_AVAILABLE:
+            return None
+        try:
+            if os.path.exists(self.model_path):
+                model = SentenceTransformer(self.model_path)
+            else:
+                # 使用在线模型，指定缓存目录
+                model = SentenceTransformer(self.model_path, cache_folder=MODEL_CACHE_DIR)
+            logging.info(f"已加载嵌入模型: {self.model_path}")
+            return model
+        except Exception as e:
+            logging.warning(f"加载sentence-transformer失败: {e}，使用简化版")
+            return None
+
+    @property
+    def available(self) -> bool:
+        """是否使用真实的嵌入模型（否则为简化版零向量）"""
+        return self.model is not None
+
+    @property
+    def model_id(self) -> str:
+        """模型标识（缓存键的一部分，换模型后旧的缓存自动失效；不会触发模型加载）"""
+        if not SENTENCE_TRANSFORMER_AVAILABLE or (self._model_loaded and self._model is None):
+            return f"simple-{SIMPLE_EMBEDDING_DIM}"
+        return os.path.basename(os.path.normpath(self.model_path)) or self.model_path
+
+    @property
+    def dimension(self) -> int:
+        if self.model is None:
+            return SIMPLE_EMBEDDING_DIM
+        return int(self.model.get_sentence_embedding_dimension())
+
+    # ==================== 编码 ====================
+
+    def _cache_key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.model_id}\0{text}".encode("utf-8")).hexdigest()
+
+    def encode(self, texts: Sequence[str], batch_size: int = EMBEDDING_BATCH_SIZE,
+               normalize: bool = False) -> np.ndarray:
+        """
+        批量编码
+
+        依次查内存缓存、磁盘缓存，只有未命中的文本（去重后）交给模型批量编码。
+
+        Args:
+            texts: 文本列表
+            batch_size: 模型每批编码的文本数
+            normalize: 是否把每个向量归一化为单位长度（零向量保持不变）
+
+        Returns:
+            float32 矩阵，形状 (len(texts), dimension)
+        """
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        if self.model is None:
+            return np.zeros((len(texts), SIMPLE_EMBEDDING_DIM), dtype=np.float32)
+
+        keys = [self._cache_key(text) for text in texts]
+        vectors: Dict[str, np.ndarray] = {}
+        with self._lru_lock:
+            for key in keys:
+                vector = self._lru.get(key)
+                if vector is not None:
+                    self._lru.move_to_end(key)
+                    vectors[key] = vector
+
+        missing = list(dict.fromkeys(key for key in keys if key not in vectors))
+        if missing and self._disk_cache is not None:
+            try:
+                found = self._disk_cache.get_many(missing)
+            except Exception as e:
+                logging.warning(f"读取嵌入向量磁盘缓存失败: {e}")
+                found = {}
+            vectors.update(found)
+            self._remember(found)
+            missing = [key for key in missing if key not in found]
+
+        if missing:
+            text_by_key = dict(zip(keys, texts))
+            encoded = self.model.encode(
+                [text_by_key[key] for key in missing],
+                batch_size=batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            ).astype(np.float32)
+            new_vectors = dict(zip(missing, encoded))
+            vectors.update(new_vectors)
+            self._remember(new_vectors)
+            if self._disk_cache is not None:
+                try:
+                    self._disk_cache.put_many(new_vectors)
+                except Exception as e:
+                    logging.warning(f"写入嵌入向量磁盘缓存失败: {e}")
+
+        matrix = np.stack([vectors[key] for key in keys])
+        if normalize:
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+        return matrix
+
+    def encode_one(self, text: str, normalize: bool = False) -> np.ndarray:
+        """编码单个文本，返回 float32 向量"""
+        return self.encode([text], normalize=normalize)[0]
+
+    def _remember(self, vectors: Dict[str, np.ndarray]):
+        if not vectors:
+            return
+        with self._lru_lock:
+            for key, vector in vectors.items():
+                self._lru[key] = vector
+                self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def clear_cache(self):
+        """清空内存缓存"""
+        with self._lru_lock:
+            self._lru.clear()
+
+
+_embedding_service: Optional[EmbeddingService] = None
+_embedding_service_lock = threading.Lock()
+
+
+def get_embedding_service() -> EmbeddingService:
+    """获取全局嵌入服务（模型在第一次编码时才加载）"""
+    global _embedding_service
+    with _embedding_service_lock:
+        if _embedding_service is None:
+            _embedding_service = EmbeddingService(
+                disk_cache_path=EMBEDDING_DISK_CACHE_PATH if EMBEDDING_DISK_CACHE_ENABLED else None
+            )
+        return _embedding_service
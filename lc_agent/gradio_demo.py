@@ -14,13 +14,17 @@ HDFS 集群监控 Agent - Gradio Web 界面版本（LangChain + vLLM）
 import gradio as gr
 import sys
 import os
+import threading
 
 # 添加父目录到路径，以便导入现有模块
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # 导入 LangChain Agent
-from lc_agent.agent import create_agent_instance, export_to_word, export_to_pdf
-from lc_agent.monitor_collector import collect_all_metrics, format_metrics_for_display
+from lc_agent.agent import create_agent_instance, export_to_word, export_to_pdf, clear_log_snapshot_cache
+from lc_agent.monitor_collector import (
+    format_metrics_for_display, get_latest_metrics, get_metric_sparklines, get_metrics_scheduler,
+    metric_cells, refresh_metrics, start_metrics_scheduler
+)
 
 # 全局 Agent 实例和当前模型
 agent = None
@@ -28,6 +32,13 @@ current_model = "qwen-8b"  # 当前使用的模型
 # 存储最后一次的Agent回复（用于文档导出）
 last_agent_response = ""
 
+# 实时监控：面板按此间隔检查后台调度器是否发布了新结果（只读缓存，不触发采集），只推送变化的单元格
+LIVE_REFRESH_INTERVAL = 1.0  # 秒
+
+# 趋势小图缓存（按采集结果版本号，所有页面共用）
+_sparkline_cache = {"version": None, "sparklines": {}}
+_sparkline_lock = threading.Lock()
+
 # 模型名称映射（前端显示名称 -> 内部模型名称）
 MODEL_NAME_MAP = {
     "Qwen-8B (vLLM)": "qwen-8b",
@@ -105,15 +116,86 @@ def init_agent(model_name: str = "qwen-8b"):
     return agent
 
 
-def update_monitoring_display():
-    """更新监控数据显示"""
+def _get_sparklines(version, metrics_data):
+    """同一版本的采集结果只查询一次指标历史"""
+    with _sparkline_lock:
+        if version is not None and _sparkline_cache["version"] == version:
+            return _sparkline_cache["sparklines"]
+    sparklines = get_metric_sparklines(metrics_data)
+    with _sparkline_lock:
+        _sparkline_cache.update(version=version, sparklines=sparklines)
+    return sparklines
+
+
+def _wrap_monitoring_html(html_content, version):
+    # data-mc-version 记录面板当前内容对应的版本，前端据此丢弃过期的局部更新
+    return f"<div data-mc-version='{version or 0}'>{html_content}</div>"
+
+
+def update_monitoring_display(force_refresh: bool = False):
+    """
+    更新监控数据显示（整体重绘）
+    
+    读取后台调度器发布的最新采集结果，多个页面同时打开也只会采集一次；
+    force_refresh=True 时（手动刷新）立即重新采集。
+    
+    Returns:
+        (HTML, 实时模式状态)
+    """
     try:
-        metrics_data = collect_all_metrics()
-        html_content = format_metrics_for_display(metrics_data)
-        return html_content
+        metrics_data = refresh_metrics() if force_refresh else get_latest_metrics()
+        version, _ = get_metrics_scheduler().snapshot()
+        sparklines = _get_sparklines(version, metrics_data)
+        html_content = format_metrics_for_display(metrics_data, sparklines)
+        # 版本号置空：下一次定时检查与本次渲染的单元格比较，只推送差异
+        live_state = {"version": None, "cells": metric_cells(metrics_data, sparklines)}
+        return _wrap_monitoring_html(html_content, version), live_state
     except Exception as e:
         error_html = f"<div style='color: red; padding: 20px;'>❌ 获取监控数据失败: {str(e)}</div>"
-        return error_html
+        return error_html, {"version": None, "cells": {}}
+
+
+def live_monitoring_tick(live_state):
+    """
+    实时模式定时回调：后台调度器发布新结果后，只把内容变化的单元格推送到前端
+    
+    Returns:
+        (整体 HTML 或 gr.skip(), 局部更新 {"version", "cells"} 或 gr.skip(), 新状态)
+    """
+    start_metrics_scheduler()
+    version, metrics_data = get_metrics_scheduler().snapshot()
+    live_state = live_state or {}
+    if metrics_data is None or version == live_state.get("version"):
+        return gr.skip(), gr.skip(), live_state
+    
+    sparklines = _get_sparklines(version, metrics_data)
+    cells = metric_cells(metrics_data, sparklines)
+    old_cells = live_state.get("cells") or {}
+    new_state = {"version": version, "cells": cells}
+    if cells.keys() != old_cells.keys():
+        # 布局变化（节点异常/恢复、指标增减）：整体重绘
+        html_content = format_metrics_for_display(metrics_data, sparklines)
+        return _wrap_monitoring_html(html_content, version), gr.skip(), new_state
+    
+    changed = {cell_id: content for cell_id, content in cells.items() if old_cells.get(cell_id) != content}
+    if not changed:
+        return gr.skip(), gr.skip(), new_state
+    return gr.skip(), {"version": version, "cells": changed}, new_state
+
+
+# 前端应用局部更新：按 DOM id 替换单元格内容，忽略早于当前面板内容的更新
+APPLY_METRIC_PATCH_JS = """
+(patch) => {
+    const root = document.querySelector('#monitoring-display [data-mc-version]');
+    if (!patch || !patch.cells || !root) return;
+    if (patch.version <= Number(root.dataset.mcVersion)) return;
+    for (const [id, html] of Object.entries(patch.cells)) {
+        const el = document.getElementById(id);
+        if (el) el.innerHTML = html;
+    }
+    root.dataset.mcVersion = patch.version;
+}
+"""
 
 
 def create_gradio_interface():
@@ -158,17 +240,40 @@ def create_gradio_interface():
                     elem_id="monitoring-display"
                 )
                 
+                # 实时模式：定时读取共享缓存，只推送变化的单元格
+                live_state = gr.State({"version": None, "cells": {}})
+                metric_patch = gr.JSON(visible=False)
+                live_timer = gr.Timer(LIVE_REFRESH_INTERVAL, active=True)
+                live_checkbox = gr.Checkbox(label="实时模式", value=True)
+                
+                live_timer.tick(
+                    fn=live_monitoring_tick,
+                    inputs=live_state,
+                    outputs=[monitoring_html, metric_patch, live_state],
+                    show_progress="hidden"
+                ).then(
+                    fn=None,
+                    inputs=metric_patch,
+                    outputs=None,
+                    js=APPLY_METRIC_PATCH_JS
+                )
+                live_checkbox.change(
+                    fn=lambda enabled: gr.Timer(active=enabled),
+                    inputs=live_checkbox,
+                    outputs=live_timer
+                )
+                
                 # 刷新按钮
                 refresh_btn = gr.Button("🔄 手动刷新", variant="primary", size="sm")
                 
                 def refresh_monitoring():
                     """手动刷新监控数据""" 
-                    return update_monitoring_display()
+                    return update_monitoring_display(force_refresh=True)
                 
                 refresh_btn.click(
                     fn=refresh_monitoring,
                     inputs=None,
-                    outputs=monitoring_html
+                    outputs=[monitoring_html, live_state]
                 )
                 
                 # 导出按钮（两个按钮同行，宽度加起来等于刷新按钮）
@@ -322,6 +427,9 @@ def create_gradio_interface():
                 current_agent = init_agent(model_name)
                 print(f"[DEBUG] ✅ Agent获取成功，开始处理消息...")
                 
+                # 新一轮对话：清空上一轮的日志快照，本轮内的工具调用共享同一份日志
+                clear_log_snapshot_cache()
+                
                 # 使用新的invoke方式调用Agent
                 config = {"configurable": {"thread_id": "gradio_chat"}}
                 result = current_agent.invoke(
@@ -597,18 +705,12 @@ def create_gradio_interface():
             """
         )
         
-        # 页面加载时立即更新一次
+        # 页面加载时立即更新一次（之后由实时模式定时推送变化）
         demo.load(
             fn=update_monitoring_display,
             inputs=None,
-            outputs=monitoring_html
+            outputs=[monitoring_html, live_state]
         )
-        
-        # 注意：某些 Gradio 版本不支持定时自动更新
-        # 如果需要定时更新，可以：
-        # 1. 使用手动刷新按钮（已实现）
-        # 2. 或者升级 Gradio 到支持定时更新的版本
-        # 3. 或者使用 JavaScript 在前端实现定时刷新
     
     return demo
 
@@ -653,6 +755,10 @@ def main():
         # 不退出，允许用户切换到其他模型
         # sys.exit(1)
     
+    # 启动后台监控采集（界面和 Agent 工具共享采集结果）
+    start_metrics_scheduler()
+    print("[INFO] 后台监控采集已启动")
+    
     print()
     print("[INFO] 正在启动 Gradio 界面...")
     print("[INFO] 界面启动后，请在浏览器中打开显示的 URL")
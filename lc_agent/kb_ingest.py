@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+知识库导入流水线
+把目录中的文档（Hadoop 官方文档、故障复盘等）逐个文件流式读取，切分为按词数限定、相互重叠的片段，
+跳过重复和近似重复的片段后批量写入知识库：
+- 完全重复：规范化文本（合并空白、转小写）的哈希相同
+- 近似重复：MinHash 签名 + LSH 分桶找候选，估计的 Jaccard 相似度达到阈值即视为重复
+去重索引保存在知识库向量存储目录下的 SQLite（WAL 模式）中，重复导入同一目录不会产生重复文档；
+每次导入前与 docstore 中片段的 content_hash 核对，两者不一致（如向量存储被删除或回退）时从 docstore 重建。
+每个片段的元数据记录来源、片段序号和字符偏移；从文件导入的片段还记录起始行号。
+"""
+
+import os
+import re
+import zlib
+import hashlib
+import logging
+import sqlite3
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# LangChain 1.0+ 移除了 langchain.docstore，Document 位于 langchain_core
+try:
+    from langchain_core.documents import Document
+except ImportError:
+    from langchain.docstore.document import Document
+
+# 切分配置
+INGEST_CHUNK_TOKENS = 200  # 每个片段的最大词数（中文按字计；低于嵌入模型的最大输入长度）
+INGEST_CHUNK_OVERLAP = 40  # 相邻片段重叠的词数
+INGEST_SEGMENT_CHARS = 256 * 1024  # 流式读取时每段的字符数（在空行处断开）
+INGEST_FILE_EXTENSIONS = (".txt", ".md", ".markdown", ".rst", ".log")
+INGEST_FLUSH_DOCS = 1024  # 累积多少个片段写入一次知识库
+
+# 去重配置
+MINHASH_NUM_PERM = 64  # MinHash 签名长度
+MINHASH_BANDS = 16  # LSH 分桶数（每桶 MINHASH_NUM_PERM / MINHASH_BANDS 行）
+MINHASH_SHINGLE = 3  # 以连续 3 个词为一个 shingle
+NEAR_DUP_THRESHOLD = 0.85  # 估计的 Jaccard 相似度达到该值视为近似重复
+DEDUP_DB_FILE = "dedup.db"  # 位于 KnowledgeBase.vector_store_dir 下，与索引放在一起
+BUSY_TIMEOUT = 30  # 等待其它进程释放写锁的时间（秒）
+
+# 词：中文单字、英文/数字串、其它单个符号
+_TOKEN_RE = re.compile(r'[\u4e00-\u9fff]|[A-Za-z0-9_]+|[^\sA-Za-z0-9_\u4e00-\u9fff]')
+# 句末：切分时优先在这些词之后断开
+_SENTENCE_END = {"。", "！", "？", "；", ".", "!", "?", ";"}
+_WHITESPACE_RE = re.compile(r'\s+')
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = np.random.RandomState(20240601)  # 固定种子：签名在不同进程间可比较
+_PERM_A = _rng.randint(1, 1 << 31, size=MINHASH_NUM_PERM, dtype=np.int64).astype(np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, size=MINHASH_NUM_PERM, dtype=np.int64).astype(np.uint64)
+
+
+def content_hash(text: str) -> str:
+    """规范化文本（合并空白、转小写）的哈希"""
+    return hashlib.sha1(_WHITESPACE_RE.sub(" ", text).strip().lower().encode("utf-8")).hexdigest()
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    """
+    MinHash 签名（uint64 数组，长度 MINHASH_NUM_PERM）
+
+    shingle 为连续 MINHASH_SHINGLE 个小写词；两个签名相同位置相等的比例即 Jaccard 相似度的估计。
+    """
+    words = [token.lower() for token in _TOKEN_RE.findall(text)]
+    if len(words) <= MINHASH_SHINGLE:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + MINHASH_SHINGLE]) for i in range(len(words) - MINHASH_SHINGLE + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    # (a * x + b) mod p：a、x 都小于 2^32，乘积不会溢出 uint64
+    permuted = (np.outer(hashes, _PERM_A) + _PERM_B) % np.uint64(_MERSENNE_PRIME)
+    return permuted.min(axis=0)
+
+
+def _band_keys(signature: np.ndarray) -> List[str]:
+    rows = MINHASH_NUM_PERM // MINHASH_BANDS
+    return [
+        hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(), digest_size=8).hexdigest()
+        for band in range(MINHASH_BANDS)
+    ]
+
+
+def split_text(text: str, chunk_tokens: int = INGEST_CHUNK_TOKENS,
+               overlap: int = INGEST_CHUNK_OVERLAP) -> Iterator[Tuple[int, int, str]]:
+    """
+    切分为按词数限定、相互重叠的片段
+
+    片段尽量在句末断开（窗口后 1/4 内有句末时）；相邻片段重叠 overlap 个词。
+
+    Returns:
+        (起始字符偏移, 结束字符偏移, 片段文本) 的迭代器
+    """
+    spans = [(m.start(), m.end(), m.group()) for m in _TOKEN_RE.finditer(text)]
+    overlap = min(overlap, chunk_tokens // 2)
+    start = 0
+    while start < len(spans):
+        end = min(start + chunk_tokens, len(spans))
+        if end < len(spans):
+            for i in range(end - 1, end - 1 - chunk_tokens // 4, -1):
+                if spans[i][2] in _SENTENCE_END:
+                    end = i + 1
+                    break
+        begin, finish = spans[start][0], spans[end - 1][1]
+        yield begin, finish, text[begin:finish]
+        if end >= len(spans):
+            break
+        start = max(end - overlap, start + 1)
+
+
+def iter_files(directory: str, extensions: Iterable[str] = INGEST_FILE_EXTENSIONS) -> Iterator[str]:
+    """按路径顺序遍历目录下指定扩展名的文件"""
+    extensions = tuple(ext.lower() for ext in extensions)
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(extensions):
+                yield os.path.join(root, name)
+
+
+def _iter_segments(path: str, segment_chars: int = INGEST_SEGMENT_CHARS) -> Iterator[Tuple[int, int, str]]:
+    """
+    流式读取文件，按约 segment_chars 个字符分段（在空行处断开，超过两倍仍无空行时强制断开）；
+    各段分别切分，片段重叠不跨越段边界
+
+    Returns:
+        (段起始字符偏移, 段起始行号, 段文本) 的迭代器
+    """
+    offset, line_no = 0, 1
+    lines: List[str] = []
+    size = 0
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            lines.append(line)
+            size += len(line)
+            if size >= 2 * segment_chars or (size >= segment_chars and not line.strip()):
+                yield offset, line_no, "".join(lines)
+                offset += size
+                line_no += len(lines)
+                lines, size = [], 0
+    if lines:
+        yield offset, line_no, "".join(lines)
+
+
+class DedupIndex:
+    """片段去重索引（SQLite：内容哈希、MinHash 签名及其 LSH 分桶）"""
+
+    def __init__(self, db_path: str, threshold: float = NEAR_DUP_THRESHOLD):
+        self.db_path = db_path
+        self.threshold = threshold
+        self._pending: List[Tuple[str, np.ndarray, List[str]]] = []
+        self._pending_hashes: Dict[str, np.ndarray] = {}
+        self._pending_buckets: Dict[Tuple[int, str], List[str]] = {}
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                hash TEXT PRIMARY KEY,
+                signature BLOB NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS bands (
+                band INTEGER NOT NULL,
+                bucket TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                PRIMARY KEY (band, bucket, hash)
+            ) WITHOUT ROWID;
+            """
+        )
+
+    def close(self):
+        self._conn.close()
+
+    def sync(self, documents: Dict[str, str]) -> bool:
+        """
+        与知识库中实际存在的片段核对，不一致时重建去重索引
+
+        Args:
+            documents: {内容哈希: 片段文本}，来自 docstore 中带 content_hash 元数据的文档
+
+        Returns:
+            是否重建了索引
+        """
+        stored = {row[0] for row in self._conn.execute("SELECT hash FROM chunks")}
+        if stored == documents.keys():
+            return False
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.execute("DELETE FROM bands")
+            for digest, text in documents.items():
+                signature = minhash_signature(text)
+                self._conn.execute(
+                    "INSERT INTO chunks (hash, signature) VALUES (?, ?)", (digest, signature.tobytes())
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO bands (band, bucket, hash) VALUES (?, ?, ?)",
+                    ((band, bucket, digest) for band, bucket in enumerate(_band_keys(signature)))
+                )
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+        logging.info(
+            f"去重索引与知识库不一致（索引 {len(stored)} 条，知识库 {len(documents)} 条），已从知识库重建"
+        )
+        return True
+
+    def check(self, text: str) -> Tuple[Optional[str], str, np.ndarray, List[str]]:
+        """
+        检查片段是否重复（包括已写入的和本批待写入的）
+
+        Returns:
+            (重复类型 "exact"/"near"/None, 内容哈希, 签名, LSH 分桶)
+        """
+        digest = content_hash(text)
+        if digest in self._pending_hashes or self._conn.execute(
+                "SELECT 1 FROM chunks WHERE hash = ?", (digest,)).fetchone():
+            return "exact", digest, None, None
+        signature = minhash_signature(text)
+        buckets = _band_keys(signature)
+
+        candidates = set()
+        for band, bucket in enumerate(buckets):
+            candidates.update(self._pending_buckets.get((band, bucket), ()))
+        rows = self._conn.execute(
+            f"SELECT DISTINCT c.hash, c.signature FROM bands b JOIN chunks c ON c.hash = b.hash "
+            f"WHERE {' OR '.join(['(b.band = ? AND b.bucket = ?)'] * len(buckets))}",
+            [value for band, bucket in enumerate(buckets) for value in (band, bucket)]
+        ).fetchall()
+        others = [np.frombuffer(blob, dtype=np.uint64) for _, blob in rows]
+        others.extend(self._pending_hashes[h] for h in candidates)
+        for other in others:
+            if np.mean(other == signature) >= self.threshold:
+                return "near", digest, signature, buckets
+        return None, digest, signature, buckets
+
+    def add(self, digest: str, signature: np.ndarray, buckets: List[str]):
+        """登记一个待写入的片段（commit() 后才持久化）"""
+        self._pending.append((digest, signature, buckets))
+        self._pending_hashes[digest] = signature
+        for band, bucket in enumerate(buckets):
+            self._pending_buckets.setdefault((band, bucket), []).append(digest)
+
+    def commit(self):
+        """持久化待写入的片段（片段写入知识库成功后调用）"""
+        if not self._pending:
+            return
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO chunks (hash, signature) VALUES (?, ?)",
+                ((digest, signature.tobytes()) for digest, signature, _ in self._pending)
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO bands (band, bucket, hash) VALUES (?, ?, ?)",
+                ((band, bucket, digest) for digest, _, buckets in self._pending
+                 for band, bucket in enumerate(buckets))
+            )
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+        self.rollback()
+
+    def rollback(self):
+        """丢弃待写入的片段"""
+        self._pending.clear()
+        self._pending_hashes.clear()
+        self._pending_buckets.clear()
+
+
+def _docstore_hashes(kb) -> Dict[str, str]:
+    """知识库中由导入流水线写入的片段：{内容哈希: 片段文本}"""
+    store = kb.vector_store
+    documents = {}
+    for doc_id in store.index_to_docstore_id.values():
+        doc = store.docstore.search(doc_id)
+        digest = doc.metadata.get("content_hash") if isinstance(doc, Document) else None
+        if digest:
+            documents[digest] = doc.page_content
+    return documents
+
+
+class KnowledgeIngestor:
+    """把文本/目录切分、去重后批量写入一个知识库"""
+
+    def __init__(self, kb, chunk_tokens: int = INGEST_CHUNK_TOKENS, overlap: int = INGEST_CHUNK_OVERLAP,
+                 threshold: float = NEAR_DUP_THRESHOLD, flush_docs: int = INGEST_FLUSH_DOCS):
+        """
+        Args:
+            kb: KnowledgeBase 实例（使用其 vector_store_dir、vector_store 和 add_documents）
+            chunk_tokens: 每个片段的最大词数
+            overlap: 相邻片段重叠的词数
+            threshold: 近似重复的 Jaccard 相似度阈值
+            flush_docs: 累积多少个片段写入一次知识库
+        """
+        self.kb = kb
+        self.chunk_tokens = chunk_tokens
+        self.overlap = overlap
+        self.flush_docs = flush_docs
+        self.dedup = DedupIndex(os.path.join(kb.vector_store_dir, DEDUP_DB_FILE), threshold)
+        try:
+            self.dedup.sync(_docstore_hashes(kb))
+        except BaseException:
+            self.dedup.close()
+            raise
+        self._buffer: List[Document] = []
+        self.stats = {"files": 0, "chunks": 0, "added": 0, "exact_duplicates": 0, "near_duplicates": 0}
+
+    def __enter__(self) -> "KnowledgeIngestor":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.flush()
+            else:
+                self.dedup.rollback()
+        finally:
+            self.dedup.close()
+
+    def add_text(self, text: str, metadata: Optional[Dict] = None):
+        """
+        切分一段文本并加入写入缓冲（start_offset/end_offset 为片段在该文本中的字符偏移）
+
+        Args:
+            text: 文本
+            metadata: 附加到每个片段的元数据（如 source、desc）
+        """
+        self._add_chunks(text, metadata)
+
+    def add_file(self, path: str, source: Optional[str] = None, metadata: Optional[Dict] = None):
+        """
+        流式读取一个文件并加入写入缓冲
+
+        片段按文件连续编号，元数据记录在文件中的字符偏移和起始行号。文件按段读取（见 _iter_segments），
+        相邻片段的重叠不跨越段边界（段在空行处断开，即不跨段落）。
+        """
+        file_metadata = dict(metadata or {}, source=source or path)
+        index = 0
+        for offset, line_no, segment in _iter_segments(path):
+            index = self._add_chunks(segment, file_metadata, offset, line_no, index)
+        self.stats["files"] += 1
+
+    def _add_chunks(self, text: str, metadata: Optional[Dict], base_offset: int = 0,
+                    base_line: Optional[int] = None, first_index: int = 0) -> int:
+        """
+        切分、去重后加入写入缓冲
+
+        Args:
+            base_offset: 文本在来源文件中的起始字符偏移
+            base_line: 文本在来源文件中的起始行号（为 None 时不记录行号）
+            first_index: 第一个片段的编号
+
+        Returns:
+            下一个片段的编号
+        """
+        index = first_index
+        line, line_pos = base_line, 0
+        for start, end, chunk in split_text(text, self.chunk_tokens, self.overlap):
+            index += 1
+            self.stats["chunks"] += 1
+            if line is not None:
+                line += text.count("\n", line_pos, start)
+                line_pos = start
+            duplicate, digest, signature, buckets = self.dedup.check(chunk)
+            if duplicate:
+                self.stats[f"{duplicate}_duplicates"] += 1
+                continue
+            self.dedup.add(digest, signature, buckets)
+            chunk_metadata = dict(metadata or {})
+            chunk_metadata.update({
+                "chunk": index - 1,
+                "start_offset": base_offset + start,
+                "end_offset": base_offset + end,
+                "content_hash": digest,
+            })
+            if line is not None:
+                chunk_metadata["start_line"] = line
+            self._buffer.append(Document(page_content=chunk, metadata=chunk_metadata))
+            if len(self._buffer) >= self.flush_docs:
+                self.flush()
+        return index
+
+    def add_directory(self, directory: str, extensions: Iterable[str] = INGEST_FILE_EXTENSIONS,
+                      metadata: Optional[Dict] = None):
+        """导入目录下的所有文件（元数据 source 为相对路径）"""
+        for path in iter_files(directory, extensions):
+            try:
+                self.add_file(path, os.path.relpath(path, directory).replace(os.sep, "/"), metadata)
+            except OSError as e:
+                logging.warning(f"读取文件失败 {path}: {e}")
+
+    def flush(self):
+        """把缓冲的片段写入知识库，成功后登记到去重索引"""
+        if self._buffer:
+            try:
+                self.kb.add_documents(self._buffer)
+            except BaseException:
+                self.dedup.rollback()
+                self._buffer = []
+                raise
+            self.stats["added"] += len(self._buffer)
+            self._buffer = []
+        self.dedup.commit()
+
+
+def ingest_texts(kb, texts: List[str], metadatas: Optional[List[Dict]] = None, **kwargs) -> Dict[str, int]:
+    """
+    切分、去重后把文本写入知识库
+
+    Returns:
+        统计：{"files", "chunks", "added", "exact_duplicates", "near_duplicates"}
+    """
+    metadatas = metadatas or [{}] * len(texts)
+    with KnowledgeIngestor(kb, **kwargs) as ingestor:
+        for text, metadata in zip(texts, metadatas):
+            ingestor.add_text(text, metadata)
+    logging.info(f"知识库 {kb.kb_name} 导入完成: {ingestor.stats}")
+    return ingestor.stats
+
+
+def ingest_directory(kb, directory: str, extensions: Iterable[str] = INGEST_FILE_EXTENSIONS,
+                     metadata: Optional[Dict] = None, **kwargs) -> Dict[str, int]:
+    """
+    流式读取目录下的文档，切分、去重后写入知识库
+
+    Args:
+        kb: KnowledgeBase 实例
+        directory: 文档目录
+        extensions: 导入的文件扩展名
+        metadata: 附加到每个片段的元数据
+
+    Returns:
+        统计：{"files", "chunks", "added", "exact_duplicates", "near_duplicates"}
+    """
+    with KnowledgeIngestor(kb, **kwargs) as ingestor:
+        ingestor.add_directory(directory, extensions, metadata)
+    logging.info(f"知识库 {kb.kb_name} 从 {directory} 导入完成: {ingestor.stats}")
+    return ingestor.stats
@@ -7,10 +7,25 @@
 
 import os
 import json
+import pickle
+import re
+import shutil
+import struct
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import List, Dict, Optional, Tuple
-from langchain.docstore.document import Document
+# LangChain 1.0+ 移除了 langchain.docstore，Document 位于 langchain_core
+try:
+    from langchain_core.documents import Document
+except ImportError:
+    from langchain.docstore.document import Document
 # LangChain 1.0.7: 使用 langchain_community 而不是 langchain
 from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_community.docstore.in_memory import InMemoryDocstore
+import faiss
 # LangChain 1.0.7: Embeddings 接口位置可能有变化，尝试兼容导入
 try:
     from langchain.embeddings.base import Embeddings
@@ -23,78 +38,114 @@ except ImportError:
 import numpy as np
 import logging
 
-# 设置sentence-transformers模型缓存目录为D:\models
-# Windows路径处理：使用 os.path.join("D:\\", "models") 或直接使用 "D:\\models"
-MODEL_CACHE_DIR = os.path.join("D:\\", "models")  # Windows正确格式
-os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
-# 设置环境变量（sentence-transformers会使用这个目录）
-os.environ['TRANSFORMERS_CACHE'] = MODEL_CACHE_DIR
-os.environ['HF_HOME'] = MODEL_CACHE_DIR
-
-# 如果使用sentence-transformers
 try:
-    from sentence_transformers import SentenceTransformer
-    SENTENCE_TRANSFORMER_AVAILABLE = True
+    from .embedding_service import get_embedding_service
+    from .bm25_index import BM25Index, is_signature_query, reciprocal_rank_fusion
+    from .kb_ingest import ingest_directory, ingest_texts
 except ImportError:
-    SENTENCE_TRANSFORMER_AVAILABLE = False
-    logging.warning("sentence-transformers未安装，将使用简化版嵌入模型")
+    from lc_agent.embedding_service import get_embedding_service
+    from lc_agent.bm25_index import BM25Index, is_signature_query, reciprocal_rank_fusion
+    from lc_agent.kb_ingest import ingest_directory, ingest_texts
+
+# 向量索引配置：向量归一化后用内积检索，分数即余弦相似度（-1~1，越大越相似）；
+# 余弦相似度在不同知识库间可以直接比较，跨知识库检索时先按它合并各库的向量检索结果，再统一融合排名
+KB_HNSW_MIN_DOCS = 20000  # 文档数达到该值时使用 HNSW 近似索引，否则使用精确的 IndexFlatIP
+KB_HNSW_M = 32  # HNSW 每个节点的邻居数
+KB_HNSW_EF_CONSTRUCTION = 200  # HNSW 建索引时的搜索宽度
+KB_HNSW_EF_SEARCH = 128  # HNSW 检索时的搜索宽度（越大越准、越慢）
+
+# 加载配置：知识库在第一次使用时才打开索引，启动后在后台并行预加载
+KB_PRELOAD = os.getenv("KB_PRELOAD", "true").lower() in ("1", "true", "yes")  # 是否在后台预加载所有知识库
+KB_LOAD_WORKERS = 4  # 后台并行加载知识库的线程数
+KB_SEARCH_WORKERS = 8  # 跨知识库并行检索的线程数（FAISS 检索时释放 GIL）
+# 以内存映射方式打开 FAISS 索引（IO_FLAG_MMAP_IFC：IndexFlatIP/HNSW 的向量直接引用文件，不读入内存）；
+# 映射的索引只读，第一次写入前重新读入为普通索引
+KB_INDEX_MMAP = True
+KB_INDEX_FILE = "index.faiss"  # 与 FAISS.save_local 的默认文件名一致
+KB_DOCSTORE_FILE = "index.pkl"
+# 主索引的三个文件（index.faiss、index.pkl、bm25.pkl）每次合并写入新的版本目录（vector_store/v<时间戳>），
+# 写完后原子替换指针文件 CURRENT 切换版本；没有 CURRENT 的旧版知识库直接从 vector_store 下读取
+KB_CURRENT_FILE = "CURRENT"
+_VERSION_DIR_RE = re.compile(r"v\d+$")
+
+# 写入配置：新增文档追加到增量日志（delta.log），不重写整个索引；日志超过阈值时在后台合并（compact）到主索引
+KB_DELTA_FILE = "delta.log"
+KB_INGEST_BATCH_SIZE = 256  # 批量写入时每批编码的文档数
+KB_COMPACT_DELTA_BYTES = 32 * 1024 * 1024  # 增量日志超过该大小时合并
+KB_COMPACT_DELTA_RECORDS = 100  # 增量日志超过该记录数时合并
+_DELTA_HEADER = struct.Struct("<Q")  # 每条记录前的长度（字节）
+
+# 混合检索配置：向量检索和 BM25 词法检索的结果按倒数排名融合（RRF）
+# 每个返回的结果都要通过 score_threshold：向量命中按余弦相似度，词法命中按查询词 IDF 权重的覆盖比例（同为 0~1）
+KB_LEXICAL_INDEX_FILE = "bm25.pkl"  # BM25 倒排索引，与 FAISS 索引一起保存和合并
+KB_HYBRID_CANDIDATES = 20  # 每个知识库每路检索参与融合的候选数（不少于 top_k）
+KB_RRF_K = 60  # RRF 平滑常数
+KB_LEXICAL_MIN_MATCH = 0.5  # 词法命中的覆盖比例下限（score_threshold 更低时也至少为该值）
+
+
+def create_ip_index(dim: int, num_docs: int = 0) -> faiss.Index:
+    """
+    按语料规模创建内积索引：小知识库用精确的 IndexFlatIP，大知识库用 HNSW（无需训练，支持增量添加）
+    
+    Args:
+        dim: 向量维度
+        num_docs: 预计文档数
+    """
+    if num_docs >= KB_HNSW_MIN_DOCS:
+        index = faiss.IndexHNSWFlat(dim, KB_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = KB_HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = KB_HNSW_EF_SEARCH
+        return index
+    return faiss.IndexFlatIP(dim)
+
+
+def _index_matches_size(index: faiss.Index) -> bool:
+    """索引是否是内积索引，且类型与当前语料规模相符（HNSW 索引不会降级回 IndexFlatIP）"""
+    if index.metric_type != faiss.METRIC_INNER_PRODUCT:
+        return False
+    if isinstance(index, faiss.IndexHNSW):
+        return True
+    return index.ntotal < KB_HNSW_MIN_DOCS
 
 
 class SimpleEmbeddings(Embeddings):
-    """简化的嵌入模型封装"""
+    """
+    简化的嵌入模型封装（所有知识库共用进程内唯一的嵌入服务）
     
-    def __init__(self, model_name: str = "sentence-transformer"):
+    默认输出单位长度的向量，配合内积索引时分数即余弦相似度。
+    """
+    
+    def __init__(self, model_name: str = "sentence-transformer", normalize: bool = True):
         self.model_name = model_name
-        if SENTENCE_TRANSFORMER_AVAILABLE:
-            try:
-                model_path = os.path.join(
-                    os.path.dirname(os.path.dirname(__file__)),
-                    "models/sentence-transformer"
-                )
-                if os.path.exists(model_path):
-                    self.embedder = SentenceTransformer(model_path)
-                else:
-                    # 使用在线模型，指定缓存目录
-                    self.embedder = SentenceTransformer(
-                        'sentence-transformers/all-mpnet-base-v2',
-                        cache_folder=MODEL_CACHE_DIR
-                    )
-            except Exception as e:
-                logging.warning(f"加载sentence-transformer失败: {e}，使用简化版")
-                self.embedder = None
-        else:
-            self.embedder = None
+        self.normalize = normalize
+        self.service = get_embedding_service()
     
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         """嵌入文档列表"""
-        if self.embedder:
-            embeddings = self.embedder.encode(texts, convert_to_numpy=True)
-            return embeddings.tolist()
-        else:
-            # 简化版：使用简单的词频向量（实际应用中应使用真实嵌入模型）
+        if not self.service.available:
+            # 简化版：返回零向量（实际应用中应使用真实嵌入模型）
             logging.warning("使用简化版嵌入，建议安装sentence-transformers")
-            return [[0.0] * 384 for _ in texts]
+        return self.service.encode(texts, normalize=self.normalize).tolist()
     
     def embed_query(self, text: str) -> List[float]:
         """嵌入查询文本"""
-        if self.embedder:
-            embedding = self.embedder.encode(text, convert_to_numpy=True)
-            return embedding.tolist()
-        else:
+        if not self.service.available:
             logging.warning("使用简化版嵌入，建议安装sentence-transformers")
-            return [0.0] * 384
+        return self.service.encode_one(text, normalize=self.normalize).tolist()
 
 
 class KnowledgeBase:
     """知识库管理类"""
     
-    def __init__(self, kb_name: str, kb_path: Optional[str] = None):
+    def __init__(self, kb_name: str, kb_path: Optional[str] = None,
+                 embeddings: Optional[SimpleEmbeddings] = None):
         """
-        初始化知识库
+        初始化知识库（不加载索引，向量存储在第一次访问时才打开）
         
         Args:
             kb_name: 知识库名称（如：NameNodeExpert, DataNodeExpert）
             kb_path: 知识库存储路径（可选）
+            embeddings: 嵌入模型封装（可选，KnowledgeBaseManager 传入共享实例）
         """
         self.kb_name = kb_name
         self.kb_path = kb_path or os.path.join(
@@ -105,51 +156,206 @@ class KnowledgeBase:
         os.makedirs(self.kb_path, exist_ok=True)
         
         # 初始化嵌入模型
-        self.embeddings = SimpleEmbeddings()
+        self.embeddings = embeddings or SimpleEmbeddings()
         
-        # 向量存储
-        self.vector_store = None
-        self._load_or_create_vector_store()
+        # 向量存储（延迟加载）和 BM25 倒排索引（随向量存储一起加载）
+        self._vector_store: Optional[FAISS] = None
+        self._lexical_index: Optional[BM25Index] = None
+        self._mapped_index_path: Optional[str] = None  # 索引以内存映射方式打开时的文件路径
+        self._load_lock = threading.Lock()
+        # 写入（追加文档/合并）互斥
+        self._write_lock = threading.RLock()
+        self._delta_bytes = 0
+        self._delta_records = 0
+        self._compacting = False
+    
+    @property
+    def vector_store(self) -> FAISS:
+        """向量存储，第一次访问时加载（并发访问只加载一次）"""
+        if self._vector_store is None:
+            with self._load_lock:
+                if self._vector_store is None:
+                    self._load_or_create_vector_store()
+        return self._vector_store
+    
+    @vector_store.setter
+    def vector_store(self, value: Optional[FAISS]):
+        self._vector_store = value
+        self._mapped_index_path = None
+    
+    @property
+    def lexical_index(self) -> BM25Index:
+        """BM25 倒排索引（与向量存储一起加载）"""
+        self.vector_store
+        return self._lexical_index
+    
+    @property
+    def is_loaded(self) -> bool:
+        return self._vector_store is not None
+    
+    def load(self) -> "KnowledgeBase":
+        """加载向量存储（已加载时直接返回）"""
+        self.vector_store
+        return self
+    
+    def _new_vector_store(self, index: faiss.Index, docstore: Optional[InMemoryDocstore] = None,
+                          index_to_docstore_id: Optional[Dict[int, str]] = None) -> FAISS:
+        """用给定索引创建向量存储（嵌入向量已归一化，内积检索）"""
+        return FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=docstore or InMemoryDocstore(),
+            index_to_docstore_id=index_to_docstore_id or {},
+            distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+        )
+    
+    @property
+    def vector_store_dir(self) -> str:
+        """向量存储目录（CURRENT、版本目录、增量日志和导入去重索引都在其中）"""
+        return os.path.join(self.kb_path, "vector_store")
+    
+    def _current_version_path(self) -> str:
+        """CURRENT 指向的版本目录；没有 CURRENT 时（旧版知识库）返回 vector_store 目录本身"""
+        root = self.vector_store_dir
+        try:
+            with open(os.path.join(root, KB_CURRENT_FILE), "r", encoding="utf-8") as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return root
+        return os.path.join(root, version) if version else root
     
     def _load_or_create_vector_store(self):
         """加载或创建向量存储"""
-        vector_store_path = os.path.join(self.kb_path, "vector_store")
+        vector_store_path = self._current_version_path()
         
-        if os.path.exists(vector_store_path) and os.listdir(vector_store_path):
+        # 在 _load_lock 内执行：这里只读写 _vector_store，不经过 vector_store 属性
+        if os.path.exists(os.path.join(vector_store_path, KB_INDEX_FILE)):
             try:
-                self.vector_store = FAISS.load_local(
-                    vector_store_path,
-                    self.embeddings
-                )
+                self._vector_store = self._read_vector_store(vector_store_path)
                 logging.info(f"成功加载知识库: {self.kb_name}")
             except Exception as e:
                 logging.warning(f"加载向量存储失败: {e}，将创建新的")
-                self.vector_store = None
+                self._vector_store = None
         
-        if self.vector_store is None:
+        if self._vector_store is None:
             # 创建空的向量存储
-            self.vector_store = FAISS.from_texts(
-                ["初始化"],
-                self.embeddings
-            )
-            # 删除初始化文档
-            self.vector_store.delete([self.vector_store.index_to_docstore_id[0]])
+            self._vector_store = self._new_vector_store(create_ip_index(self.embeddings.service.dimension))
+        self._lexical_index = self._read_lexical_index(vector_store_path)
+        
+        # 重放上次合并之后追加的文档
+        self._replay_delta()
+        if self._ensure_index_type():
+            self.save()
+    
+    def _read_vector_store(self, vector_store_path: str) -> FAISS:
+        """
+        读取 FAISS.save_local 格式的向量存储；KB_INDEX_MMAP 开启时索引以内存映射方式打开，
+        向量由操作系统按需分页（IO_FLAG_MMAP 只作用于 IVF 倒排表，对 IndexFlatIP/HNSW 无效）
+        """
+        index_path = os.path.join(vector_store_path, KB_INDEX_FILE)
+        mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", 0) if KB_INDEX_MMAP else 0
+        index = faiss.read_index(index_path, mmap_flag)
+        self._mapped_index_path = index_path if mmap_flag else None
+        # 本地文件由本程序生成，直接反序列化 docstore
+        with open(os.path.join(vector_store_path, KB_DOCSTORE_FILE), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        return self._new_vector_store(index, docstore, index_to_docstore_id)
+    
+    def _read_lexical_index(self, vector_store_path: str) -> BM25Index:
+        """读取 BM25 索引；文件不存在或与 docstore 不一致时（旧版知识库）从 docstore 重建"""
+        docstore_ids = self._vector_store.index_to_docstore_id
+        lexical_index_path = os.path.join(vector_store_path, KB_LEXICAL_INDEX_FILE)
+        if os.path.exists(lexical_index_path):
+            try:
+                lexical_index = BM25Index.load(lexical_index_path)
+                if len(lexical_index) == len(docstore_ids):
+                    return lexical_index
+            except Exception as e:
+                logging.warning(f"加载 BM25 索引失败: {e}，将重建")
+        lexical_index = BM25Index()
+        ids = list(docstore_ids.values())
+        lexical_index.add_many(ids, (self._vector_store.docstore.search(doc_id).page_content for doc_id in ids))
+        if ids:
+            logging.info(f"知识库 {self.kb_name} 已重建 BM25 索引（{len(ids)} 条文档）")
+        return lexical_index
+    
+    def _ensure_writable_index(self):
+        """
+        写入前把内存映射的索引重新读入为普通索引
+
+        映射的向量不能扩容：对其 add 会触发 FAISS 断言并使进程退出；clone_index 仍引用映射，不能代替重新读取
+        """
+        if self._mapped_index_path is None:
+            return
+        self._vector_store.index = faiss.read_index(self._mapped_index_path)
+        self._mapped_index_path = None
     
-    def add_documents(self, documents: List[Document]):
+    def _ensure_index_type(self) -> bool:
         """
-        添加文档到知识库
+        检查索引类型：旧版 L2 索引迁移为归一化内积索引；语料规模超过 KB_HNSW_MIN_DOCS 时
+        把 IndexFlatIP 重建为 HNSW。已有向量直接从索引中取出，不重新编码。
+        
+        Returns:
+            是否重建了索引
+        """
+        index = self.vector_store.index
+        if _index_matches_size(index):
+            return False
+        
+        vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else np.zeros((0, index.d), dtype=np.float32)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        faiss.normalize_L2(vectors)
+        new_index = create_ip_index(index.d, index.ntotal)
+        if index.ntotal:
+            new_index.add(vectors)
+        self.vector_store.index = new_index
+        self._mapped_index_path = None
+        self.vector_store.distance_strategy = DistanceStrategy.MAX_INNER_PRODUCT
+        logging.info(
+            f"知识库 {self.kb_name} 索引已重建为 {type(new_index).__name__}（{index.ntotal} 条文档）"
+        )
+        return True
+    
+    def add_documents(self, documents: List[Document], batch_size: int = KB_INGEST_BATCH_SIZE):
+        """
+        添加文档到知识库（批量写入）
+        
+        文档按批编码后追加到索引，并作为一条记录写入增量日志，不重写整个索引；
+        增量日志超过阈值时在后台合并到主索引。一次调用只编码一遍、只落盘一次，
+        大批量导入时应尽量一次传入所有文档。
         
         Args:
             documents: Document列表
+            batch_size: 每批编码的文档数
         """
         if not documents:
             return
         
-        # 添加到向量存储
-        self.vector_store.add_documents(documents)
+        texts = [doc.page_content for doc in documents]
+        metadatas = [doc.metadata or {} for doc in documents]
+        ids = [getattr(doc, "id", None) or uuid.uuid4().hex for doc in documents]
+        
+        # 分批编码（控制单批内存），在写锁外完成
+        vectors = np.concatenate([
+            np.asarray(self.embeddings.embed_documents(texts[start:start + batch_size]), dtype=np.float32)
+            for start in range(0, len(texts), batch_size)
+        ])
+        
+        with self._write_lock:
+            # 添加到向量存储
+            self.vector_store
+            self._ensure_writable_index()
+            self.vector_store.add_embeddings(list(zip(texts, vectors.tolist())), metadatas=metadatas, ids=ids)
+            self._lexical_index.add_many(ids, texts)
+            
+            # 语料规模超过阈值时切换为 HNSW 索引
+            self._ensure_index_type()
+            
+            # 追加到增量日志
+            self._append_delta(ids, texts, metadatas, vectors)
         
-        # 保存向量存储
-        self.save()
+        logging.info(f"知识库 {self.kb_name} 新增 {len(documents)} 条文档")
+        self._maybe_compact()
     
     def add_texts(self, texts: List[str], metadatas: Optional[List[Dict]] = None):
         """
@@ -173,48 +379,347 @@ class KnowledgeBase:
         
         self.add_documents(documents)
     
+    def ingest_texts(self, texts: List[str], metadatas: Optional[List[Dict]] = None, **kwargs) -> Dict[str, int]:
+        """
+        切分、去重后添加文本（长文本切分为重叠片段，跳过重复和近似重复的片段）
+        
+        Returns:
+            导入统计，见 kb_ingest.ingest_texts
+        """
+        return ingest_texts(self, texts, metadatas, **kwargs)
+    
+    def ingest_directory(self, directory: str, **kwargs) -> Dict[str, int]:
+        """
+        流式导入目录下的文档（切分、去重，元数据记录来源文件和偏移）
+        
+        Returns:
+            导入统计，见 kb_ingest.ingest_directory
+        """
+        return ingest_directory(self, directory, **kwargs)
+    
     def search(self, query: str, top_k: int = 3, score_threshold: float = 0.4) -> List[Tuple[Document, float]]:
         """
-        搜索相关知识
+        搜索相关知识（混合检索）
+        
+        向量检索和 BM25 词法检索的结果按倒数排名融合；查询是堆栈/异常签名时只做词法检索，不调用嵌入模型。
         
         Args:
             query: 查询字符串
             top_k: 返回top_k个结果
-            score_threshold: 相似度阈值（FAISS使用L2距离，越小越相似）
+            score_threshold: 相似度阈值：向量命中的余弦相似度，或词法命中覆盖的查询词 IDF 权重比例
         
         Returns:
-            (Document, score) 元组列表
+            (Document, 相关度) 元组列表，按融合排名排序；相关度为向量命中的余弦相似度，
+            只有词法命中时为查询词 IDF 权重的覆盖比例（融合分数只反映排名，不作为相关度返回）
         """
         try:
-            # FAISS使用similarity_search_with_score
-            results = self.vector_store.similarity_search_with_score(query, k=top_k)
-            
-            # 过滤低分结果（注意：FAISS返回的是距离，不是相似度）
-            # 距离越小越相似，所以需要反转阈值判断
-            filtered_results = [
-                (doc, score) for doc, score in results
-                if score <= (1.0 - score_threshold) * 10  # 简单的阈值转换
-            ]
-            
-            return filtered_results
+            if self.vector_store.index.ntotal == 0:
+                return []
+            if is_signature_query(query):
+                return self.search_lexical(query, top_k, score_threshold)
+            return self.search_hybrid(query, self.embeddings.embed_query(query), top_k, score_threshold)
         except Exception as e:
             logging.error(f"搜索知识库失败: {e}")
             return []
     
+    def search_lexical(self, query: str, top_k: int = 3,
+                       score_threshold: float = KB_LEXICAL_MIN_MATCH) -> List[Tuple[Document, float]]:
+        """
+        只用 BM25 词法检索（不调用嵌入模型）
+        
+        Args:
+            query: 查询字符串
+            top_k: 返回top_k个结果
+            score_threshold: 命中文档至少覆盖的查询词 IDF 权重比例（不低于 KB_LEXICAL_MIN_MATCH）
+        
+        Returns:
+            (Document, 覆盖比例) 元组列表，按 BM25 排名排序
+        """
+        dense, lexical = self.retrieve(query, None, top_k, score_threshold)
+        return fuse_search_results(dense, lexical, top_k, hybrid=False)
+    
+    def search_hybrid(self, query: str, query_vector: List[float], top_k: int = 3,
+                      score_threshold: float = 0.4) -> List[Tuple[Document, float]]:
+        """
+        用已编码的查询向量做混合检索
+        
+        Args:
+            query: 查询字符串（用于词法检索）
+            query_vector: SimpleEmbeddings.embed_query 的结果（已归一化）
+            top_k: 返回top_k个结果
+            score_threshold: 相似度阈值，见 search
+        
+        Returns:
+            (Document, 相关度) 元组列表，按融合排名排序，见 search
+        """
+        dense, lexical = self.retrieve(query, query_vector, top_k, score_threshold)
+        return fuse_search_results(dense, lexical, top_k, hybrid=True)
+    
+    def retrieve(self, query: str, query_vector: Optional[List[float]], top_k: int = 3,
+                 score_threshold: float = 0.4) -> Tuple[List[Tuple[str, Document, float]],
+                                                        List[Tuple[str, Document, float, float]]]:
+        """
+        两路检索的候选（尚未融合），供 search 和跨知识库检索使用
+        
+        Args:
+            query: 查询字符串
+            query_vector: 已编码的查询向量；为 None 时只做词法检索
+            top_k: 最终返回的结果数（每路取 max(top_k, KB_HYBRID_CANDIDATES) 个候选）
+            score_threshold: 相似度阈值，见 search
+        
+        Returns:
+            (向量命中 [(docstore ID, Document, 余弦相似度)], 词法命中 [(docstore ID, Document, BM25 分数, 覆盖比例)])，
+            各自按分数降序
+        """
+        candidates = max(top_k, KB_HYBRID_CANDIDATES)
+        dense, lexical = [], []
+        try:
+            if self.vector_store.index.ntotal == 0:
+                return [], []
+            if query_vector is not None:
+                dense = self._dense_search(query_vector, candidates, score_threshold)
+            lexical = self.lexical_index.search(query, candidates, max(score_threshold, KB_LEXICAL_MIN_MATCH))
+        except Exception as e:
+            logging.error(f"搜索知识库失败 ({self.kb_name}): {e}")
+        docstore = self.vector_store.docstore
+        return (
+            [(doc_id, docstore.search(doc_id), score) for doc_id, score in dense],
+            [(doc_id, docstore.search(doc_id), score, coverage) for doc_id, score, coverage in lexical]
+        )
+    
+    def search_by_vector(self, query_vector: List[float], top_k: int = 3,
+                         score_threshold: float = 0.4) -> List[Tuple[Document, float]]:
+        """
+        只用向量检索（查询已编码）
+        
+        Args:
+            query_vector: SimpleEmbeddings.embed_query 的结果（已归一化）
+            top_k: 返回top_k个结果
+            score_threshold: 相似度阈值（余弦相似度）
+        
+        Returns:
+            (Document, 余弦相似度) 元组列表，按相似度降序
+        """
+        try:
+            return [
+                (self.vector_store.docstore.search(doc_id), score)
+                for doc_id, score in self._dense_search(query_vector, top_k, score_threshold)
+            ]
+        except Exception as e:
+            logging.error(f"搜索知识库失败 ({self.kb_name}): {e}")
+            return []
+    
+    def _dense_search(self, query_vector: List[float], top_k: int,
+                      score_threshold: float) -> List[Tuple[str, float]]:
+        """向量检索，返回 [(docstore ID, 余弦相似度)]（向量已归一化，内积即余弦相似度）"""
+        index = self.vector_store.index
+        if index.ntotal == 0:
+            return []
+        query = np.asarray([query_vector], dtype=np.float32)
+        scores, indices = index.search(query, min(top_k, index.ntotal))
+        index_to_docstore_id = self.vector_store.index_to_docstore_id
+        return [
+            (index_to_docstore_id[i], float(score))
+            for score, i in zip(scores[0], indices[0])
+            if i != -1 and score >= score_threshold
+        ]
+    
+    # ==================== 增量日志 ====================
+    
+    def _delta_path(self) -> str:
+        return os.path.join(self.vector_store_dir, KB_DELTA_FILE)
+    
+    def _append_delta(self, ids: List[str], texts: List[str], metadatas: List[Dict], vectors: np.ndarray):
+        """追加一条增量记录（长度 + pickle），写入后 fsync"""
+        payload = pickle.dumps((ids, texts, metadatas, vectors), protocol=pickle.HIGHEST_PROTOCOL)
+        os.makedirs(os.path.dirname(self._delta_path()), exist_ok=True)
+        with open(self._delta_path(), "ab") as f:
+            f.write(_DELTA_HEADER.pack(len(payload)))
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        self._delta_bytes += _DELTA_HEADER.size + len(payload)
+        self._delta_records += 1
+    
+    def _replay_delta(self) -> int:
+        """
+        把增量日志中的文档加入已加载的索引（不重新编码）
+        
+        已在主索引中的文档（合并完成但日志未删除时）按 ID 跳过；末尾不完整的记录（写入中断）被截掉。
+        
+        Returns:
+            重放的文档数
+        """
+        delta_path = self._delta_path()
+        if not os.path.exists(delta_path):
+            return 0
+        existing_ids = set(self._vector_store.index_to_docstore_id.values())
+        replayed = 0
+        valid_bytes = 0
+        with open(delta_path, "rb") as f:
+            while True:
+                header = f.read(_DELTA_HEADER.size)
+                if len(header) < _DELTA_HEADER.size:
+                    break
+                (length,) = _DELTA_HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length:
+                    break
+                try:
+                    ids, texts, metadatas, vectors = pickle.loads(payload)
+                except Exception:
+                    break
+                valid_bytes = f.tell()
+                self._delta_records += 1
+                keep = [i for i, doc_id in enumerate(ids) if doc_id not in existing_ids]
+                if keep:
+                    self._ensure_writable_index()
+                    self._vector_store.add_embeddings(
+                        [(texts[i], vectors[i].tolist()) for i in keep],
+                        metadatas=[metadatas[i] for i in keep],
+                        ids=[ids[i] for i in keep]
+                    )
+                    self._lexical_index.add_many([ids[i] for i in keep], [texts[i] for i in keep])
+                    existing_ids.update(ids[i] for i in keep)
+                    replayed += len(keep)
+        if valid_bytes < os.path.getsize(delta_path):
+            logging.warning(f"知识库 {self.kb_name} 增量日志末尾记录不完整，已截断")
+            with open(delta_path, "r+b") as f:
+                f.truncate(valid_bytes)
+        self._delta_bytes = valid_bytes
+        if replayed:
+            logging.info(f"知识库 {self.kb_name} 从增量日志恢复 {replayed} 条文档")
+        return replayed
+    
+    def _maybe_compact(self):
+        """增量日志超过阈值时在后台线程合并"""
+        with self._write_lock:
+            if self._compacting or (self._delta_bytes < KB_COMPACT_DELTA_BYTES
+                                    and self._delta_records < KB_COMPACT_DELTA_RECORDS):
+                return
+            self._compacting = True
+        
+        def compact():
+            try:
+                self.save()
+            except Exception as e:
+                logging.warning(f"合并知识库 {self.kb_name} 失败: {e}")
+            finally:
+                self._compacting = False
+        
+        threading.Thread(target=compact, name=f"kb-compact-{self.kb_name}", daemon=True).start()
+    
     def save(self):
-        """保存向量存储"""
-        vector_store_path = os.path.join(self.kb_path, "vector_store")
-        os.makedirs(vector_store_path, exist_ok=True)
-        self.vector_store.save_local(vector_store_path)
+        """
+        保存向量存储（合并）：写出完整的主索引，然后删除增量日志
+        
+        三个文件写入新的版本目录，再原子替换 CURRENT 切换版本：任何时刻崩溃，CURRENT 指向的都是一组完整、
+        一致的文件；切换完成前增量日志保留，重启后在旧版本上重放。正在被内存映射的旧索引文件不会被原地改写
+        """
+        if not self.is_loaded:
+            return
+        with self._write_lock:
+            root = self.vector_store_dir
+            version = f"v{time.time_ns()}"
+            version_path = os.path.join(root, version)
+            os.makedirs(version_path, exist_ok=True)
+            self.vector_store.save_local(version_path)
+            self._lexical_index.save(os.path.join(version_path, KB_LEXICAL_INDEX_FILE))
+            for file_name in (KB_INDEX_FILE, KB_DOCSTORE_FILE, KB_LEXICAL_INDEX_FILE):
+                with open(os.path.join(version_path, file_name), "rb") as f:
+                    os.fsync(f.fileno())
+            
+            current_tmp = os.path.join(root, KB_CURRENT_FILE + ".tmp")
+            with open(current_tmp, "w", encoding="utf-8") as f:
+                f.write(version)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(current_tmp, os.path.join(root, KB_CURRENT_FILE))
+            
+            # 新版本已包含日志中的全部文档（删除前崩溃时重放会按 ID 跳过）
+            if os.path.exists(self._delta_path()):
+                os.remove(self._delta_path())
+            self._delta_bytes = 0
+            self._delta_records = 0
+            self._remove_stale_versions(version)
         logging.info(f"知识库已保存: {self.kb_name}")
+    
+    def _remove_stale_versions(self, current: str):
+        """
+        删除旧版本目录、旧版布局直接位于 vector_store 下的主索引文件和中断的保存留下的目录
+
+        仍被内存映射的版本保留到下次保存（Windows 上无法删除映射中的文件，读入为普通索引时也还要用到）
+        """
+        root = self.vector_store_dir
+        mapped_dir = os.path.dirname(self._mapped_index_path) if self._mapped_index_path else None
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if name == current or path in (mapped_dir, self._mapped_index_path):
+                continue
+            if _VERSION_DIR_RE.match(name) and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif name in (KB_INDEX_FILE, KB_DOCSTORE_FILE, KB_LEXICAL_INDEX_FILE):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        shutil.rmtree(root + ".tmp", ignore_errors=True)
+
+
+def fuse_search_results(dense: List[Tuple[str, Document, float]], lexical: List[Tuple[str, Document, float, float]],
+                        top_k: int, hybrid: bool = True) -> List[Tuple[Document, float]]:
+    """
+    按倒数排名融合两路检索结果（可以来自多个知识库：每路先按分数合并为一个排名，再统一融合一次）
+    
+    融合分数只决定顺序：它按排名归一化，只有一条弱词法命中时也是 1，不能表示相关程度
+    
+    Args:
+        dense: 向量命中 [(docstore ID, Document, 余弦相似度)]
+        lexical: 词法命中 [(docstore ID, Document, BM25 分数, 覆盖比例)]
+        top_k: 返回的结果数
+        hybrid: 是否为两路检索（只做词法检索时为 False）
+    
+    Returns:
+        (Document, 相关度) 元组列表，按融合排名排序；相关度为余弦相似度，只有词法命中时为覆盖比例
+    """
+    docs = {}
+    relevance: Dict[str, float] = {}
+    for doc_id, doc, similarity in dense:
+        if isinstance(doc, Document):
+            docs[doc_id] = doc
+            relevance[doc_id] = similarity
+    for doc_id, doc, _, coverage in lexical:
+        if isinstance(doc, Document):
+            docs.setdefault(doc_id, doc)
+            relevance.setdefault(doc_id, coverage)
+    rankings = [[doc_id for doc_id, _, _, _ in sorted(lexical, key=lambda x: x[2], reverse=True)]]
+    if hybrid:
+        rankings.insert(0, [doc_id for doc_id, _, _ in sorted(dense, key=lambda x: x[2], reverse=True)])
+    results = [
+        (docs[doc_id], relevance[doc_id])
+        for doc_id, _ in reciprocal_rank_fusion(rankings, len(docs), KB_RRF_K)
+        if doc_id in docs
+    ]
+    return results[:top_k]
 
 
 class KnowledgeBaseManager:
     """知识库管理器"""
     
-    def __init__(self):
+    def __init__(self, preload: bool = KB_PRELOAD):
+        """
+        Args:
+            preload: 是否在后台并行预加载所有知识库（否则在第一次检索时加载）
+        """
+        # 所有知识库共用一个嵌入模型封装
+        self.embeddings = SimpleEmbeddings()
         self.knowledge_bases: Dict[str, KnowledgeBase] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._search_executor: Optional[ThreadPoolExecutor] = None
         self._init_default_knowledge_bases()
+        if preload:
+            self.preload()
     
     def _init_default_knowledge_bases(self):
         """初始化默认知识库"""
@@ -231,10 +736,26 @@ class KnowledgeBaseManager:
             self.get_or_create_kb(kb_name)
     
     def get_or_create_kb(self, kb_name: str) -> KnowledgeBase:
-        """获取或创建知识库"""
-        if kb_name not in self.knowledge_bases:
-            self.knowledge_bases[kb_name] = KnowledgeBase(kb_name)
-        return self.knowledge_bases[kb_name]
+        """获取或创建知识库（索引在第一次使用时加载）"""
+        with self._lock:
+            if kb_name not in self.knowledge_bases:
+                self.knowledge_bases[kb_name] = KnowledgeBase(kb_name, embeddings=self.embeddings)
+            return self.knowledge_bases[kb_name]
+    
+    def preload(self, kb_names: Optional[List[str]] = None) -> List[Future]:
+        """
+        在后台线程池中并行加载知识库，不阻塞调用方；
+        加载完成前的检索会等待对应知识库加载完成
+        
+        Args:
+            kb_names: 要加载的知识库名称（默认全部）
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=KB_LOAD_WORKERS, thread_name_prefix="kb-loader")
+            kbs = [self.knowledge_bases[name] for name in (kb_names or list(self.knowledge_bases))
+                   if name in self.knowledge_bases]
+        return [self._executor.submit(kb.load) for kb in kbs if not kb.is_loaded]
     
     def search_knowledge(
         self,
@@ -250,10 +771,10 @@ class KnowledgeBaseManager:
             query: 查询字符串
             kb_name: 知识库名称（None表示搜索所有知识库）
             top_k: 返回top_k个结果
-            score_threshold: 相似度阈值
+            score_threshold: 相似度阈值（见 KnowledgeBase.search），对每个返回的结果都生效
         
         Returns:
-            (Document, score) 元组列表
+            (Document, 相关度) 元组列表，按融合排名排序（相关度见 KnowledgeBase.search）
         """
         if kb_name:
             # 搜索指定知识库
@@ -263,15 +784,31 @@ class KnowledgeBaseManager:
                 logging.warning(f"知识库不存在: {kb_name}")
                 return []
         else:
-            # 搜索所有知识库
-            all_results = []
-            for kb in self.knowledge_bases.values():
-                results = kb.search(query, top_k, score_threshold)
-                all_results.extend(results)
+            # 搜索所有知识库：查询只编码一次，各知识库并行检索
+            with self._lock:
+                kbs = list(self.knowledge_bases.values())
+                if self._search_executor is None:
+                    self._search_executor = ThreadPoolExecutor(
+                        max_workers=KB_SEARCH_WORKERS, thread_name_prefix="kb-search"
+                    )
+            if not kbs:
+                return []
+            # 堆栈/异常签名：只做词法检索，不调用嵌入模型
+            hybrid = not is_signature_query(query)
+            query_vector = self.embeddings.embed_query(query) if hybrid else None
+            futures = [
+                self._search_executor.submit(kb.retrieve, query, query_vector, top_k, score_threshold)
+                for kb in kbs
+            ]
             
-            # 按分数排序并返回top_k
-            all_results.sort(key=lambda x: x[1])
-            return all_results[:top_k]
+            # 各知识库的候选先按每路的原始分数合并为一个排名（余弦相似度可直接比较；BM25 的 IDF 按各库统计，
+            # 只是近似可比），再统一融合一次，排名不会因为各库单独融合而失去可比性
+            dense, lexical = [], []
+            for future in futures:
+                kb_dense, kb_lexical = future.result()
+                dense.extend(kb_dense)
+                lexical.extend(kb_lexical)
+            return fuse_search_results(dense, lexical, top_k, hybrid)
     
     def match_knowledge_base(self, expert_type: str) -> str:
         """
@@ -348,11 +885,14 @@ def search_diagnosis_knowledge(
         return f"未找到与 '{query}' 相关的知识"
     
     knowledge_str = f"找到 {len(results)} 条相关知识：\n\n"
-    for idx, (doc, score) in enumerate(results, 1):
-        knowledge_str += f"[知识 {idx}] (相似度: {1-score:.2f})\n"
+    # 按融合排名排序；相关度为余弦相似度或词法覆盖比例
+    for idx, (doc, relevance) in enumerate(results, 1):
+        knowledge_str += f"[知识 {idx}] (相关度: {relevance:.2f})\n"
         if doc.metadata:
             if 'source' in doc.metadata:
                 knowledge_str += f"来源: {doc.metadata['source']}\n"
+            if 'start_line' in doc.metadata:
+                knowledge_str += f"位置: 第 {doc.metadata['start_line']} 行\n"
             if 'desc' in doc.metadata:
                 knowledge_str += f"描述: {doc.metadata['desc']}\n"
         knowledge_str += f"内容: {doc.page_content}\n\n"
@@ -367,7 +907,7 @@ def init_sample_knowledge():
     
     # NameNode专家知识库
     namenode_kb = kb_manager.get_or_create_kb("NameNodeExpert")
-    namenode_kb.add_texts(
+    namenode_kb.ingest_texts(
         texts=[
             "NameNode无法启动的常见原因：1) 配置文件错误 2) 端口被占用 3) 磁盘空间不足",
             "NameNode启动失败时，检查hdfs-site.xml和core-site.xml配置是否正确",
@@ -382,7 +922,7 @@ def init_sample_knowledge():
     
     # DataNode专家知识库
     datanode_kb = kb_manager.get_or_create_kb("DataNodeExpert")
-    datanode_kb.add_texts(
+    datanode_kb.ingest_texts(
         texts=[
             "DataNode无法连接NameNode时，检查网络连接和防火墙设置",
             "DataNode磁盘空间不足会导致数据块复制失败",
@@ -395,7 +935,7 @@ def init_sample_knowledge():
         ]
     )
     
-    # 保存所有知识库
+    # 把增量日志合并到主索引
     for kb in kb_manager.knowledge_bases.values():
         kb.save()
     
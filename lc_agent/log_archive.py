@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志归档模块
+把每次读取到的新日志按节点追加到本地压缩分段文件中，并建立时间索引和倒排索引，
+支持在多天的历史日志中按关键词 + 时间范围快速检索。
+
+存储结构：
+    <archive_dir>/<节点名>/<分段号>.log.gz   每次追加一个 gzip member（gzip 支持多 member 拼接）
+    <archive_dir>/index.db                   SQLite 索引
+        chunks: 每个日志块所在的分段、字节偏移、长度和时间范围
+        tokens: 三字母组 -> 日志块
+
+检索时先用时间范围和倒排索引筛出候选日志块，只解压这些块并逐行核对。
+关键词按子串匹配：索引中保存日志中每段字母数字串（[A-Za-z0-9_$]，小写）的所有三字母组，
+包含关键词的日志块一定包含关键词中每段字母数字串的所有三字母组（"NotFound" 之于
+"ReplicaNotFoundException"、"1073741825" 之于 "blk_1073741825_1001" 都成立），
+因此要求命中关键词的全部三字母组即可筛出候选，再逐行核对子串。每个日志块的索引行数不超过其中不同三字母组的个数。
+"""
+
+import os
+import re
+import gzip
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Set, Tuple
+
+try:
+    from .log_parser import parse_log_line
+except ImportError:
+    from lc_agent.log_parser import parse_log_line
+
+# 默认配置
+SEGMENT_MAX_BYTES = 16 * 1024 * 1024  # 单个分段文件的最大字节数（压缩后）
+RETENTION_DAYS = 7  # 归档保留天数
+PRUNE_INTERVAL = 600  # 清理过期分段的间隔（秒）：写入时距上次清理超过该时间就清理所有节点
+BUSY_TIMEOUT = 60  # 等待其它进程释放写锁的时间（秒）
+
+_SAFE_NAME_RE = re.compile(r'[^A-Za-z0-9_.-]')
+# 三字母组索引的字母数字串
+_RUN_RE = re.compile(r'[a-z0-9_$]{3,}')
+
+
+def index_terms(text: str) -> Set[str]:
+    """倒排索引中保存的词：每段字母数字串（小写）的所有三字母组"""
+    terms = set()
+    for run in _RUN_RE.findall(text.lower()):
+        terms.update(run[i:i + 3] for i in range(len(run) - 2))
+    return terms
+
+
+def _line_timestamp(line: str) -> Optional[str]:
+    """返回 'YYYY-MM-DD HH:MM:SS' 格式的时间戳（非 ISO 日期格式视为无时间戳）"""
+    timestamp = parse_log_line(line).timestamp
+    if timestamp and timestamp[:4].isdigit() and timestamp[4] == '-':
+        return timestamp.replace('T', ' ')
+    return None
+
+
+def _normalize_time(value: Optional[str]) -> Optional[str]:
+    return value.strip().replace('T', ' ') if value else None
+
+
+def _in_range(timestamp: str, start_time: Optional[str], end_time: Optional[str]) -> bool:
+    # end_time 支持只写到日期/分钟，比较时按其长度截断（"2024-01-01" 包含当天全部日志）
+    if start_time and timestamp < start_time:
+        return False
+    if end_time and timestamp[:len(end_time)] > end_time:
+        return False
+    return True
+
+
+class LogArchive:
+    """按节点分段压缩存储的日志归档"""
+
+    def __init__(self, archive_dir: str, segment_max_bytes: int = SEGMENT_MAX_BYTES,
+                 retention_days: int = RETENTION_DAYS):
+        self.archive_dir = archive_dir
+        self.segment_max_bytes = segment_max_bytes
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._last_prune: Optional[float] = None  # 上次清理的时间（time.monotonic）
+        os.makedirs(archive_dir, exist_ok=True)
+        self.db_path = os.path.join(archive_dir, "index.db")
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS chunks (
+                    id INTEGER PRIMARY KEY,
+                    node TEXT NOT NULL,
+                    segment INTEGER NOT NULL,
+                    offset INTEGER NOT NULL,
+                    length INTEGER NOT NULL,
+                    first_ts TEXT NOT NULL,
+                    last_ts TEXT NOT NULL,
+                    line_count INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_chunks_time ON chunks (node, last_ts, first_ts);
+                CREATE INDEX IF NOT EXISTS idx_chunks_segment ON chunks (node, segment);
+                CREATE TABLE IF NOT EXISTS tokens (
+                    token TEXT NOT NULL,
+                    chunk_id INTEGER NOT NULL,
+                    PRIMARY KEY (token, chunk_id)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS idx_tokens_chunk ON tokens (chunk_id);
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+                """
+            )
+            # 旧版归档的索引不是三字母组：记录从哪个日志块开始按三字母组索引，之前的块不经倒排索引过滤
+            conn.execute(
+                "INSERT OR IGNORE INTO meta (key, value) "
+                "SELECT 'trigram_index_from', COALESCE(MAX(id), 0) + 1 FROM chunks"
+            )
+            self._trigram_index_from = conn.execute(
+                "SELECT value FROM meta WHERE key = 'trigram_index_from'"
+            ).fetchone()[0]
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _segment_path(self, node: str, segment: int) -> str:
+        return os.path.join(self.archive_dir, _SAFE_NAME_RE.sub('_', node), f"{segment:06d}.log.gz")
+
+    # ==================== 写入 ====================
+
+    def append(self, node: str, content: str) -> bool:
+        """
+        追加一块日志
+
+        Args:
+            node: 节点名（LOG_FILES_CONFIG 中的 name）
+            content: 本次新读取到的日志内容
+
+        Returns:
+            是否写入了数据
+        """
+        lines = [line for line in content.splitlines() if line.strip()]
+        if not lines:
+            return False
+
+        # 时间范围：没有时间戳的行（如堆栈）归入前一行；整块都没有时间戳时使用写入时间
+        timestamps = [ts for ts in (_line_timestamp(line) for line in lines) if ts]
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        first_ts = min(timestamps) if timestamps else now
+        last_ts = max(timestamps) if timestamps else now
+        data = gzip.compress(("\n".join(lines) + "\n").encode("utf-8"), compresslevel=6)
+        tokens = index_terms("\n".join(lines))
+
+        with self._lock:
+            conn = self._connect()
+            try:
+                # 写事务同时保护分段文件的追加（多进程时串行执行）
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    # 按时间清理而不是只在切换分段时清理：日志很少的节点也会按期删除过期分段
+                    if self._last_prune is None or time.monotonic() - self._last_prune >= PRUNE_INTERVAL:
+                        self._prune(conn)
+                        self._last_prune = time.monotonic()
+                    segment = self._current_segment(conn, node)
+                    path = self._segment_path(node, segment)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with open(path, "ab") as f:
+                        offset = f.tell()
+                        f.write(data)
+                    cursor = conn.execute(
+                        "INSERT INTO chunks (node, segment, offset, length, first_ts, last_ts, line_count) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (node, segment, offset, len(data), first_ts, last_ts, len(lines))
+                    )
+                    chunk_id = cursor.lastrowid
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO tokens (token, chunk_id) VALUES (?, ?)",
+                        ((token, chunk_id) for token in tokens)
+                    )
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                conn.execute("COMMIT")
+            finally:
+                conn.close()
+        return True
+
+    def _current_segment(self, conn: sqlite3.Connection, node: str) -> int:
+        """当前写入的分段号；超过大小上限时切换到新分段"""
+        row = conn.execute("SELECT MAX(segment) FROM chunks WHERE node = ?", (node,)).fetchone()
+        segment = row[0] if row and row[0] is not None else 0
+        path = self._segment_path(node, segment)
+        if os.path.exists(path) and os.path.getsize(path) >= self.segment_max_bytes:
+            segment += 1
+        return segment
+
+    def _prune(self, conn: sqlite3.Connection):
+        """删除所有节点中全部日志都早于保留期限的分段"""
+        if not self.retention_days:
+            return
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).strftime('%Y-%m-%d %H:%M:%S')
+        expired = conn.execute(
+            "SELECT node, segment FROM chunks GROUP BY node, segment HAVING MAX(last_ts) < ?",
+            (cutoff,)
+        ).fetchall()
+        for node, segment in expired:
+            conn.execute(
+                "DELETE FROM tokens WHERE chunk_id IN (SELECT id FROM chunks WHERE node = ? AND segment = ?)",
+                (node, segment)
+            )
+            conn.execute("DELETE FROM chunks WHERE node = ? AND segment = ?", (node, segment))
+            try:
+                os.remove(self._segment_path(node, segment))
+            except OSError:
+                pass
+        if expired:
+            logging.info(f"已清理 {len(expired)} 个过期日志归档分段")
+
+    # ==================== 检索 ====================
+
+    def search(self, node: str, keyword: Optional[str] = None, start_time: Optional[str] = None,
+               end_time: Optional[str] = None, max_results: int = 50) -> List[Tuple[Optional[str], str]]:
+        """
+        检索归档日志
+
+        Args:
+            node: 节点名（LOG_FILES_CONFIG 中的 name）
+            keyword: 关键词（不区分大小写的子串匹配；为 None 时返回时间范围内的所有行）
+            start_time: 起始时间，如 "2024-01-01 12:00:00"
+            end_time: 结束时间，可只写到日期或分钟，如 "2024-01-01"
+            max_results: 最大返回行数；匹配超过该数量时保留最新的行
+
+        Returns:
+            [(时间戳, 日志行)]，按时间顺序
+        """
+        start_time, end_time = _normalize_time(start_time), _normalize_time(end_time)
+        sql = "SELECT segment, offset, length FROM chunks WHERE node = ?"
+        params: list = [node]
+        if start_time:
+            sql += " AND last_ts >= ?"
+            params.append(start_time)
+        if end_time:
+            sql += " AND substr(first_ts, 1, ?) <= ?"
+            params.extend([len(end_time), end_time])
+        # 倒排索引：日志块要包含关键词的全部三字母组（关键词中没有 3 个字符以上的字母数字串时不过滤）；
+        # 旧版日志块没有三字母组索引，不经倒排索引过滤
+        trigrams = sorted(index_terms(keyword or ""))
+        if trigrams:
+            placeholders = ", ".join("?" * len(trigrams))
+            sql += (
+                f" AND (id < ? OR id IN (SELECT chunk_id FROM tokens WHERE token IN ({placeholders}) "
+                "GROUP BY chunk_id HAVING COUNT(*) = ?))"
+            )
+            params.append(self._trigram_index_from)
+            params.extend(trigrams)
+            params.append(len(trigrams))
+        # 从最新的日志块往前读，max_results 截断的是最旧的匹配
+        sql += " ORDER BY id DESC"
+
+        conn = self._connect()
+        try:
+            candidates = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+        keyword_lower = keyword.lower() if keyword else None
+        results = []
+        for segment, offset, length in candidates:
+            chunk_matches = []
+            for timestamp, line in self._read_chunk(node, segment, offset, length):
+                if keyword_lower and keyword_lower not in line.lower():
+                    continue
+                if (start_time or end_time) and not (timestamp and _in_range(timestamp, start_time, end_time)):
+                    continue
+                chunk_matches.append((timestamp, line))
+            # results 按从新到旧排列，最后再整体反转为时间顺序
+            results.extend(reversed(chunk_matches))
+            if len(results) >= max_results:
+                del results[max_results:]
+                break
+        results.reverse()
+        return results
+
+    def _read_chunk(self, node: str, segment: int, offset: int, length: int) -> Iterable[Tuple[Optional[str], str]]:
+        try:
+            with open(self._segment_path(node, segment), "rb") as f:
+                f.seek(offset)
+                data = gzip.decompress(f.read(length))
+        except (OSError, EOFError) as e:
+            logging.warning(f"读取日志归档失败 (节点: {node}, 分段: {segment}): {e}")
+            return
+        timestamp = None
+        for line in data.decode("utf-8", errors="ignore").splitlines():
+            timestamp = _line_timestamp(line) or timestamp
+            yield timestamp, line
+
+    def stats(self, node: Optional[str] = None) -> Tuple[int, int, Optional[str], Optional[str]]:
+        """返回 (日志块数, 行数, 最早时间, 最新时间)"""
+        sql = "SELECT COUNT(*), COALESCE(SUM(line_count), 0), MIN(first_ts), MAX(last_ts) FROM chunks"
+        params = ()
+        if node:
+            sql += " WHERE node = ?"
+            params = (node,)
+        conn = self._connect()
+        try:
+            return tuple(conn.execute(sql, params).fetchone())
+        finally:
+            conn.close()
@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志跟随（follow）模块
+为每个日志源保持一个 `tail -F` 风格的常驻流，把解析后的日志行写入每个节点的
+有界内存环形缓冲区，工具调用时直接读取缓冲区而不再发起远程读取。
+（独立模块，不依赖其他文件）
+
+支持的日志源：
+- docker：docker exec <container> sh -c（tail -f + 轮转检测，见 tail_follow_command）
+- ssh：通过已有的 paramiko SSHClient 打开 exec 通道执行同样的命令
+- local：本地文件轮询跟随（按 inode/大小检测轮转，Windows 上也可用）
+
+日志流断开后按最后一行的 (文件, inode, 字节偏移) 续读，断开期间写入的日志不会丢失，
+也不会重复；无法续读时在缓冲区中插入一行缺口提示。
+"""
+
+import os
+import shlex
+import time
+import logging
+import threading
+import subprocess
+from collections import deque
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# 默认配置
+DEFAULT_BUFFER_LINES = 5000  # 每个节点环形缓冲区保留的行数
+DEFAULT_BACKLOG_LINES = 200  # 启动跟随时先载入的历史行数（断线重连时从断开处续读）
+RECONNECT_DELAY = 2.0  # 日志流断开后的初始重连间隔（秒）
+MAX_RECONNECT_DELAY = 30.0  # 重连间隔上限（秒）
+STREAM_MIN_UPTIME = 10.0  # 日志流保持这么久（或输出过内容）才算连接成功，重置重连间隔（秒）
+LOCAL_POLL_INTERVAL = 0.5  # 本地文件轮询间隔（秒）
+TAIL_WATCH_INTERVAL = 2  # 远端检测日志轮转/截断的间隔（秒）
+
+# 读取位置：(文件路径, inode, 已读取内容末尾的字节偏移)
+StreamPosition = Tuple[str, str, int]
+# 日志流中的一项：(日志行, 读到该行末尾时的位置)
+# 日志行为 None 表示只更新位置；位置为 None 表示缺口提示行（不经过过滤）
+StreamItem = Tuple[Optional[str], Optional[StreamPosition]]
+# 日志流：(迭代器, 关闭函数)
+LogStream = Tuple[Iterable[StreamItem], Callable[[], None]]
+# 打开日志流的函数：参数为 (先载入的历史行数, 续读位置或 None)，返回 None 表示暂时无法打开（稍后重试）
+StreamOpener = Callable[[int, Optional[StreamPosition]], Optional[LogStream]]
+
+
+class LogRingBuffer:
+    """有界日志环形缓冲区，每行带递增序号，便于增量消费"""
+
+    def __init__(self, max_lines: int = DEFAULT_BUFFER_LINES):
+        self._lines: deque = deque(maxlen=max_lines)
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    def append(self, line: str):
+        with self._lock:
+            self._seq += 1
+            self._lines.append((self._seq, line))
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    def recent(self, max_lines: Optional[int] = None) -> List[str]:
+        """返回最近的 max_lines 行"""
+        with self._lock:
+            items = list(self._lines)
+        if max_lines:
+            items = items[-max_lines:]
+        return [line for _, line in items]
+
+    def read_since(self, seq: int, max_lines: Optional[int] = None) -> Tuple[List[str], int]:
+        """
+        返回序号大于 seq 的行
+
+        Returns:
+            (日志行列表, 最后一行的序号)；超出缓冲区容量的旧行会被丢弃
+        """
+        with self._lock:
+            items = [item for item in self._lines if item[0] > seq]
+            last_seq = self._seq
+        if max_lines:
+            items = items[-max_lines:]
+        return [line for _, line in items], last_seq
+
+
+# ==================== 日志流 ====================
+
+def _gap_line(reason: str) -> str:
+    what = "截断" if reason == "truncated" else "轮转且找不到轮转后的旧文件"
+    return f"[日志跟随] 日志流中断期间文件被{what}，中断期间写入的日志可能缺失\n"
+
+
+def _iter_stream_items(raw_lines: Iterable[bytes]) -> Iterator[StreamItem]:
+    """
+    解析 tail_follow_command 的输出
+
+    以 NUL 开头的是控制行：`POS <inode> <偏移> <文件>` 表示之后的字节从该文件的该偏移开始，
+    `GAP <原因>` 表示无法续读；其余为日志行，每行附带读到该行末尾时的位置。
+    流结束时未写完的最后一行不返回，续读时会重新读到
+    """
+    position: Optional[StreamPosition] = None
+    for raw in raw_lines:
+        data, sep, control = raw.partition(b"\x00")
+        if data and (sep or data.endswith(b"\n")):
+            if position is not None:
+                position = (position[0], position[1], position[2] + len(data))
+            text = data.decode("utf-8", errors="ignore")
+            yield (text if text.endswith("\n") else text + "\n"), position
+        if not sep:
+            continue
+        kind, _, args = control.rstrip(b"\n").decode("utf-8", errors="ignore").partition(" ")
+        if kind == "POS":
+            inode, offset, path = args.split(" ", 2)
+            position = (path, inode, int(offset))
+            yield None, position
+        elif kind == "GAP":
+            yield _gap_line(args), None
+
+
+def tail_follow_command(file_path: str, backlog_lines: int = DEFAULT_BACKLOG_LINES,
+                        position: Optional[StreamPosition] = None,
+                        watch_interval: float = TAIL_WATCH_INTERVAL) -> str:
+    """
+    生成在远端 sh 中跟随日志文件的命令（docker exec / ssh 共用）
+
+    - position 为空：先输出文件末尾 backlog_lines 行，再跟随新写入的内容
+    - position 不为空：文件 inode 未变时从该偏移续读；文件已轮转时先按 inode 找到轮转后的旧文件
+      （原文件名或 `<文件名>.*`）读完剩余部分，再从新文件开头读取；找不到或文件被截断时输出 GAP
+    - 用 `tail -f` 跟随文件描述符而不是 `tail -F` 跟随文件名，读到的字节始终属于同一个 inode；
+      文件被轮转或截断后命令退出，由跟随器按位置重连
+    """
+    n = int(backlog_lines)
+    script = [
+        f"f={shlex.quote(file_path)}",
+        "st=$(stat -c '%i %s' \"$f\") || exit 1",
+        "ino=${st% *}; sz=${st#* }",
+    ]
+    if position is not None:
+        known_path, known_inode, known_offset = position
+        kp, ki, ko = shlex.quote(known_path), shlex.quote(str(known_inode)), int(known_offset)
+        script += [
+            f"if [ \"$ino\" = {ki} ]; then",
+            f"  off={ko}; if [ \"$sz\" -lt \"$off\" ]; then printf '\\000GAP truncated\\n'; off=0; fi",
+            "else",
+            "  old=''",
+            f"  for c in {kp} {kp}.* \"$f\".*; do",
+            f"    if [ -f \"$c\" ] && [ \"$(stat -c %i \"$c\")\" = {ki} ]; then old=$c; break; fi",
+            "  done",
+            "  if [ -n \"$old\" ]; then",
+            f"    printf '\\000POS %s %s %s\\n' {ki} {ko} \"$old\"; tail -c +{ko + 1} \"$old\"",
+            "  else printf '\\000GAP rotated\\n'; fi",
+            "  off=0",
+            "fi",
+        ]
+    elif n > 0:
+        script.append(f"off=$((sz - $(head -c \"$sz\" \"$f\" | tail -n {n} | wc -c)))")
+    else:
+        script.append("off=$sz")
+    script += [
+        "printf '\\000POS %s %s %s\\n' \"$ino\" \"$off\" \"$f\"",
+        "tail -c +$((off + 1)) -f \"$f\" & pid=$!",
+        "trap 'kill $pid 2>/dev/null' EXIT HUP INT TERM",
+        "prev=$off",
+        "while kill -0 $pid 2>/dev/null; do",
+        f"  sleep {watch_interval:g}",
+        "  st=$(stat -c '%i %s' \"$f\" 2>/dev/null) || break",
+        "  [ \"${st% *}\" = \"$ino\" ] && [ \"${st#* }\" -ge \"$prev\" ] || break",
+        "  prev=${st#* }",
+        "done",
+    ]
+    return "\n".join(script)
+
+
+def open_docker_tail_stream(container: str, file_path: str,
+                            backlog_lines: int = DEFAULT_BACKLOG_LINES,
+                            position: Optional[StreamPosition] = None) -> LogStream:
+    """在容器内跟随日志文件，返回日志流（position 见 tail_follow_command）"""
+    proc = subprocess.Popen(
+        ["docker", "exec", container, "sh", "-c", tail_follow_command(file_path, backlog_lines, position)],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL
+    )
+
+    def close():
+        try:
+            proc.kill()
+            proc.wait(timeout=5)
+        except Exception:
+            pass
+
+    return _iter_stream_items(iter(proc.stdout.readline, b"")), close
+
+
+def open_ssh_tail_stream(ssh_client, file_path: str,
+                         backlog_lines: int = DEFAULT_BACKLOG_LINES,
+                         position: Optional[StreamPosition] = None) -> LogStream:
+    """通过 paramiko SSHClient 打开跟随日志文件的通道，返回日志流（position 见 tail_follow_command）"""
+    command = tail_follow_command(file_path, backlog_lines, position)
+    _, stdout, _ = ssh_client.exec_command(f"sh -c {shlex.quote(command)}")
+    channel = stdout.channel
+    raw = channel.makefile("rb")
+
+    def close():
+        try:
+            channel.close()
+        except Exception:
+            pass
+
+    return _iter_stream_items(iter(raw.readline, b"")), close
+
+
+def _find_rotated_file(file_path: str, known_path: str, known_inode: str) -> Optional[str]:
+    """按 inode 查找轮转后的旧文件（原文件名、`<原文件名>.*`、`<当前文件名>.*`）"""
+    candidates = [known_path]
+    for base in dict.fromkeys([known_path, file_path]):
+        directory = os.path.dirname(base) or "."
+        prefix = os.path.basename(base) + "."
+        try:
+            names = sorted(os.listdir(directory))
+        except OSError:
+            continue
+        candidates.extend(os.path.join(directory, name) for name in names if name.startswith(prefix))
+    for candidate in candidates:
+        try:
+            if str(os.stat(candidate).st_ino) == known_inode:
+                return candidate
+        except OSError:
+            continue
+    return None
+
+
+def _resume_local(file_path: str, position: StreamPosition):
+    """本地文件续读：读完轮转后的旧文件的剩余部分，返回当前文件的起始偏移"""
+    known_path, known_inode, known_offset = position
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        st = None
+    if st is not None and str(st.st_ino) == known_inode:
+        if st.st_size >= known_offset:
+            return known_offset
+        yield _gap_line("truncated"), None
+        return 0
+
+    old_path = _find_rotated_file(file_path, known_path, known_inode)
+    if old_path is None:
+        yield _gap_line("rotated"), None
+        return 0
+    with open(old_path, "rb") as f:
+        f.seek(known_offset)
+        yield None, position
+        for raw in iter(f.readline, b""):
+            if not raw.endswith(b"\n"):
+                break
+            yield raw.decode("utf-8", errors="ignore"), (known_path, known_inode, f.tell())
+    return 0
+
+
+def open_local_tail_stream(file_path: str, backlog_lines: int = DEFAULT_BACKLOG_LINES,
+                           position: Optional[StreamPosition] = None,
+                           poll_interval: float = LOCAL_POLL_INTERVAL) -> LogStream:
+    """本地文件轮询跟随（类似 tail -F），返回日志流（position 的含义与 tail_follow_command 相同）"""
+    stopped = threading.Event()
+
+    def lines() -> Iterator[StreamItem]:
+        f = None
+        inode = None
+        # 下次打开文件时的起始偏移（None 表示按 backlog_lines 定位）
+        start = None
+        if position is not None:
+            start = yield from _resume_local(file_path, position)
+        try:
+            while not stopped.is_set():
+                if f is None:
+                    try:
+                        f = open(file_path, "rb")
+                    except OSError:
+                        stopped.wait(poll_interval)
+                        continue
+                    inode = str(os.fstat(f.fileno()).st_ino)
+                    if start is not None:
+                        f.seek(start)
+                        start = None
+                    elif backlog_lines:
+                        backlog = deque(f, maxlen=backlog_lines)
+                        if backlog and not backlog[-1].endswith(b"\n"):
+                            backlog.pop()
+                        f.seek(-sum(len(raw) for raw in backlog), os.SEEK_CUR)
+                    else:
+                        f.seek(0, os.SEEK_END)
+                    yield None, (file_path, inode, f.tell())
+
+                raw = f.readline()
+                if raw.endswith(b"\n"):
+                    yield raw.decode("utf-8", errors="ignore"), (file_path, inode, f.tell())
+                    continue
+                # 未写完的行退回，等待下次读取
+                if raw:
+                    f.seek(-len(raw), os.SEEK_CUR)
+
+                # 检测轮转（文件被替换或截断）：旧文件已读完，从新文件开头读取
+                try:
+                    st = os.stat(file_path)
+                    if str(st.st_ino) != inode or st.st_size < f.tell():
+                        f.close()
+                        f = None
+                        start = 0
+                        continue
+                except OSError:
+                    pass
+                stopped.wait(poll_interval)
+        finally:
+            if f is not None:
+                f.close()
+
+    return lines(), stopped.set
+
+
+# ==================== 跟随器 ====================
+
+class LogFollower:
+    """单个节点的日志跟随线程：保持日志流常开，断开后自动重连"""
+
+    def __init__(self, node_name: str, open_stream: StreamOpener,
+                 buffer: LogRingBuffer, line_filter: Optional[Callable[[str], bool]] = None,
+                 backlog_lines: int = DEFAULT_BACKLOG_LINES):
+        """
+        Args:
+            node_name: 节点名称（LOG_FILES_CONFIG 中的 name）
+            open_stream: 打开日志流的函数（见 StreamOpener），返回 None 表示暂时无法打开（稍后重试）
+            buffer: 写入的环形缓冲区
+            line_filter: 过滤函数，返回 True 表示丢弃该行
+            backlog_lines: 首次打开时先载入的历史行数；重连时从上次读到的位置续读，不再载入历史行，
+                           否则历史行会再次进入缓冲区并被 read_new 重复消费
+        """
+        self.node_name = node_name
+        self.open_stream = open_stream
+        self.buffer = buffer
+        self.line_filter = line_filter
+        self.backlog_lines = backlog_lines
+        self._position: Optional[StreamPosition] = None  # 最后一行的读取位置，重连时从这里续读
+        self._stop = threading.Event()
+        self._close: Optional[Callable[[], None]] = None
+        self._thread = threading.Thread(target=self._run, name=f"log-follower-{node_name}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def is_alive(self) -> bool:
+        return self._thread.is_alive()
+
+    def stop(self):
+        self._stop.set()
+        if self._close:
+            self._close()
+
+    def _run(self):
+        delay = RECONNECT_DELAY
+        while not self._stop.is_set():
+            try:
+                # 缓冲区已有内容（跟随器重启）但没有位置时，不再重复载入历史行
+                backlog_lines = self.backlog_lines if self._position is None and self.buffer.last_seq == 0 else 0
+                stream = self.open_stream(backlog_lines, self._position)
+                if stream is None:
+                    raise RuntimeError("日志流暂不可用")
+                lines, self._close = stream
+                # 对已停止的容器 docker exec 也能"打开"，随即退出；
+                # 只有输出过内容或保持足够久的流才重置重连间隔，否则继续指数退避
+                opened_at = time.monotonic()
+                for line, position in lines:
+                    delay = RECONNECT_DELAY
+                    if self._stop.is_set():
+                        break
+                    if position is None:
+                        # 缺口提示行
+                        self.buffer.append(line)
+                        continue
+                    self._position = position
+                    if line is None or (self.line_filter and self.line_filter(line)):
+                        continue
+                    self.buffer.append(line)
+                if time.monotonic() - opened_at >= STREAM_MIN_UPTIME:
+                    delay = RECONNECT_DELAY
+            except Exception as e:
+                logging.warning(f"日志跟随中断 (节点: {self.node_name}): {e}")
+            finally:
+                if self._close:
+                    self._close()
+                    self._close = None
+
+            if not self._stop.is_set():
+                self._stop.wait(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+
+class LogFollowerManager:
+    """管理所有节点的跟随器和缓冲区"""
+
+    def __init__(self, buffer_lines: int = DEFAULT_BUFFER_LINES, backlog_lines: int = DEFAULT_BACKLOG_LINES):
+        self.buffer_lines = buffer_lines
+        self.backlog_lines = backlog_lines
+        self.buffers: Dict[str, LogRingBuffer] = {}
+        self.followers: Dict[str, LogFollower] = {}
+        self._cursors: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def start(self, node_name: str, open_stream: StreamOpener,
+              line_filter: Optional[Callable[[str], bool]] = None) -> bool:
+        """为节点启动跟随器（已在运行则直接返回 False）"""
+        with self._lock:
+            follower = self.followers.get(node_name)
+            if follower and follower.is_alive():
+                return False
+            buffer = self.buffers.setdefault(node_name, LogRingBuffer(self.buffer_lines))
+            follower = LogFollower(node_name, open_stream, buffer, line_filter, self.backlog_lines)
+            self.followers[node_name] = follower
+        follower.start()
+        return True
+
+    def stop_all(self):
+        with self._lock:
+            followers = list(self.followers.values())
+            self.followers.clear()
+        for follower in followers:
+            follower.stop()
+
+    def is_following(self, node_name: str) -> bool:
+        follower = self.followers.get(node_name)
+        return follower is not None and follower.is_alive()
+
+    def get_recent(self, node_name: str, max_lines: Optional[int] = None) -> List[str]:
+        """读取节点最近的日志（不移动消费游标）"""
+        buffer = self.buffers.get(node_name)
+        return buffer.recent(max_lines) if buffer else []
+
+    def read_new(self, node_name: str, consumer: str = "default",
+                 max_lines: Optional[int] = None) -> List[str]:
+        """读取该消费者上次读取之后的新日志，并移动游标"""
+        buffer = self.buffers.get(node_name)
+        if not buffer:
+            return []
+        key = (consumer, node_name)
+        with self._lock:
+            lines, last_seq = buffer.read_since(self._cursors.get(key, 0), max_lines)
+            self._cursors[key] = last_seq
+        return lines
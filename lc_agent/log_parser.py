@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志行解析/分类模块
+使用预编译的正则把每一行 Hadoop 日志解析一次，得到时间戳、级别、logger 类名和消息，
+日志读取过滤、错误统计、关键词搜索共用同一份解析结果。
+（独立模块，不依赖其他文件）
+
+Hadoop log4j 默认格式：
+    2024-01-01 12:00:00,123 INFO org.apache.hadoop.hdfs.server.namenode.NameNode: STARTUP_MSG: ...
+"""
+
+import re
+from functools import lru_cache
+from typing import Iterable, List, Optional
+
+# 标准格式：时间戳 + 毫秒 + 级别（logger 类名和消息在需要时再切分）
+_LOG_LINE_RE = re.compile(r'(\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2})[,\s]+\d+\s+([A-Z]+)\s+')
+# 非标准格式的时间戳（ISO8601 带 T、dd/mm/yyyy）
+_FALLBACK_TIMESTAMP_RE = re.compile(
+    r'\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}'
+    r'|\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}'
+    r'|\d{2}/\d{2}/\d{4}\s+\d{2}:\d{2}:\d{2}'
+)
+_CLASSPATH_RE = re.compile(r'STARTUP_MSG:\s+classpath\s*=', re.IGNORECASE)
+
+# 错误类型判定优先级（与原 get_error_logs_summary 一致）
+ERROR_TYPES = ('ERROR', 'FATAL', 'CRITICAL', 'EXCEPTION')
+
+_UNSET = object()
+
+
+class ParsedLogLine:
+    """解析后的日志行；logger/消息/严重程度等字段首次访问时计算并缓存"""
+
+    __slots__ = ('raw', 'timestamp', 'level', '_body_start',
+                 '_logger', '_message', '_severity', '_error_type', '_is_classpath', '_lower')
+
+    def __init__(self, raw: str, timestamp: Optional[str], level: Optional[str], body_start: int = 0):
+        self.raw = raw
+        self.timestamp = timestamp
+        self.level = level
+        self._body_start = body_start
+        self._logger = _UNSET
+        self._message = None
+        self._severity = _UNSET
+        self._error_type = None
+        self._is_classpath = _UNSET
+        self._lower = None
+
+    def _split_body(self):
+        body = self.raw[self._body_start:]
+        logger, sep, message = body.partition(': ') if self.level else ('', '', body)
+        if sep and logger and ' ' not in logger:
+            self._logger, self._message = logger, message
+        else:
+            self._logger, self._message = None, body
+
+    @property
+    def logger(self) -> Optional[str]:
+        """logger 类名（如 org.apache.hadoop.hdfs.server.namenode.NameNode）"""
+        if self._logger is _UNSET:
+            self._split_body()
+        return self._logger
+
+    @property
+    def message(self) -> str:
+        """日志消息（标准格式去掉时间戳/级别/logger，非标准格式为整行）"""
+        if self._logger is _UNSET:
+            self._split_body()
+        return self._message
+
+    @property
+    def is_info(self) -> bool:
+        return self.level == 'INFO'
+
+    @property
+    def is_classpath(self) -> bool:
+        """是否是 STARTUP_MSG 中的 classpath 行"""
+        if self._is_classpath is _UNSET:
+            self._is_classpath = '=' in self.raw and _CLASSPATH_RE.search(self.raw) is not None
+        return self._is_classpath
+
+    @property
+    def severity(self) -> Optional[str]:
+        """
+        行的严重程度：'error'（包含 ERROR/FATAL/CRITICAL/EXCEPTION）、'warning'（包含 WARN）或 None
+
+        按关键词在整行中匹配（不只看级别字段），与堆栈中的 Exception 行等保持一致
+        """
+        if self._severity is _UNSET:
+            upper = self.raw.upper()
+            self._severity = None
+            for error_type in ERROR_TYPES:
+                if error_type in upper:
+                    self._severity = 'error'
+                    self._error_type = error_type
+                    break
+            else:
+                if 'WARN' in upper:
+                    self._severity = 'warning'
+        return self._severity
+
+    @property
+    def error_type(self) -> Optional[str]:
+        """错误类型（ERROR/FATAL/CRITICAL/EXCEPTION），非错误行为 None"""
+        self.severity
+        return self._error_type
+
+    @property
+    def lower(self) -> str:
+        """小写后的整行，用于不区分大小写的关键词搜索"""
+        if self._lower is None:
+            self._lower = self.raw.lower()
+        return self._lower
+
+    def should_filter(self, filter_info: bool = True, filter_classpath: bool = True) -> bool:
+        """True 表示该行应被过滤（跳过）"""
+        if filter_info and self.level == 'INFO':
+            return True
+        if filter_classpath and self.is_classpath:
+            return True
+        return False
+
+
+def parse_log_line(line: str) -> ParsedLogLine:
+    """
+    解析一行日志
+
+    结果按去掉行尾换行后的文本缓存：读取时过滤过的行（带换行）在之后统计/搜索
+    （按 '\\n' 切分，不带换行）时直接命中缓存，不再重复解析。
+
+    Args:
+        line: 原始日志行
+
+    Returns:
+        ParsedLogLine（raw 不含行尾换行）；非标准格式的行 level/logger 为 None，message 为整行
+    """
+    return _parse_log_line(line.rstrip('\r\n'))
+
+
+@lru_cache(maxsize=65536)
+def _parse_log_line(line: str) -> ParsedLogLine:
+    # 绝大多数行以时间戳开头，先做锚定匹配；失败时再在整行中查找
+    match = _LOG_LINE_RE.match(line)
+    if match is None and '-' in line:
+        match = _LOG_LINE_RE.search(line)
+    if match:
+        return ParsedLogLine(line, match.group(1), match.group(2), match.end())
+
+    timestamp_match = _FALLBACK_TIMESTAMP_RE.search(line) if ('-' in line or '/' in line) else None
+    return ParsedLogLine(line, timestamp_match.group(0) if timestamp_match else None, None)
+
+
+def parse_log_lines(lines: Iterable[str]) -> List[ParsedLogLine]:
+    """批量解析日志行"""
+    return [parse_log_line(line) for line in lines]
+
+
+def extract_timestamp(line: str) -> Optional[str]:
+    """从日志行中提取时间戳"""
+    return parse_log_line(line).timestamp
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志读取器状态存储
+使用 SQLite（WAL 模式）保存每个节点的读取位置，按 (节点名, 文件名) 存储并记录 inode：
+- 写入是原子的，进程崩溃不会留下半个状态文件
+- 远程读取日志期间不持有锁；保存时按节点比较并设置（读取位置仍是本次读取前的值才写入），
+  多个 Agent/Gradio 会话并发时同一段日志只会被一个会话提交
+- 每个节点只保留当前文件的记录，轮转掉的旧文件的记录在保存时删除
+- 修改 LOG_FILES_CONFIG 的顺序或增删条目不会影响其它节点的读取位置
+（独立模块，不依赖其他文件）
+"""
+
+import os
+import json
+import time
+import logging
+import sqlite3
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+BUSY_TIMEOUT = 60  # 等待其它进程释放写锁的时间（秒）
+
+
+class LogReaderStateStore:
+    """日志读取位置存储（SQLite）"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS log_offsets (
+                    node TEXT NOT NULL,
+                    file TEXT NOT NULL,
+                    inode TEXT,
+                    offset INTEGER NOT NULL,
+                    updated_ns INTEGER NOT NULL,
+                    PRIMARY KEY (node, file)
+                )
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None：由代码显式控制事务
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        独占写事务（BEGIN IMMEDIATE），其它进程/线程的 transaction() 会等待当前事务提交；
+        事务内只做数据库操作，不要在事务内读取远程日志
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def load(self, conn: Optional[sqlite3.Connection] = None) -> Dict[str, Dict]:
+        """
+        读取每个节点最近一次的读取状态
+
+        Returns:
+            {节点名: {"file": 文件名或None, "inode": inode或None, "offset": 字节偏移}}
+        """
+        own_conn = conn is None
+        conn = conn or self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT node, file, inode, offset FROM log_offsets ORDER BY updated_ns"
+            ).fetchall()
+        finally:
+            if own_conn:
+                conn.close()
+        # 按更新时间升序遍历，同一节点保留最后更新的文件
+        return {
+            node: {"file": file or None, "inode": inode, "offset": offset}
+            for node, file, inode, offset in rows
+        }
+
+    def save(self, states: Dict[str, Dict], conn: Optional[sqlite3.Connection] = None,
+             expected: Optional[Dict[str, Dict]] = None) -> List[str]:
+        """
+        批量写入读取状态（一次提交），并删除这些节点其它文件的记录
+
+        Args:
+            states: {节点名: {"file": 文件名或None, "inode": inode或None, "offset": 字节偏移}}
+            expected: {节点名: {"file": ..., "offset": ...}}，读取前加载的状态；
+                      指定时只写入当前保存的文件和偏移仍与之相同的节点（比较并设置），
+                      其它会话已经提交了该节点的新位置时跳过
+
+        Returns:
+            实际写入的节点名列表
+        """
+        if not states:
+            return []
+        if conn is None:
+            with self.transaction() as own_conn:
+                return self.save(states, own_conn, expected)
+
+        if expected is not None:
+            current = self.load(conn)
+            unchanged = {}
+            for node, state in states.items():
+                before = expected.get(node) or {}
+                stored = current.get(node) or {}
+                if (stored.get("file"), stored.get("offset") or 0) == (before.get("file"), before.get("offset") or 0):
+                    unchanged[node] = state
+                else:
+                    logging.info(f"节点 {node} 的读取位置已被其它会话更新，本次不保存")
+            states = unchanged
+
+        now = time.time_ns()
+        rows = [
+            (node, state.get("file") or "", state.get("inode"), int(state.get("offset") or 0), now)
+            for node, state in states.items()
+        ]
+        conn.executemany(
+            "INSERT INTO log_offsets (node, file, inode, offset, updated_ns) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(node, file) DO UPDATE SET "
+            "inode=excluded.inode, offset=excluded.offset, updated_ns=excluded.updated_ns",
+            rows
+        )
+        # 只有最近一次的文件会被读取，轮转掉的旧文件的记录不再需要
+        conn.executemany(
+            "DELETE FROM log_offsets WHERE node = ? AND file != ?",
+            [(node, file) for node, file, _, _, _ in rows]
+        )
+        return list(states)
+
+    def is_empty(self) -> bool:
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT 1 FROM log_offsets LIMIT 1").fetchone() is None
+        finally:
+            conn.close()
+
+    def import_legacy_json(self, json_path: str, node_names: List[str]) -> bool:
+        """
+        导入旧版按列表下标保存的 JSON 状态文件（log_reader_state.json）
+
+        Args:
+            json_path: 旧状态文件路径
+            node_names: 与旧文件下标对应的节点名（LOG_FILES_CONFIG 的 name）
+
+        Returns:
+            是否导入成功
+        """
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            positions = state.get("last_positions", [])
+            files = state.get("last_files", [])
+            if len(positions) != len(node_names):
+                return False
+            self.save({
+                name: {"file": files[i] if i < len(files) else None, "inode": None, "offset": positions[i]}
+                for i, name in enumerate(node_names)
+            })
+            logging.info(f"已导入旧版日志读取状态: {json_path}")
+            return True
+        except Exception as e:
+            logging.warning(f"导入旧版日志读取状态失败: {e}")
+            return False
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+监控指标时序存储
+把每次采集到的数值型指标连同时间戳写入 SQLite（WAL 模式），同时维护 1 分钟、1 小时两级汇总，
+按级别配置保留时长。Agent 和监控面板可以直接查询趋势（如最近一小时的堆内存增长、
+复制不足数据块的变化），不需要重新访问 JMX。
+（独立模块，不依赖其他文件）
+
+序列名称：<节点>.<指标键>，如 namenode.heap_memory_usage、datanode1.storage_usage；
+<节点>.up 记录该节点本次是否采集成功（1/0）。
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+BUSY_TIMEOUT = 30  # 等待其它进程释放写锁的时间（秒）
+
+# 各级别的桶宽（秒）和默认保留时长（秒）
+RESOLUTIONS = {
+    "raw": 0,
+    "1m": 60,
+    "1h": 3600,
+}
+DEFAULT_RETENTION = {
+    "raw": 6 * 3600,  # 原始数据保留 6 小时
+    "1m": 7 * 86400,  # 1 分钟汇总保留 7 天
+    "1h": 90 * 86400,  # 1 小时汇总保留 90 天
+}
+PRUNE_INTERVAL = 300  # 清理过期数据的最小间隔（秒）
+
+
+def _numeric(value) -> Optional[float]:
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (int, float)):
+        return float(value)
+    return None
+
+
+def flatten_metrics(metrics_data: Dict[str, Any]) -> List[Tuple[str, float]]:
+    """
+    把 collect_all_metrics() 的结果展开为 (序列名, 数值) 列表
+
+    每个指标优先使用 raw_value，其次 heartbeat_value，再次数值型的 value；非数值指标（如状态文字）跳过。
+    结果为 None 的节点（本次未采集）不产生任何数据点。
+    """
+    points = []
+    nodes = [("namenode", metrics_data.get("namenode", {}))]
+    nodes.extend((metrics_data.get("datanodes") or {}).items())
+    for node, node_data in nodes:
+        if node_data is None:
+            continue
+        up = node_data.get("status") != "error" and bool(node_data.get("metrics"))
+        points.append((f"{node}.up", 1.0 if up else 0.0))
+        for key, metric in (node_data.get("metrics") or {}).items():
+            for field in ("raw_value", "heartbeat_value", "value"):
+                value = _numeric(metric.get(field))
+                if value is not None:
+                    points.append((f"{node}.{key}", value))
+                    break
+    return points
+
+
+class MetricStore:
+    """指标时序存储（SQLite）"""
+
+    def __init__(self, db_path: str, retention: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            db_path: 数据库文件路径
+            retention: 各级别保留时长（秒），如 {"raw": 3600, "1m": 86400, "1h": 30 * 86400}
+        """
+        self.db_path = db_path
+        self.retention = dict(DEFAULT_RETENTION, **(retention or {}))
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS samples_raw (
+                    series TEXT NOT NULL,
+                    ts REAL NOT NULL,
+                    value REAL NOT NULL,
+                    PRIMARY KEY (series, ts)
+                ) WITHOUT ROWID
+                """
+            )
+            for resolution in ("1m", "1h"):
+                conn.execute(
+                    f"""
+                    CREATE TABLE IF NOT EXISTS samples_{resolution} (
+                        series TEXT NOT NULL,
+                        bucket INTEGER NOT NULL,
+                        count INTEGER NOT NULL,
+                        sum REAL NOT NULL,
+                        min REAL NOT NULL,
+                        max REAL NOT NULL,
+                        last REAL NOT NULL,
+                        PRIMARY KEY (series, bucket)
+                    ) WITHOUT ROWID
+                    """
+                )
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # ==================== 写入 ====================
+
+    def record(self, metrics_data: Dict[str, Any], timestamp: Optional[float] = None) -> int:
+        """
+        写入一次 collect_all_metrics() 的采集结果
+
+        Returns:
+            写入的数据点数
+        """
+        return self.record_points(flatten_metrics(metrics_data), timestamp)
+
+    def record_points(self, points: Iterable[Tuple[str, float]], timestamp: Optional[float] = None) -> int:
+        """
+        写入同一时刻的一组数据点，并更新 1 分钟/1 小时汇总（一次提交）
+
+        Args:
+            points: [(序列名, 数值)]
+            timestamp: Unix 时间戳（秒），默认当前时间
+        """
+        points = list(points)
+        if not points:
+            return 0
+        ts = time.time() if timestamp is None else timestamp
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO samples_raw (series, ts, value) VALUES (?, ?, ?)",
+                        ((series, ts, value) for series, value in points)
+                    )
+                    for resolution in ("1m", "1h"):
+                        bucket = int(ts // RESOLUTIONS[resolution]) * RESOLUTIONS[resolution]
+                        conn.executemany(
+                            f"INSERT INTO samples_{resolution} (series, bucket, count, sum, min, max, last) "
+                            f"VALUES (?, ?, 1, ?, ?, ?, ?) "
+                            f"ON CONFLICT(series, bucket) DO UPDATE SET "
+                            f"count = count + 1, sum = sum + excluded.sum, "
+                            f"min = MIN(min, excluded.min), max = MAX(max, excluded.max), last = excluded.last",
+                            ((series, bucket, value, value, value, value) for series, value in points)
+                        )
+                    if time.monotonic() - self._last_prune >= PRUNE_INTERVAL:
+                        self._prune(conn, ts)
+                        self._last_prune = time.monotonic()
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                conn.execute("COMMIT")
+            finally:
+                conn.close()
+        return len(points)
+
+    def _prune(self, conn: sqlite3.Connection, now: float):
+        """删除超过保留时长的数据"""
+        conn.execute("DELETE FROM samples_raw WHERE ts < ?", (now - self.retention["raw"],))
+        for resolution in ("1m", "1h"):
+            conn.execute(
+                f"DELETE FROM samples_{resolution} WHERE bucket < ?",
+                (now - self.retention[resolution],)
+            )
+
+    # ==================== 查询 ====================
+
+    def _auto_resolution(self, window: float) -> str:
+        """按时间窗口选择级别：窗口在原始数据保留期内用原始数据，在 1 分钟汇总保留期内用 1 分钟汇总，否则用 1 小时汇总"""
+        if window <= self.retention["raw"]:
+            return "raw"
+        if window <= self.retention["1m"]:
+            return "1m"
+        return "1h"
+
+    def query(self, series: str, window: float = 3600, resolution: str = "auto",
+              end: Optional[float] = None) -> List[Tuple[float, float]]:
+        """
+        查询一个序列最近 window 秒的数据
+
+        Args:
+            series: 序列名，如 "namenode.heap_memory_usage"
+            window: 时间窗口（秒）
+            resolution: "raw"、"1m"、"1h" 或 "auto"
+            end: 窗口结束时间（Unix 时间戳），默认当前时间
+
+        Returns:
+            [(时间戳, 数值)]，按时间升序；汇总级别的数值为桶内平均值
+        """
+        end = time.time() if end is None else end
+        start = end - window
+        if resolution == "auto":
+            resolution = self._auto_resolution(window)
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"不支持的级别: {resolution}")
+        conn = self._connect()
+        try:
+            if resolution == "raw":
+                rows = conn.execute(
+                    "SELECT ts, value FROM samples_raw WHERE series = ? AND ts >= ? AND ts <= ? ORDER BY ts",
+                    (series, start, end)
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    f"SELECT bucket, sum / count FROM samples_{resolution} "
+                    f"WHERE series = ? AND bucket >= ? AND bucket <= ? ORDER BY bucket",
+                    (series, start - RESOLUTIONS[resolution], end)
+                ).fetchall()
+        finally:
+            conn.close()
+        return [(float(ts), value) for ts, value in rows]
+
+    def summarize(self, series: str, window: float = 3600, resolution: str = "auto") -> Optional[Dict[str, Any]]:
+        """
+        一个序列在时间窗口内的趋势摘要
+
+        Returns:
+            {"first", "last", "min", "max", "avg", "delta", "count", "start", "end"}；无数据时返回 None
+        """
+        points = self.query(series, window, resolution)
+        if not points:
+            return None
+        values = [value for _, value in points]
+        return {
+            "first": values[0],
+            "last": values[-1],
+            "min": min(values),
+            "max": max(values),
+            "avg": sum(values) / len(values),
+            "delta": values[-1] - values[0],
+            "count": len(values),
+            "start": points[0][0],
+            "end": points[-1][0],
+        }
+
+    def list_series(self, prefix: Optional[str] = None) -> List[str]:
+        """列出已有的序列名（从 1 小时汇总中读取，覆盖保留期内的所有序列）"""
+        conn = self._connect()
+        try:
+            if prefix:
+                rows = conn.execute(
+                    "SELECT DISTINCT series FROM samples_1h WHERE series >= ? AND series < ? ORDER BY series",
+                    (prefix, prefix + "\uffff")
+                ).fetchall()
+            else:
+                rows = conn.execute("SELECT DISTINCT series FROM samples_1h ORDER BY series").fetchall()
+        finally:
+            conn.close()
+        return [row[0] for row in rows]
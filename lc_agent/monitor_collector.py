@@ -10,9 +10,24 @@ import requests
 import os
 import subprocess
 import json
+import time
 import logging
+import threading
+import random
+import re
+import shutil
+import socket
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from fnmatch import fnmatchcase
+from typing import Callable, Dict, Any, Optional, List, Tuple
+from urllib.parse import quote, urlsplit
+
+try:
+    from .metric_store import DEFAULT_RETENTION, MetricStore
+except ImportError:
+    from lc_agent.metric_store import DEFAULT_RETENTION, MetricStore
 
 # ==================== JMX API 配置 ====================
 # Docker环境：通过 docker exec 在容器内访问 JMX（因为 JMX 只监听容器内部网络）
@@ -45,14 +60,141 @@ DATANODES = [
     "http://127.0.0.1:9865/jmx",  # datanode2
 ]
 
+# 采集配置
+JMX_COLLECT_DEADLINE = 40  # 一次完整采集（所有节点并发）的截止时间（秒），需大于单节点 curl 超时
+JMX_HTTP_POOL_SIZE = 4  # 每个 JMX 端点保持的 HTTP 长连接数
+
+# JMX 访问方式（transport）选择：每个端点首次访问时探测所有可用方式，缓存最快的一种，失败时自动切换
+#   http   - 主机直接访问映射端口（docker-compose.yml 中的 9870/9864/9865）
+#   docker - docker exec 在容器内执行 curl
+#   ssh    - 通过 SSH 在远程主机上执行 curl（需配置 JMX_SSH_HOST，复用 ControlMaster 长连接）
+JMX_TRANSPORTS = ["http", "docker", "ssh"]
+JMX_TRANSPORT_REPROBE_INTERVAL = 600  # 重新探测的间隔（秒），更快的方式恢复后可以切回
+JMX_HTTP_CONNECT_PROBE_TIMEOUT = 2  # 探测时检查端口是否可直连的超时（秒）
+JMX_SSH_HOST = os.getenv("JMX_SSH_HOST")  # 如 user@docker-host；为空时不使用 SSH
+JMX_SSH_CONTROL_PERSIST = 300  # SSH 长连接空闲保持时间（秒）
+
+# 时序存储配置（每次采集的数值型指标写入本地时序库，供趋势查询）
+METRIC_STORE_ENABLED = os.getenv("METRIC_STORE_ENABLED", "true").lower() in ("1", "true", "yes")
+METRIC_STORE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "metrics", "metrics.db")
+METRIC_STORE_RETENTION = dict(DEFAULT_RETENTION)  # 各级别保留时长（秒），默认值定义在 metric_store.DEFAULT_RETENTION
+
+# 后台采集配置（所有界面/工具共享同一份最新采集结果）
+METRICS_POLL_INTERVAL = 15  # 后台采集间隔（秒）
+METRICS_POLL_JITTER = 0.1  # 采集间隔随机抖动比例（±10%）
+METRICS_MAX_BACKOFF = 300  # 异常节点的最大退避时间（秒）
+METRICS_MIN_REFRESH_INTERVAL = 5  # 手动刷新的最小间隔（秒），间隔内直接返回最近结果
+
+# 监控面板趋势小图（sparkline）配置
+SPARKLINE_WINDOW = 900  # 趋势时间窗口（秒）
+SPARKLINE_MAX_POINTS = 30  # 每条趋势线最多点数
+
+# 采集所需的 JMX Bean（通过 /jmx?qry= 只获取这些 Bean，而不是下载完整的 /jmx 文档）
+NAMENODE_JMX_QUERIES = [
+    "Hadoop:service=NameNode,name=NameNodeStatus",
+    "Hadoop:service=NameNode,name=FSNamesystemState",
+    "java.lang:type=Memory",
+]
+DATANODE_JMX_QUERIES = [
+    "Hadoop:service=DataNode,name=DataNodeInfo",
+    "Hadoop:service=DataNode,name=FSDatasetState*",
+    "java.lang:type=Memory",
+]
+_JMX_OUTPUT_SEPARATOR = "@@JMX-QUERY-END@@"
+
+# 按端点（scheme://host:port）复用的 HTTP 会话，保持 keep-alive 长连接
+_http_sessions: Dict[str, requests.Session] = {}
+_http_sessions_lock = threading.Lock()
+
+
+def _get_http_session(url: str) -> requests.Session:
+    """获取 URL 所在端点的长连接会话（首次访问时创建）"""
+    parts = urlsplit(url)
+    endpoint = f"{parts.scheme}://{parts.netloc}"
+    with _http_sessions_lock:
+        session = _http_sessions.get(endpoint)
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=JMX_HTTP_POOL_SIZE,
+                max_retries=1  # 只在建立连接失败时重试一次（服务端关闭了空闲长连接）
+            )
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _http_sessions[endpoint] = session
+        return session
+
+
+_metric_store: Optional[MetricStore] = None
+_metric_store_lock = threading.Lock()
+
+
+def get_metric_store() -> Optional[MetricStore]:
+    """获取指标时序存储（METRIC_STORE_ENABLED 关闭或初始化失败时返回 None）"""
+    global _metric_store
+    if not METRIC_STORE_ENABLED:
+        return None
+    with _metric_store_lock:
+        if _metric_store is None:
+            try:
+                _metric_store = MetricStore(METRIC_STORE_PATH, METRIC_STORE_RETENTION)
+            except Exception as e:
+                logging.warning(f"初始化指标时序存储失败: {e}")
+                return None
+        return _metric_store
 
-def fetch_jmx_via_docker(container: str, port: int) -> tuple[Optional[Dict], Optional[str]]:
+
+def close_http_sessions():
+    """关闭所有 JMX HTTP 长连接"""
+    with _http_sessions_lock:
+        sessions = list(_http_sessions.values())
+        _http_sessions.clear()
+    for session in sessions:
+        session.close()
+
+
+def jmx_query_url(url: str, query: str) -> str:
+    """拼接 Hadoop JMX Servlet 的 ?qry= 查询 URL（query 为 ObjectName 或带 * 的模式）"""
+    return f"{url}?qry={quote(query, safe='*')}"
+
+
+def index_jmx_beans(beans: List[Dict]) -> Dict[str, Dict]:
+    """把 JMX beans 列表转换为按 Bean 名称索引的字典"""
+    return {bean.get("name"): bean for bean in beans if bean.get("name")}
+
+
+def _curl_jmx_command(url: str, queries: Optional[List[str]] = None) -> str:
+    """在目标主机/容器内执行的 curl 命令；多个查询用 && 串联（任一 curl 失败时返回该 curl 的错误码）"""
+    if not queries:
+        return f"curl -s -m 30 '{url}'"
+    return " && ".join(
+        f"curl -s -m 30 '{jmx_query_url(url, query)}' && echo '{_JMX_OUTPUT_SEPARATOR}'"
+        for query in queries
+    )
+
+
+def _parse_curl_jmx_output(output: str, queries: Optional[List[str]] = None) -> Dict:
+    """解析 _curl_jmx_command 的输出（多个查询的结果合并为一个 beans 列表），JSON 无效时抛出 JSONDecodeError"""
+    if not queries:
+        return json.loads(output)
+    beans = []
+    for part in output.split(_JMX_OUTPUT_SEPARATOR):
+        if part.strip():
+            beans.extend(json.loads(part).get("beans", []))
+    return {"beans": beans}
+
+
+def fetch_jmx_via_docker(container: str, port: int,
+                         queries: Optional[List[str]] = None) -> tuple[Optional[Dict], Optional[str]]:
     """
     通过 docker exec 在容器内访问 JMX API
     
     Args:
         container: 容器名称
         port: JMX 端口
+        queries: 需要的 Bean（ObjectName 模式）列表；指定时在一次 docker exec 中依次执行
+                 /jmx?qry= 查询并合并结果，为 None 时获取完整的 /jmx
     
     Returns:
         (数据字典, 错误信息)，如果成功返回 (data, None)，失败返回 (None, error_msg)
@@ -61,10 +203,13 @@ def fetch_jmx_via_docker(container: str, port: int) -> tuple[Optional[Dict], Opt
     
     try:
         # 通过 docker exec 在容器内执行 curl 命令访问 JMX
-        cmd = f'docker exec {container} sh -c "curl -s -m 30 {url} 2>&1"'
+        if queries:
+            cmd = ["docker", "exec", container, "sh", "-c", f"{_curl_jmx_command(url, queries)} 2>&1"]
+        else:
+            cmd = f'docker exec {container} sh -c "curl -s -m 30 {url} 2>&1"'
         result = subprocess.run(
             cmd,
-            shell=True,
+            shell=isinstance(cmd, str),
             capture_output=True,
             text=True,
             timeout=35
@@ -97,8 +242,7 @@ def fetch_jmx_via_docker(container: str, port: int) -> tuple[Optional[Dict], Opt
         
         # 尝试解析 JSON
         try:
-            data = json.loads(result.stdout)
-            return data, None
+            return _parse_curl_jmx_output(result.stdout, queries), None
         except json.JSONDecodeError as e:
             # JSON 解析失败，返回原始内容的前500字符用于调试
             content_preview = result.stdout[:500] if result.stdout else "(空响应)"
@@ -162,32 +306,245 @@ def get_container_by_url(url: str) -> Optional[tuple[str, int]]:
     return None
 
 
-def fetch_jmx(url: str) -> tuple[Optional[Dict], Optional[str]]:
+def fetch_jmx_via_ssh(host: str, url: str,
+                      queries: Optional[List[str]] = None) -> tuple[Optional[Dict], Optional[str]]:
+    """
+    通过 SSH 在远程主机（Docker 宿主机）上执行 curl 访问 JMX API
+
+    使用 ControlMaster 复用 SSH 连接，只有第一次访问需要握手。
+
+    Args:
+        host: SSH 目标（如 user@docker-host）
+        url: 远程主机上可访问的 JMX URL（映射端口）
+        queries: 同 fetch_jmx_via_docker
+    """
+    cmd = [
+        "ssh", "-o", "BatchMode=yes", "-o", "ConnectTimeout=5",
+        "-o", "ControlMaster=auto", "-o", "ControlPath=/tmp/lc-agent-ssh-%r@%h:%p",
+        "-o", f"ControlPersist={JMX_SSH_CONTROL_PERSIST}",
+        host, _curl_jmx_command(url, queries)
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=35)
+    except subprocess.TimeoutExpired:
+        return None, f"通过 SSH 访问 JMX 超时 (主机: {host}, URL: {url})"
+    except Exception as e:
+        return None, f"通过 SSH 访问 JMX 失败 (主机: {host}, URL: {url})\n错误详情: {str(e)}"
+    if result.returncode != 0:
+        error_output = (result.stderr or result.stdout or "(无输出)")[:500]
+        return None, f"SSH 执行 curl 失败 (主机: {host}, 返回码: {result.returncode})\n错误输出: {error_output}"
+    if not result.stdout.strip():
+        return None, f"JMX 响应为空 (主机: {host}, URL: {url})"
+    try:
+        return _parse_curl_jmx_output(result.stdout, queries), None
+    except json.JSONDecodeError as e:
+        return None, f"JSON解析失败 (主机: {host}, URL: {url})\n错误详情: {str(e)}\n响应预览: {result.stdout[:500]}"
+
+
+def _fetch_jmx_direct(url: str, queries: Optional[List[str]] = None) -> tuple[Optional[Dict], Optional[str]]:
+    """主机直接通过 HTTP 访问 JMX（多个查询逐个请求，复用同一端点的长连接）"""
+    if not queries:
+        return _fetch_jmx_http(url)
+    beans = []
+    for query in queries:
+        data, error = _fetch_jmx_http(jmx_query_url(url, query))
+        if error:
+            return None, error
+        beans.extend(data.get("beans", []))
+    return {"beans": beans}, None
+
+
+def _port_reachable(url: str, timeout: float = JMX_HTTP_CONNECT_PROBE_TIMEOUT) -> bool:
+    """检查 URL 的端口能否从本机直接建立 TCP 连接"""
+    parts = urlsplit(url)
+    try:
+        with socket.create_connection((parts.hostname, parts.port or 80), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+class JmxTransportSelector:
+    """
+    按端点选择 JMX 访问方式
+
+    - 端点首次访问时依次尝试所有可用方式，选用耗时最短的成功方式
+    - 之后每隔 JMX_TRANSPORT_REPROBE_INTERVAL 秒在后台线程中试探其它方式（本次采集仍用选中的方式，不等待探测），
+      其它方式更快时切换
+    - 选中的方式失败时，按历史耗时依次尝试其它方式，成功则切换
+    - 记录每个端点、每种方式的成功/失败次数和耗时，供 get_jmx_transport_stats() 查看
+    """
+
+    def __init__(self, transports: Optional[List[str]] = None,
+                 reprobe_interval: float = JMX_TRANSPORT_REPROBE_INTERVAL):
+        self.transports = list(transports or JMX_TRANSPORTS)
+        self.reprobe_interval = reprobe_interval
+        self._lock = threading.Lock()
+        self._endpoint_locks: Dict[str, threading.Lock] = {}
+        self._chosen: Dict[str, str] = {}  # 端点 -> 选中的方式
+        self._probed_at: Dict[str, float] = {}  # 端点 -> 上次探测时间
+        self._stats: Dict[str, Dict[str, Dict[str, Any]]] = {}  # 端点 -> 方式 -> 统计
+
+    def _available(self, url: str) -> List[str]:
+        """当前环境下该端点可用的访问方式"""
+        available = []
+        for transport in self.transports:
+            if transport == "http":
+                available.append(transport)
+            elif transport == "docker" and get_container_by_url(url) and shutil.which("docker"):
+                available.append(transport)
+            elif transport == "ssh" and JMX_SSH_HOST and shutil.which("ssh"):
+                available.append(transport)
+        return available
+
+    def _call(self, transport: str, url: str, queries: Optional[List[str]]) -> tuple[Optional[Dict], Optional[str]]:
+        if transport == "http":
+            return _fetch_jmx_direct(url, queries)
+        if transport == "docker":
+            container, port = get_container_by_url(url)
+            return fetch_jmx_via_docker(container, port, queries)
+        if transport == "ssh":
+            return fetch_jmx_via_ssh(JMX_SSH_HOST, url, queries)
+        return None, f"未知的 JMX 访问方式: {transport}"
+
+    def _timed_call(self, transport: str, url: str, queries: Optional[List[str]]) -> tuple[Optional[Dict], Optional[str]]:
+        start = time.perf_counter()
+        data, error = self._call(transport, url, queries)
+        self._record(url, transport, (time.perf_counter() - start) * 1000, error)
+        return data, error
+
+    def _record(self, url: str, transport: str, elapsed_ms: float, error: Optional[str]):
+        with self._lock:
+            stats = self._stats.setdefault(url, {}).setdefault(transport, {
+                "success": 0, "failure": 0, "last_ms": None, "avg_ms": None, "last_error": None
+            })
+            if error:
+                stats["failure"] += 1
+                stats["last_error"] = error.splitlines()[0]
+                return
+            stats["success"] += 1
+            stats["last_ms"] = round(elapsed_ms, 1)
+            # 指数移动平均，反映最近的耗时
+            stats["avg_ms"] = round(elapsed_ms if stats["avg_ms"] is None else 0.7 * stats["avg_ms"] + 0.3 * elapsed_ms, 1)
+
+    def _latency(self, url: str, transport: str) -> float:
+        stats = self._stats.get(url, {}).get(transport) or {}
+        return stats["avg_ms"] if stats.get("avg_ms") is not None else float("inf")
+
+    def fetch(self, url: str, queries: Optional[List[str]] = None) -> tuple[Optional[Dict], Optional[str]]:
+        with self._lock:
+            endpoint_lock = self._endpoint_locks.setdefault(url, threading.Lock())
+        # 同一端点串行探测，避免并发请求重复探测
+        with endpoint_lock:
+            chosen = self._chosen.get(url)
+            if chosen is None:
+                return self._probe(url, queries)
+            if time.monotonic() - self._probed_at.get(url, 0) >= self.reprobe_interval:
+                self._probed_at[url] = time.monotonic()
+                threading.Thread(
+                    target=self._reprobe, args=(url, chosen, queries), name="jmx-reprobe", daemon=True
+                ).start()
+
+        data, error = self._timed_call(chosen, url, queries)
+        if not error:
+            return data, None
+
+        # 选中的方式失败：按历史耗时尝试其它方式
+        logging.warning(f"JMX 访问方式 {chosen} 失败，尝试其它方式: {url}")
+        fallbacks = sorted((t for t in self._available(url) if t != chosen), key=lambda t: self._latency(url, t))
+        for transport in fallbacks:
+            fallback_data, fallback_error = self._timed_call(transport, url, queries)
+            if not fallback_error:
+                with self._lock:
+                    self._chosen[url] = transport
+                logging.info(f"JMX 访问方式切换为 {transport}: {url}")
+                return fallback_data, None
+        return None, error
+
+    def _probe(self, url: str, queries: Optional[List[str]]) -> tuple[Optional[Dict], Optional[str]]:
+        """依次尝试所有可用方式，选用最快的成功方式，返回其结果"""
+        results = {}
+        first_error = None
+        for transport in self._available(url):
+            if transport == "http" and not _port_reachable(url):
+                self._record(url, transport, 0, f"端口不可直连: {url}")
+                continue
+            data, error = self._timed_call(transport, url, queries)
+            if error:
+                first_error = first_error or error
+            else:
+                results[transport] = data
+        self._probed_at[url] = time.monotonic()
+        if not results:
+            return None, first_error or f"没有可用的 JMX 访问方式: {url}"
+        best = min(results, key=lambda t: self._latency(url, t))
+        with self._lock:
+            previous = self._chosen.get(url)
+            self._chosen[url] = best
+        if best != previous:
+            logging.info(f"JMX 访问方式选择 {best}（{self._latency(url, best):.0f} ms）: {url}")
+        return results[best], None
+
+    def _reprobe(self, url: str, chosen: str, queries: Optional[List[str]]):
+        """后台试探选中方式以外的其它方式（只更新耗时统计），成功且更快时切换"""
+        succeeded = [chosen]
+        for transport in self._available(url):
+            if transport == chosen:
+                continue
+            if transport == "http" and not _port_reachable(url):
+                self._record(url, transport, 0, f"端口不可直连: {url}")
+                continue
+            _, error = self._timed_call(transport, url, queries)
+            if not error:
+                succeeded.append(transport)
+        with self._lock:
+            if self._chosen.get(url) != chosen:
+                return
+            best = min(succeeded, key=lambda t: self._latency(url, t))
+            self._chosen[url] = best
+        if best != chosen:
+            logging.info(f"JMX 访问方式切换为 {best}（{self._latency(url, best):.0f} ms）: {url}")
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """{端点: {"chosen": 选中的方式, "transports": {方式: 统计}}}"""
+        with self._lock:
+            return {
+                url: {
+                    "chosen": self._chosen.get(url),
+                    "transports": {transport: dict(stats) for transport, stats in transports.items()},
+                }
+                for url, transports in self._stats.items()
+            }
+
+
+_jmx_transport_selector = JmxTransportSelector()
+
+
+def get_jmx_transport_stats() -> Dict[str, Dict[str, Any]]:
+    """查看每个 JMX 端点选中的访问方式和各方式的成功率、耗时"""
+    return _jmx_transport_selector.stats()
+
+
+def fetch_jmx(url: str, queries: Optional[List[str]] = None) -> tuple[Optional[Dict], Optional[str]]:
     """
-    获取JMX监控数据（通过 docker exec 在容器内访问）
+    获取JMX监控数据
     
-    注意：由于 JMX 服务只监听容器内部网络，无法从主机直接访问，
-    因此使用 docker exec 在容器内访问 JMX API。
+    自动选择访问方式（见 JmxTransportSelector）：映射端口可以从主机直连时直接走 HTTP 长连接，
+    否则使用 docker exec 在容器内访问（JMX 只监听容器内部网络时），或通过 SSH 在 Docker 宿主机上访问。
     
     Args:
-        url: JMX API URL（用于识别容器和端口）
+        url: JMX API URL（主机映射端口，也用于识别容器和端口）
+        queries: 需要的 Bean（ObjectName 模式）列表，通过 /jmx?qry= 只获取这些 Bean；
+                 为 None 时获取完整的 /jmx
     
     Returns:
         (数据字典, 错误信息)，如果成功返回 (data, None)，失败返回 (None, error_msg)
     """
-    # 根据 URL 获取容器名称和端口
-    container_info = get_container_by_url(url)
-    
-    if container_info:
-        container, port = container_info
-        # 使用 docker exec 方式访问
-        return fetch_jmx_via_docker(container, port)
-    
-    # 如果无法识别容器，尝试直接 HTTP 访问（向后兼容）
+    return _jmx_transport_selector.fetch(url, queries)
 
-    logging.warning(f"无法识别容器，尝试直接 HTTP 访问: {url}")
-    
-    
+
+def _fetch_jmx_http(url: str) -> tuple[Optional[Dict], Optional[str]]:
+    """通过 HTTP 直接访问 JMX API"""
     # 如果使用 localhost，尝试替换为 127.0.0.1（某些环境下 localhost 解析可能有问题）
     # 注意：Windows 环境下，localhost 可能被代理拦截，优先使用 127.0.0.1
     alternative_url = None
@@ -197,26 +554,16 @@ def fetch_jmx(url: str) -> tuple[Optional[Dict], Optional[str]]:
         if os.name == 'nt':  # Windows
             url, alternative_url = alternative_url, url  # 交换，优先使用 127.0.0.1
     
-    # 创建 Session 以复用连接
-    session = requests.Session()
-    
-    # 配置连接池
-    adapter = requests.adapters.HTTPAdapter(
-        pool_connections=1,
-        pool_maxsize=1,
-        max_retries=0  # 不重试
-    )
-    session.mount('http://', adapter)
-    session.mount('https://', adapter)
+    # 按端点复用长连接会话
+    session = _get_http_session(url)
     
     # 添加请求头，模拟浏览器请求
-    # 注意：使用 Connection: close 避免连接复用问题
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
         'Accept': 'application/json, text/plain, */*',
         'Accept-Language': 'en-US,en;q=0.9',
         'Accept-Encoding': 'identity',  # 不使用压缩，避免解压问题
-        'Connection': 'close',  # 关闭连接复用，避免连接被提前关闭
+        'Connection': 'keep-alive',
         'Cache-Control': 'no-cache'
     }
     
@@ -260,7 +607,6 @@ def fetch_jmx(url: str) -> tuple[Optional[Dict], Optional[str]]:
                 logging.warning(f"JMX响应 Content-Type: {content_type}")
             
             data = r.json()
-            session.close()
             return data, None
         except ValueError as e:
             # JSON解析失败，返回原始内容的前500字符用于调试
@@ -289,7 +635,6 @@ def fetch_jmx(url: str) -> tuple[Optional[Dict], Optional[str]]:
                     try:
                         data = r.json()
                         logging.info(f"使用备用URL成功: {alternative_url}")
-                        session.close()
                         return data, None
                     except ValueError:
                         pass
@@ -316,7 +661,6 @@ def fetch_jmx(url: str) -> tuple[Optional[Dict], Optional[str]]:
             f"- 检查容器日志：docker logs <container>\n"
             f"\n错误详情: {str(e)}"
         )
-        session.close()
         return None, error_msg
         
     except requests.exceptions.Timeout as e:
@@ -325,7 +669,6 @@ def fetch_jmx(url: str) -> tuple[Optional[Dict], Optional[str]]:
             f"可能原因：服务负载过高或网络延迟\n"
             f"错误详情: {str(e)}"
         )
-        session.close()
         return None, error_msg
         
     except requests.exceptions.HTTPError as e:
@@ -346,14 +689,12 @@ def fetch_jmx(url: str) -> tuple[Optional[Dict], Optional[str]]:
             )
         else:
             error_msg = f"HTTP错误: {url} 返回 {status_code}，服务可能异常 - {str(e)}"
-        session.close()
         return None, error_msg
         
     except Exception as e:
         error_msg = f"未知错误: {url} - {str(e)}"
         import traceback
         logging.error(f"JMX请求异常: {traceback.format_exc()}")
-        session.close()
         return None, error_msg
         
     finally:
@@ -365,12 +706,12 @@ def fetch_jmx(url: str) -> tuple[Optional[Dict], Optional[str]]:
             pass
 
 
-def extract_jmx_value(beans: List[Dict], bean_name: str, field_name: str, default=None):
+def extract_jmx_value(beans, bean_name: str, field_name: str, default=None):
     """
     从 JMX beans 中提取指定字段的值
     
     Args:
-        beans: JMX beans 列表
+        beans: JmxSnapshot、index_jmx_beans() 返回的字典或原始 beans 列表
         bean_name: Bean 名称，如 "Hadoop:service=NameNode,name=NameNodeStatus"
         field_name: 字段名称，如 "State"
         default: 默认值
@@ -378,20 +719,191 @@ def extract_jmx_value(beans: List[Dict], bean_name: str, field_name: str, defaul
     Returns:
         字段值，如果找不到返回 default
     """
-    for bean in beans:
-        if bean.get("name") == bean_name:
-            return bean.get(field_name, default)
-    return default
+    if not isinstance(beans, JmxSnapshot):
+        beans = JmxSnapshot(beans)
+    return beans.get(bean_name, field_name, default)
+
+
+# ==================== JMX 快照与指标定义 ====================
+
+class JmxSnapshot:
+    """一次 JMX 采集结果，按 Bean 名称索引（每次采集只构建一次）"""
+
+    def __init__(self, beans):
+        """
+        Args:
+            beans: 原始 beans 列表，或 index_jmx_beans() 返回的字典
+        """
+        self.beans: Dict[str, Dict] = beans if isinstance(beans, dict) else index_jmx_beans(beans)
+
+    @classmethod
+    def from_response(cls, data: Dict) -> "JmxSnapshot":
+        return cls(data.get("beans", []))
+
+    def bean(self, name: str) -> Optional[Dict]:
+        """
+        按名称获取 Bean
+
+        名称中含 * 或 ? 时按通配符匹配，返回第一个匹配的 Bean
+        （如 "Hadoop:service=DataNode,name=FSDatasetState*" 兼容带 storage ID 后缀的旧版本名称）
+        """
+        bean = self.beans.get(name)
+        if bean is None and ('*' in name or '?' in name):
+            bean = next((b for n, b in self.beans.items() if fnmatchcase(n, name)), None)
+        return bean
+
+    def beans_matching(self, pattern: str) -> List[Dict]:
+        """返回名称匹配通配符模式的所有 Bean"""
+        return [bean for name, bean in self.beans.items() if fnmatchcase(name, pattern)]
+
+    def get(self, bean_name: str, field_name: str, default=None):
+        bean = self.bean(bean_name)
+        return bean.get(field_name, default) if bean is not None else default
+
+
+@dataclass(frozen=True)
+class MetricSpec:
+    """监控指标定义：从 JmxSnapshot 提取值，并给出显示值和是否正常"""
+    key: str  # result["metrics"] 中的键
+    name: str  # 显示名称
+    extract: Callable[[JmxSnapshot], Any]  # 提取原始值
+    display: Callable[[Any], Any] = lambda value: value  # 显示值
+    is_normal: Callable[[Any], bool] = lambda value: True  # 是否正常
+    raw_value: bool = False  # 是否输出 raw_value（仅数值）
+    heartbeat_value: bool = False  # 是否输出 heartbeat_value（NameNode 心跳统计）
+
+
+def evaluate_metrics(snapshot: JmxSnapshot, specs: List[MetricSpec]) -> Dict[str, Dict[str, Any]]:
+    """按指标定义表计算所有指标"""
+    metrics = {}
+    for spec in specs:
+        value = spec.extract(snapshot)
+        metric = {
+            "name": spec.name,
+            "value": spec.display(value),
+        }
+        if spec.raw_value and isinstance(value, (int, float)) and not isinstance(value, bool):
+            metric["raw_value"] = value
+        metric["status"] = "normal" if spec.is_normal(value) else "abnormal"
+        if spec.heartbeat_value:
+            metric["heartbeat_value"] = value
+        metrics[spec.key] = metric
+    return metrics
+
+
+def _field(bean_name: str, field_name: str, default=None) -> Callable[[JmxSnapshot], Any]:
+    return lambda snapshot: snapshot.get(bean_name, field_name, default)
+
+
+def _remaining_gb(bean_name: str, capacity_field: str, used_field: str) -> Callable[[JmxSnapshot], Any]:
+    """剩余存储空间（GB）：优先 RemainingGB，否则由总容量和已用容量计算"""
+    def extract(snapshot: JmxSnapshot):
+        remaining_gb = snapshot.get(bean_name, "RemainingGB", None)
+        if remaining_gb is None:
+            capacity = snapshot.get(bean_name, capacity_field, 0)
+            used = snapshot.get(bean_name, used_field, 0)
+            remaining_gb = (capacity - used) / (1024 ** 3) if capacity > 0 else 0
+        return remaining_gb
+    return extract
+
+
+def _heap_usage_percent(snapshot: JmxSnapshot):
+    """堆内存使用率（%）；无法获取时返回说明文字"""
+    memory_info = snapshot.bean(MEMORY_BEAN)
+    if not memory_info:
+        return "无法获取"
+    heap_memory_usage = memory_info.get("HeapMemoryUsage", {})
+    if not isinstance(heap_memory_usage, dict):
+        return "无法获取"
+    used = heap_memory_usage.get("used", 0)
+    max_mem = heap_memory_usage.get("max", 1)
+    if max_mem > 0:
+        return (used / max_mem) * 100
+    return "未知"
+
+
+def _datanode_state(snapshot: JmxSnapshot) -> str:
+    dn_info = snapshot.bean(DN_INFO_BEAN)
+    if not dn_info:
+        return "stopped"
+    version = dn_info.get("Version")
+    rpc_port = dn_info.get("RpcPort")
+    if (version and str(version).strip()) or (rpc_port is not None and rpc_port != 0):
+        return "running"
+    return "unknown"
+
+
+def _percent(value) -> str:
+    return f"{value:.2f}%"
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+NN_STATUS_BEAN = "Hadoop:service=NameNode,name=NameNodeStatus"
+NN_FS_BEAN = "Hadoop:service=NameNode,name=FSNamesystemState"
+DN_INFO_BEAN = "Hadoop:service=DataNode,name=DataNodeInfo"
+DN_FS_BEAN = "Hadoop:service=DataNode,name=FSDatasetState*"
+MEMORY_BEAN = "java.lang:type=Memory"
+
+HEAP_MEMORY_SPEC = MetricSpec(
+    "heap_memory_usage", "堆内存使用率", _heap_usage_percent,
+    display=lambda v: _percent(v) if _is_number(v) else v,
+    is_normal=lambda v: not _is_number(v) or v < 85,
+    raw_value=True
+)
+
+NAMENODE_METRICS = [
+    MetricSpec("namenode_status", "NameNode 状态", _field(NN_STATUS_BEAN, "State", "unknown"),
+               is_normal=lambda v: v in ["active", "standby"]),
+    MetricSpec("safemode", "安全模式状态", _field(NN_FS_BEAN, "Safemode", False),
+               display=lambda v: "开启" if v else "关闭", is_normal=lambda v: not v),
+    MetricSpec("corrupt_blocks", "损坏的数据块数", _field(NN_FS_BEAN, "CorruptBlocks", 0),
+               is_normal=lambda v: v == 0),
+    MetricSpec("missing_blocks", "缺失的数据块数", _field(NN_FS_BEAN, "MissingBlocks", 0),
+               is_normal=lambda v: v == 0),
+    MetricSpec("storage_usage", "NameNode 存储使用率", _field(NN_FS_BEAN, "PercentUsed", 0.0),
+               display=_percent, is_normal=lambda v: v < 90, raw_value=True),
+    # 当前集群有 3 个 DataNode（namenode容器1个 + datanode1 + datanode2）
+    MetricSpec("live_datanodes", "活跃 DataNode 数量", _field(NN_FS_BEAN, "NumLiveDataNodes", 0),
+               is_normal=lambda v: v >= 3, heartbeat_value=True),
+    MetricSpec("dead_datanodes", "死掉的 DataNode 数量", _field(NN_FS_BEAN, "NumDeadDataNodes", 0),
+               is_normal=lambda v: v == 0, heartbeat_value=True),
+    MetricSpec("under_replicated_blocks", "复制不足的数据块数", _field(NN_FS_BEAN, "UnderReplicatedBlocks", 0),
+               is_normal=lambda v: v == 0),
+    MetricSpec("total_blocks", "总数据块数", _field(NN_FS_BEAN, "TotalBlocks", 0)),
+    MetricSpec("remaining_storage", "剩余存储空间", _remaining_gb(NN_FS_BEAN, "CapacityTotal", "CapacityUsed"),
+               display=lambda v: f"{v:.2f} GB" if v else "未知",
+               is_normal=lambda v: v is None or v > 0, raw_value=True),
+    HEAP_MEMORY_SPEC,
+    MetricSpec("files_total", "文件数量", _field(NN_FS_BEAN, "FilesTotal", 0)),
+]
+
+DATANODE_METRICS = [
+    MetricSpec("datanode_status", "状态", _datanode_state, is_normal=lambda v: v == "running"),
+    MetricSpec("storage_usage", "存储使用率", _field(DN_FS_BEAN, "PercentUsed", 0.0),
+               display=_percent, is_normal=lambda v: v < 90, raw_value=True),
+    MetricSpec("under_replicated_blocks", "复制不足的数据块数", _field(DN_FS_BEAN, "UnderReplicatedBlocks", 0),
+               is_normal=lambda v: v == 0),
+    MetricSpec("num_blocks", "本地数据块数", _field(DN_FS_BEAN, "NumBlocks", 0)),
+    MetricSpec("remaining_storage", "剩余存储空间", _remaining_gb(DN_FS_BEAN, "Capacity", "DfsUsed"),
+               display=lambda v: f"{v:.2f} GB" if v else "未知",
+               is_normal=lambda v: v is None or v > 0, raw_value=True),
+    HEAP_MEMORY_SPEC,
+    MetricSpec("dfs_used_mb", "已用存储容量", lambda s: s.get(DN_FS_BEAN, "DfsUsed", 0) / (1024 ** 2),
+               display=lambda v: f"{v:.2f} MB", raw_value=True),
+]
 
 
 def get_namenode_metrics() -> Dict[str, Any]:
     """
-    获取 NameNode 的关键指标
+    获取 NameNode 的关键指标（指标定义见 NAMENODE_METRICS）
     
     Returns:
         包含 NameNode 指标的字典
     """
-    metrics_data, error = fetch_jmx(NAMENODE)
+    metrics_data, error = fetch_jmx(NAMENODE, NAMENODE_JMX_QUERIES)
     
     if error or not metrics_data:
         return {
@@ -400,160 +912,16 @@ def get_namenode_metrics() -> Dict[str, Any]:
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
     
-    beans = metrics_data.get("beans", [])
-    
-    # 提取关键指标
-    result = {
+    return {
         "status": "normal",
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "metrics": {}
-    }
-    
-    # 1. NameNode 状态
-    nn_status_bean = "Hadoop:service=NameNode,name=NameNodeStatus"
-    state = extract_jmx_value(beans, nn_status_bean, "State", "unknown")
-    result["metrics"]["namenode_status"] = {
-        "name": "NameNode 状态",
-        "value": state,
-        "status": "normal" if state in ["active", "standby"] else "abnormal"
-    }
-    
-    # 2. 安全模式状态
-    fs_bean = "Hadoop:service=NameNode,name=FSNamesystemState"
-    safemode = extract_jmx_value(beans, fs_bean, "Safemode", False)
-    result["metrics"]["safemode"] = {
-        "name": "安全模式状态",
-        "value": "开启" if safemode else "关闭",
-        "status": "normal" if not safemode else "abnormal"
-    }
-    
-    # 3. 损坏的数据块数
-    corrupt_blocks = extract_jmx_value(beans, fs_bean, "CorruptBlocks", 0)
-    result["metrics"]["corrupt_blocks"] = {
-        "name": "损坏的数据块数",
-        "value": corrupt_blocks,
-        "status": "normal" if corrupt_blocks == 0 else "abnormal"
-    }
-    
-    # 4. 缺失的数据块数
-    missing_blocks = extract_jmx_value(beans, fs_bean, "MissingBlocks", 0)
-    result["metrics"]["missing_blocks"] = {
-        "name": "缺失的数据块数",
-        "value": missing_blocks,
-        "status": "normal" if missing_blocks == 0 else "abnormal"
-    }
-    
-    # 5. 存储使用率
-    percent_used = extract_jmx_value(beans, fs_bean, "PercentUsed", 0.0)
-    result["metrics"]["storage_usage"] = {
-        "name": "NameNode 存储使用率",
-        "value": f"{percent_used:.2f}%",
-        "raw_value": percent_used,
-        "status": "normal" if percent_used < 90 else "abnormal"
-    }
-    
-    # 6. 活跃 DataNode 数量（心跳统计）
-    live_datanodes = extract_jmx_value(beans, fs_bean, "NumLiveDataNodes", 0)
-    result["metrics"]["live_datanodes"] = {
-        "name": "活跃 DataNode 数量",
-        "value": live_datanodes,
-        "status": "normal" if live_datanodes >= 3 else "abnormal",  # 当前集群有 3 个 DataNode（namenode容器1个 + datanode1 + datanode2）
-        "heartbeat_value": live_datanodes
-    }
-    
-    # 7. 死掉的 DataNode 数量（心跳统计）
-    dead_datanodes = extract_jmx_value(beans, fs_bean, "NumDeadDataNodes", 0)
-    result["metrics"]["dead_datanodes"] = {
-        "name": "死掉的 DataNode 数量",
-        "value": dead_datanodes,
-        "status": "normal" if dead_datanodes == 0 else "abnormal",
-        "heartbeat_value": dead_datanodes
-    }
-    
-    # 8. 复制不足的数据块数
-    under_replicated_blocks = extract_jmx_value(beans, fs_bean, "UnderReplicatedBlocks", 0)
-    result["metrics"]["under_replicated_blocks"] = {
-        "name": "复制不足的数据块数",
-        "value": under_replicated_blocks,
-        "status": "normal" if under_replicated_blocks == 0 else "abnormal"
-    }
-    
-    # 9. 总数据块数
-    total_blocks = extract_jmx_value(beans, fs_bean, "TotalBlocks", 0)
-    result["metrics"]["total_blocks"] = {
-        "name": "总数据块数",
-        "value": total_blocks,
-        "status": "normal"
+        "metrics": evaluate_metrics(JmxSnapshot.from_response(metrics_data), NAMENODE_METRICS)
     }
-    
-    # 10. 剩余存储空间
-    remaining_gb = extract_jmx_value(beans, fs_bean, "RemainingGB", None)
-    if remaining_gb is None:
-        capacity_total = extract_jmx_value(beans, fs_bean, "CapacityTotal", 0)
-        capacity_used = extract_jmx_value(beans, fs_bean, "CapacityUsed", 0)
-        if capacity_total > 0:
-            remaining = capacity_total - capacity_used
-            remaining_gb = remaining / (1024 ** 3)
-        else:
-            remaining_gb = 0
-    
-    result["metrics"]["remaining_storage"] = {
-        "name": "剩余存储空间",
-        "value": f"{remaining_gb:.2f} GB" if remaining_gb else "未知",
-        "raw_value": remaining_gb,
-        "status": "normal" if (remaining_gb is None or remaining_gb > 0) else "abnormal"
-    }
-    
-    # 11. 堆内存使用率
-    memory_bean = "java.lang:type=Memory"
-    memory_info = next((bean for bean in beans if bean.get("name") == memory_bean), None)
-    
-    if memory_info:
-        heap_memory_usage = memory_info.get("HeapMemoryUsage", {})
-        if isinstance(heap_memory_usage, dict):
-            used = heap_memory_usage.get("used", 0)
-            max_mem = heap_memory_usage.get("max", 1)
-            if max_mem > 0:
-                heap_usage_percent = (used / max_mem) * 100
-                result["metrics"]["heap_memory_usage"] = {
-                    "name": "堆内存使用率",
-                    "value": f"{heap_usage_percent:.2f}%",
-                    "raw_value": heap_usage_percent,
-                    "status": "normal" if heap_usage_percent < 85 else "abnormal"
-                }
-            else:
-                result["metrics"]["heap_memory_usage"] = {
-                    "name": "堆内存使用率",
-                    "value": "未知",
-                    "status": "normal"
-                }
-        else:
-            result["metrics"]["heap_memory_usage"] = {
-                "name": "堆内存使用率",
-                "value": "无法获取",
-                "status": "normal"
-            }
-    else:
-        result["metrics"]["heap_memory_usage"] = {
-            "name": "堆内存使用率",
-            "value": "无法获取",
-            "status": "normal"
-        }
-    
-    # 12. 文件数量
-    files_total = extract_jmx_value(beans, fs_bean, "FilesTotal", 0)
-    result["metrics"]["files_total"] = {
-        "name": "文件数量",
-        "value": files_total,
-        "status": "normal"
-    }
-    
-    return result
 
 
 def get_datanode_metrics(datanode_url: str, node_name: str) -> Dict[str, Any]:
     """
-    获取指定 DataNode 的关键指标
+    获取指定 DataNode 的关键指标（指标定义见 DATANODE_METRICS）
     
     Args:
         datanode_url: DataNode JMX URL
@@ -562,7 +930,7 @@ def get_datanode_metrics(datanode_url: str, node_name: str) -> Dict[str, Any]:
     Returns:
         包含 DataNode 指标的字典
     """
-    metrics_data, error = fetch_jmx(datanode_url)
+    metrics_data, error = fetch_jmx(datanode_url, DATANODE_JMX_QUERIES)
     
     if error or not metrics_data:
         return {
@@ -572,133 +940,38 @@ def get_datanode_metrics(datanode_url: str, node_name: str) -> Dict[str, Any]:
             "node": node_name
         }
     
-    beans = metrics_data.get("beans", [])
-    
-    result = {
+    return {
         "status": "normal",
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "node": node_name,
-        "metrics": {}
+        "metrics": evaluate_metrics(JmxSnapshot.from_response(metrics_data), DATANODE_METRICS)
     }
-    
-    # 1. DataNode 状态
-    dn_info_bean = "Hadoop:service=DataNode,name=DataNodeInfo"
-    dn_info = next((bean for bean in beans if bean.get("name") == dn_info_bean), None)
-    
-    if dn_info:
-        version = dn_info.get("Version")
-        rpc_port = dn_info.get("RpcPort")
-        
-        if (version and str(version).strip()) or (rpc_port is not None and rpc_port != 0):
-            state = "running"
-        else:
-            state = "unknown"
-    else:
-        state = "stopped"
-    
-    result["metrics"]["datanode_status"] = {
-        "name": "状态",
-        "value": state,
-        "status": "normal" if state == "running" else "abnormal"
-    }
-    
-    # 2. 存储使用率
-    fs_bean = "Hadoop:service=DataNode,name=FSDatasetState"
-    percent_used = extract_jmx_value(beans, fs_bean, "PercentUsed", 0.0)
-    result["metrics"]["storage_usage"] = {
-        "name": "存储使用率",
-        "value": f"{percent_used:.2f}%",
-        "raw_value": percent_used,
-        "status": "normal" if percent_used < 90 else "abnormal"
-    }
-    
-    # 3. 复制不足的数据块数
-    under_replicated_blocks = extract_jmx_value(beans, fs_bean, "UnderReplicatedBlocks", 0)
-    result["metrics"]["under_replicated_blocks"] = {
-        "name": "复制不足的数据块数",
-        "value": under_replicated_blocks,
-        "status": "normal" if under_replicated_blocks == 0 else "abnormal"
-    }
-    
-    # 4. 本地数据块数
-    num_blocks = extract_jmx_value(beans, fs_bean, "NumBlocks", 0)
-    result["metrics"]["num_blocks"] = {
-        "name": "本地数据块数",
-        "value": num_blocks,
-        "status": "normal"
-    }
-    
-    # 5. 剩余存储空间
-    remaining_gb = extract_jmx_value(beans, fs_bean, "RemainingGB", None)
-    if remaining_gb is None:
-        capacity = extract_jmx_value(beans, fs_bean, "Capacity", 0)
-        dfs_used = extract_jmx_value(beans, fs_bean, "DfsUsed", 0)
-        if capacity > 0:
-            remaining = capacity - dfs_used
-            remaining_gb = remaining / (1024 ** 3)
-        else:
-            remaining_gb = 0
-    
-    result["metrics"]["remaining_storage"] = {
-        "name": "剩余存储空间",
-        "value": f"{remaining_gb:.2f} GB" if remaining_gb else "未知",
-        "raw_value": remaining_gb,
-        "status": "normal" if (remaining_gb is None or remaining_gb > 0) else "abnormal"
-    }
-    
-    # 6. 堆内存使用率
-    memory_bean = "java.lang:type=Memory"
-    memory_info = next((bean for bean in beans if bean.get("name") == memory_bean), None)
-    
-    if memory_info:
-        heap_memory_usage = memory_info.get("HeapMemoryUsage", {})
-        if isinstance(heap_memory_usage, dict):
-            used = heap_memory_usage.get("used", 0)
-            max_mem = heap_memory_usage.get("max", 1)
-            if max_mem > 0:
-                heap_usage_percent = (used / max_mem) * 100
-                result["metrics"]["heap_memory_usage"] = {
-                    "name": "堆内存使用率",
-                    "value": f"{heap_usage_percent:.2f}%",
-                    "raw_value": heap_usage_percent,
-                    "status": "normal" if heap_usage_percent < 85 else "abnormal"
-                }
-            else:
-                result["metrics"]["heap_memory_usage"] = {
-                    "name": "堆内存使用率",
-                    "value": "未知",
-                    "status": "normal"
-                }
-        else:
-            result["metrics"]["heap_memory_usage"] = {
-                "name": "堆内存使用率",
-                "value": "无法获取",
-                "status": "normal"
-            }
-    else:
-        result["metrics"]["heap_memory_usage"] = {
-            "name": "堆内存使用率",
-            "value": "无法获取",
-            "status": "normal"
-        }
-    
-    # 7. 已用存储容量（MB）
-    dfs_used = extract_jmx_value(beans, fs_bean, "DfsUsed", 0)
-    dfs_used_mb = dfs_used / (1024 ** 2)
-    result["metrics"]["dfs_used_mb"] = {
-        "name": "已用存储容量",
-        "value": f"{dfs_used_mb:.2f} MB",
-        "raw_value": dfs_used_mb,
-        "status": "normal"
+
+
+def _timeout_result(deadline: float, node_name: Optional[str] = None) -> Dict[str, Any]:
+    result = {
+        "status": "error",
+        "error": f"采集超时（超过 {deadline} 秒）",
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     }
-    
+    if node_name:
+        result["node"] = node_name
     return result
 
 
-def collect_all_metrics() -> Dict[str, Any]:
+def collect_all_metrics(deadline: float = JMX_COLLECT_DEADLINE, record: bool = True,
+                        cached: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
     """
     采集所有关键监控指标
     
+    NameNode 和所有 DataNode 并发采集，总耗时取决于最慢的节点，
+    超过截止时间仍未返回的节点记为采集超时。
+    
+    Args:
+        deadline: 整次采集的截止时间（秒）
+        record: 是否把结果写入指标时序存储
+        cached: 本次不采集、直接沿用的节点结果（节点名 -> 结果），用于异常节点退避
+    
     Returns:
         包含所有监控数据的字典
     """
@@ -708,9 +981,6 @@ def collect_all_metrics() -> Dict[str, Any]:
         "datanodes": {}
     }
     
-    # 获取 NameNode 指标
-    result["namenode"] = get_namenode_metrics()
-    
     # 获取所有 DataNode 指标，并统计实际连接数量
     # 注意：实际有3个DataNode：
     # 1. namenode容器中的datanode（通过namenode的JMX获取，但namenode容器中的datanode没有独立JMX端口）
@@ -719,19 +989,51 @@ def collect_all_metrics() -> Dict[str, Any]:
     # 由于namenode容器中的datanode没有独立的JMX端口，我们只监控datanode1和datanode2
     # 但NameNode的JMX会显示所有3个DataNode的心跳信息
     node_names = ["datanode1", "datanode2"]
+    datanode_names = [node_names[i] if i < len(node_names) else f"datanode{i+1}" for i in range(len(DATANODES))]
     connected_count = 0
     disconnected_count = 0
     
-    for i, dn_url in enumerate(DATANODES):
-        node_name = node_names[i] if i < len(node_names) else f"datanode{i+1}"
-        dn_result = get_datanode_metrics(dn_url, node_name)
-        result["datanodes"][node_name] = dn_result
+    cached = cached or {}
+    poll_deadline = time.monotonic() + deadline
+    executor = ThreadPoolExecutor(max_workers=1 + len(DATANODES), thread_name_prefix="jmx-collector")
+    
+    def submit(node_name: str, fn, *args) -> Future:
+        if node_name in cached:
+            future = Future()
+            future.set_result(cached[node_name])
+            return future
+        return executor.submit(fn, *args)
+    
+    try:
+        namenode_future = submit("namenode", get_namenode_metrics)
+        datanode_futures = [
+            submit(node_name, get_datanode_metrics, dn_url, node_name)
+            for dn_url, node_name in zip(DATANODES, datanode_names)
+        ]
         
-        if (dn_result.get("status") != "error" and 
-            dn_result.get("metrics", {}).get("datanode_status", {}).get("value") == "running"):
-            connected_count += 1
-        else:
-            disconnected_count += 1
+        # 获取 NameNode 指标
+        try:
+            result["namenode"] = namenode_future.result(timeout=max(0.0, poll_deadline - time.monotonic()))
+        except FutureTimeoutError:
+            logging.warning("采集 NameNode 指标超时")
+            result["namenode"] = _timeout_result(deadline)
+        
+        for node_name, future in zip(datanode_names, datanode_futures):
+            try:
+                dn_result = future.result(timeout=max(0.0, poll_deadline - time.monotonic()))
+            except FutureTimeoutError:
+                logging.warning(f"采集 {node_name} 指标超时")
+                dn_result = _timeout_result(deadline, node_name)
+            result["datanodes"][node_name] = dn_result
+            
+            if (dn_result.get("status") != "error" and 
+                dn_result.get("metrics", {}).get("datanode_status", {}).get("value") == "running"):
+                connected_count += 1
+            else:
+                disconnected_count += 1
+    finally:
+        # 不等待超时的采集线程，避免拖过截止时间
+        executor.shutdown(wait=False, cancel_futures=True)
     
     # 更新 NameNode 指标中的活跃和死掉的 DataNode 数量
     # 注意：heartbeat_value来自NameNode的JMX，显示所有3个DataNode的心跳状态
@@ -750,19 +1052,287 @@ def collect_all_metrics() -> Dict[str, Any]:
             result["namenode"]["metrics"]["dead_datanodes"]["jmx_value"] = disconnected_count
             result["namenode"]["metrics"]["dead_datanodes"]["status"] = "normal" if disconnected_count == 0 else "abnormal"
     
+    if record:
+        store = get_metric_store()
+        if store:
+            # 只记录本次实际采集的节点：退避中沿用的旧结果不是新的观测，不能每次都记一个 up=0
+            fresh = dict(result)
+            fresh["namenode"] = None if "namenode" in cached else result["namenode"]
+            fresh["datanodes"] = {
+                node_name: (None if node_name in cached else dn_result)
+                for node_name, dn_result in result["datanodes"].items()
+            }
+            try:
+                store.record(fresh)
+            except Exception as e:
+                logging.warning(f"写入指标时序存储失败: {e}")
+    
     return result
 
 
-def format_metrics_for_display(metrics_data: Dict[str, Any]) -> str:
+class MetricsScheduler:
+    """
+    后台监控采集调度器
+
+    - 后台线程按固定间隔（带随机抖动）采集一次，结果发布到共享缓存，界面和工具直接读取
+    - 同一时刻最多只有一次采集：并发的刷新请求等待正在进行的采集并共享其结果
+    - 采集失败的节点按指数退避跳过后续采集（沿用上次的错误结果），恢复后立即取消退避
+    """
+
+    def __init__(self, interval: float = METRICS_POLL_INTERVAL, jitter: float = METRICS_POLL_JITTER,
+                 max_backoff: float = METRICS_MAX_BACKOFF):
+        self.interval = interval
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self._cond = threading.Condition()
+        self._latest: Optional[Dict[str, Any]] = None
+        self._latest_time = 0.0
+        self._version = 0  # 每发布一次新结果加 1，面板据此判断是否需要推送
+        self._collecting = False
+        self._backoff: Dict[str, Tuple[float, float, Dict[str, Any]]] = {}  # 节点 -> (退避时长, 下次采集时间, 上次结果)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """启动后台采集线程（已启动时忽略）"""
+        with self._cond:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="metrics-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and not self._stop.is_set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                logging.warning(f"后台监控采集失败: {e}")
+            self._stop.wait(self.interval * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    def snapshot(self) -> Tuple[int, Optional[Dict[str, Any]]]:
+        """返回 (版本号, 最新结果)，不触发采集；尚未采集过时结果为 None"""
+        with self._cond:
+            return self._version, self._latest
+
+    def get_latest(self, max_age: Optional[float] = None) -> Dict[str, Any]:
+        """
+        读取最新采集结果
+
+        Args:
+            max_age: 可接受的最大结果年龄（秒），默认两个采集间隔；没有足够新的结果时立即采集一次
+        """
+        if max_age is None:
+            max_age = self.interval * 2
+        return self.refresh(min_interval=max_age)
+
+    def refresh(self, min_interval: float = 0) -> Dict[str, Any]:
+        """
+        采集一次并发布结果
+
+        Args:
+            min_interval: 最近一次结果不超过该时间（秒）时直接返回，不重新采集
+        """
+        with self._cond:
+            if self._collecting:
+                # 已有采集在进行：等待其完成并共享结果
+                self._cond.wait_for(lambda: not self._collecting)
+                if self._latest is not None:
+                    return self._latest
+            elif self._latest is not None and time.monotonic() - self._latest_time < min_interval:
+                return self._latest
+            self._collecting = True
+
+        result = None
+        try:
+            result = self._collect()
+        finally:
+            with self._cond:
+                self._collecting = False
+                if result is not None:
+                    self._latest = result
+                    self._latest_time = time.monotonic()
+                    self._version += 1
+                self._cond.notify_all()
+        return result
+
+    def _collect(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        cached = {}
+        for node, (_, next_attempt, last_result) in self._backoff.items():
+            if now < next_attempt:
+                cached[node] = dict(
+                    last_result,
+                    error=f"{last_result.get('error', '')}\n（节点异常，{int(next_attempt - now)} 秒后重试）"
+                )
+
+        result = collect_all_metrics(cached=cached)
+
+        # 更新退避状态：本次实际采集失败的节点退避时间翻倍，成功的节点取消退避
+        node_results = [("namenode", result.get("namenode", {}))] + list(result.get("datanodes", {}).items())
+        for node, node_result in node_results:
+            if node in cached:
+                continue
+            if node_result.get("status") == "error":
+                previous = self._backoff.get(node)
+                delay = min(self.max_backoff, previous[0] * 2 if previous else self.interval * 2)
+                self._backoff[node] = (delay, now + delay, node_result)
+                logging.info(f"节点 {node} 采集失败，{delay:.0f} 秒内暂停采集")
+            else:
+                self._backoff.pop(node, None)
+        return result
+
+
+_metrics_scheduler: Optional[MetricsScheduler] = None
+_metrics_scheduler_lock = threading.Lock()
+
+
+def get_metrics_scheduler() -> MetricsScheduler:
+    """获取全局监控采集调度器"""
+    global _metrics_scheduler
+    with _metrics_scheduler_lock:
+        if _metrics_scheduler is None:
+            _metrics_scheduler = MetricsScheduler()
+        return _metrics_scheduler
+
+
+def start_metrics_scheduler() -> MetricsScheduler:
+    """启动后台监控采集（重复调用只启动一次）"""
+    scheduler = get_metrics_scheduler()
+    scheduler.start()
+    return scheduler
+
+
+def get_latest_metrics(max_age: Optional[float] = None) -> Dict[str, Any]:
+    """
+    读取共享的最新监控数据（界面和 Agent 工具使用）
+
+    后台调度器运行时直接返回缓存结果；没有足够新的结果时采集一次，并发调用只采集一次。
+    """
+    return get_metrics_scheduler().get_latest(max_age)
+
+
+def refresh_metrics() -> Dict[str, Any]:
+    """手动刷新：METRICS_MIN_REFRESH_INTERVAL 秒内的重复刷新直接返回最近结果"""
+    return get_metrics_scheduler().refresh(min_interval=METRICS_MIN_REFRESH_INTERVAL)
+
+
+_CELL_ID_RE = re.compile(r'[^A-Za-z0-9_-]')
+
+
+def metric_cell_id(node_name: str, key: str) -> str:
+    """监控面板中单元格的 DOM id（实时模式按 id 局部更新）"""
+    return _CELL_ID_RE.sub('_', f"mc-{node_name}-{key}")
+
+
+def render_sparkline(values: List[float], width: int = 60, height: int = 14) -> str:
+    """把一组数值渲染为内联 SVG 趋势线；少于 2 个点时返回空字符串"""
+    if len(values) < 2:
+        return ""
+    low, high = min(values), max(values)
+    span = (high - low) or 1.0
+    step = width / (len(values) - 1)
+    points = " ".join(
+        f"{i * step:.1f},{height - 1 - (value - low) / span * (height - 2):.1f}"
+        for i, value in enumerate(values)
+    )
+    return (
+        f"<svg width='{width}' height='{height}' style='vertical-align: middle; margin-left: 6px;'>"
+        f"<polyline points='{points}' fill='none' stroke='#3498db' stroke-width='1.2'/></svg>"
+    )
+
+
+def get_metric_sparklines(metrics_data: Dict[str, Any], window: float = SPARKLINE_WINDOW) -> Dict[str, str]:
+    """
+    从指标时序存储读取每个指标最近的历史，生成趋势小图
+
+    Returns:
+        {单元格 id: SVG}；时序存储未启用时返回空字典
+    """
+    store = get_metric_store()
+    if store is None:
+        return {}
+    sparklines = {}
+    nodes = [("namenode", metrics_data.get("namenode") or {})]
+    nodes.extend((metrics_data.get("datanodes") or {}).items())
+    try:
+        for node_name, node_data in nodes:
+            for key in (node_data.get("metrics") or {}):
+                values = [value for _, value in store.query(f"{node_name}.{key}", window)]
+                if len(values) > SPARKLINE_MAX_POINTS:
+                    values = values[-SPARKLINE_MAX_POINTS:]
+                svg = render_sparkline(values)
+                if svg:
+                    sparklines[metric_cell_id(node_name, key)] = svg
+    except Exception as e:
+        logging.warning(f"读取指标趋势失败: {e}")
+    return sparklines
+
+
+def metric_cells(metrics_data: Dict[str, Any], sparklines: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """
+    监控面板中每个可变单元格的内容
+
+    Returns:
+        {DOM id: 单元格内部 HTML}，包括各指标的数值、趋势小图、状态，异常节点的错误信息和更新时间；
+        两次结果的 id 集合相同时面板布局不变，只需推送内容变化的单元格。
+        趋势小图每次采集都会变化，单独占一个单元格，数值不变时不必随之重发
+    """
+    sparklines = sparklines or {}
+    cells = {}
+    nodes = [("namenode", metrics_data.get("namenode") or {})]
+    nodes.extend((metrics_data.get("datanodes") or {}).items())
+    for node_name, node_data in nodes:
+        if node_data.get("status") == "error":
+            cells[metric_cell_id(node_name, "error")] = f"❌ {node_data.get('error', '未知错误')}"
+            continue
+        for key, metric in node_data.get("metrics", {}).items():
+            cell_id = metric_cell_id(node_name, key)
+            cells[f"{cell_id}-value"] = f"{metric['value']}"
+            cells[f"{cell_id}-trend"] = sparklines.get(cell_id, "")
+            normal = metric["status"] == "normal"
+            cells[f"{cell_id}-status"] = (
+                f"<span style='color: {'#27ae60' if normal else '#e74c3c'};'>{'✅' if normal else '⚠️'}</span>"
+            )
+    cells["mc-updated"] = f"更新: {metrics_data.get('timestamp', '')}"
+    return cells
+
+
+def format_metrics_for_display(metrics_data: Dict[str, Any], sparklines: Optional[Dict[str, str]] = None) -> str:
     """
     格式化监控数据为 HTML 显示（紧凑版）
     
     Args:
         metrics_data: collect_all_metrics() 返回的数据
+        sparklines: get_metric_sparklines() 返回的趋势小图（可选）
     
     Returns:
-        HTML 格式的字符串
+        HTML 格式的字符串（可变单元格带 DOM id，见 metric_cells）
     """
+    cells = metric_cells(metrics_data, sparklines)
+    
+    def metric_rows(node_name: str, node_data: Dict[str, Any]) -> str:
+        if node_data.get("status") == "error":
+            error_id = metric_cell_id(node_name, "error")
+            return f"<tr><td id='{error_id}' colspan='3' style='color: red; padding: 5px; font-size: 11px;'>{cells[error_id]}</td></tr>"
+        rows = ""
+        for key, metric in node_data.get("metrics", {}).items():
+            cell_id = metric_cell_id(node_name, key)
+            rows += f"""
+            <tr style='border-bottom: 1px solid #f0f0f0;'>
+                <td style='padding: 4px 6px; font-weight: bold; width: 40%;'>{metric['name']}</td>
+                <td style='padding: 4px 6px; width: 35%;'><span id='{cell_id}-value'>{cells[cell_id + '-value']}</span><span id='{cell_id}-trend'>{cells[cell_id + '-trend']}</span></td>
+                <td id='{cell_id}-status' style='padding: 4px 6px; width: 25%; font-size: 11px;'>{cells[cell_id + '-status']}</td>
+            </tr>
+            """
+        return rows
+    
     html = "<div style='font-family: Arial, sans-serif; font-size: 13px;'>"
     
     # 使用可滚动容器，限制最大高度
@@ -771,21 +1341,7 @@ def format_metrics_for_display(metrics_data: Dict[str, Any]) -> str:
     # NameNode 指标（紧凑版）
     html += "<h4 style='color: #2c3e50; margin: 5px 0; font-size: 14px; border-bottom: 1px solid #3498db; padding-bottom: 3px;'>NameNode</h4>"
     html += "<table style='width: 100%; border-collapse: collapse; margin-bottom: 10px; font-size: 12px;'>"
-    
-    if metrics_data["namenode"].get("status") == "error":
-        html += f"<tr><td colspan='3' style='color: red; padding: 5px; font-size: 11px;'>❌ {metrics_data['namenode'].get('error', '未知错误')}</td></tr>"
-    else:
-        for key, metric in metrics_data["namenode"].get("metrics", {}).items():
-            status_icon = "✅" if metric["status"] == "normal" else "⚠️"
-            status_color = "#27ae60" if metric["status"] == "normal" else "#e74c3c"
-            html += f"""
-            <tr style='border-bottom: 1px solid #f0f0f0;'>
-                <td style='padding: 4px 6px; font-weight: bold; width: 40%;'>{metric['name']}</td>
-                <td style='padding: 4px 6px; width: 35%;'>{metric['value']}</td>
-                <td style='padding: 4px 6px; color: {status_color}; width: 25%; font-size: 11px;'>{status_icon}</td>
-            </tr>
-            """
-    
+    html += metric_rows("namenode", metrics_data["namenode"])
     html += "</table>"
     
     # DataNode 指标（紧凑版）
@@ -794,28 +1350,12 @@ def format_metrics_for_display(metrics_data: Dict[str, Any]) -> str:
     for node_name, node_data in metrics_data["datanodes"].items():
         html += f"<div style='margin-bottom: 8px;'><strong style='color: #34495e; font-size: 12px;'>{node_name}</strong></div>"
         html += "<table style='width: 100%; border-collapse: collapse; margin-bottom: 8px; font-size: 12px;'>"
-        
-        if node_data.get("status") == "error":
-            html += f"<tr><td colspan='3' style='color: red; padding: 5px; font-size: 11px;'>❌ {node_data.get('error', '未知错误')}</td></tr>"
-        else:
-            for key, metric in node_data.get("metrics", {}).items():
-                status_icon = "✅" if metric["status"] == "normal" else "⚠️"
-                status_color = "#27ae60" if metric["status"] == "normal" else "#e74c3c"
-                # 直接显示指标名称（已去掉前缀）
-                metric_name = metric['name']
-                html += f"""
-                <tr style='border-bottom: 1px solid #f0f0f0;'>
-                    <td style='padding: 4px 6px; font-weight: bold; width: 40%;'>{metric_name}</td>
-                    <td style='padding: 4px 6px; width: 35%;'>{metric['value']}</td>
-                    <td style='padding: 4px 6px; color: {status_color}; width: 25%; font-size: 11px;'>{status_icon}</td>
-                </tr>
-                """
-        
+        html += metric_rows(node_name, node_data)
         html += "</table>"
     
     html += "</div>"  # 结束滚动容器
     
-    html += f"<p style='color: #7f8c8d; font-size: 11px; margin-top: 8px; text-align: right;'>更新: {metrics_data['timestamp']}</p>"
+    html += f"<p id='mc-updated' style='color: #7f8c8d; font-size: 11px; margin-top: 8px; text-align: right;'>{cells['mc-updated']}</p>"
     html += "</div>"
     
     return html
@@ -181,7 +181,8 @@ class OperationMapper:
             kb_manager = get_kb_manager()
             operation_kb = kb_manager.get_or_create_kb("OperationKB")
             
-            # 添加操作模板到知识库
+            # 添加操作模板到知识库（一次批量写入）
+            texts, metadatas = [], []
             for template_key, template_value in self.operation_kb.items():
                 metadata = {
                     "template_key": template_key,
@@ -193,12 +194,10 @@ class OperationMapper:
                     "parameters": json.dumps(template_value.get("parameters", {})),
                 }
                 
-                operation_kb.add_texts(
-                    texts=[f"{template_key}: {template_value.get('description', '')}"],
-                    metadatas=[metadata]
-                )
+                texts.append(f"{template_key}: {template_value.get('description', '')}")
+                metadatas.append(metadata)
             
-            operation_kb.save()
+            operation_kb.add_texts(texts=texts, metadatas=metadatas)
         except Exception as e:
             logging.warning(f"创建操作知识库失败: {e}")
     
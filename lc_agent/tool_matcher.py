@@ -7,31 +7,32 @@
 
 import os
 import json
+import hashlib
 import numpy as np
 from typing import List, Dict, Callable, Optional, Tuple
 import logging
 
-# 设置sentence-transformers模型缓存目录为D:\models
-# Windows路径处理：使用 os.path.join("D:\\", "models") 或直接使用 "D:\\models"
-MODEL_CACHE_DIR = os.path.join("D:\\", "models")  # Windows正确格式
-os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
-# 设置环境变量（sentence-transformers会使用这个目录）
-os.environ['TRANSFORMERS_CACHE'] = MODEL_CACHE_DIR
-os.environ['HF_HOME'] = MODEL_CACHE_DIR
-
-# 如果使用sentence-transformers
 try:
-    from sentence_transformers import SentenceTransformer
-    SENTENCE_TRANSFORMER_AVAILABLE = True
+    from .embedding_service import get_embedding_service, SIMPLE_EMBEDDING_DIM
 except ImportError:
-    SENTENCE_TRANSFORMER_AVAILABLE = False
-    logging.warning("sentence-transformers未安装，将使用简化版嵌入模型")
+    from lc_agent.embedding_service import get_embedding_service, SIMPLE_EMBEDDING_DIM
+
+# 工具嵌入向量缓存：一个矩阵文件（启动时 mmap 一次读入）+ 清单（工具名 -> 内容哈希、行号）
+EMBEDDING_MANIFEST_FILE = "manifest.json"
+EMBEDDING_MATRIX_PREFIX = "embeddings"
+
+
+def tool_embedding_key(model_id: str, tool_name: str, description: str) -> str:
+    """工具嵌入向量的缓存键：模型、工具名或描述任一变化都会使缓存失效"""
+    return hashlib.sha1(json.dumps([model_id, tool_name, description], ensure_ascii=False).encode("utf-8")).hexdigest()
 
 
 def sentence_embedding(sentence: str, model: str = "sentence-transformer") -> List[float]:
     """
     生成句子嵌入向量
     
+    使用进程共享的嵌入服务（模型只加载一次，结果按文本哈希缓存）。
+    
     Args:
         sentence: 输入句子
         model: 模型类型
@@ -39,35 +40,23 @@ def sentence_embedding(sentence: str, model: str = "sentence-transformer") -> Li
     Returns:
         嵌入向量列表
     """
-    if model == "sentence-transformer" and SENTENCE_TRANSFORMER_AVAILABLE:
-        try:
-            model_path = os.path.join(
-                os.path.dirname(os.path.dirname(__file__)),
-                "models/sentence-transformer"
-            )
-            if os.path.exists(model_path):
-                embedder = SentenceTransformer(model_path)
-            else:
-                # 使用在线模型，指定缓存目录为D:\models
-                embedder = SentenceTransformer(
-                    'sentence-transformers/all-mpnet-base-v2',
-                    cache_folder=MODEL_CACHE_DIR
-                )
-            
-            embedding = embedder.encode(sentence, convert_to_numpy=True).tolist()
-            return embedding
-        except Exception as e:
-            logging.warning(f"加载sentence-transformer失败: {e}，使用简化版")
-            return _simple_embedding(sentence)
-    else:
-        return _simple_embedding(sentence)
+    if model == "sentence-transformer":
+        service = get_embedding_service()
+        if service.available:
+            return service.encode_one(sentence).tolist()
+    return _simple_embedding(sentence)
+
+
+def sentence_embeddings(sentences: List[str]) -> np.ndarray:
+    """批量生成句子嵌入向量（float32 矩阵，每行一个句子）"""
+    return get_embedding_service().encode(sentences)
 
 
 def _simple_embedding(sentence: str) -> List[float]:
     """简化版嵌入（实际应用中应使用真实嵌入模型）"""
     logging.warning("使用简化版嵌入，建议安装sentence-transformers")
     # 返回固定长度的零向量（实际应用中应使用真实嵌入）
-    return [0.0] * 384
+    return [0.0] * SIMPLE_EMBEDDING_DIM
 
 
 def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
@@ -107,11 +96,22 @@ class ToolRegistry:
             embedding_dir: 嵌入向量存储目录
         """
         self.tools: Dict[str, Dict] = {}
+        # 所有工具嵌入向量堆叠成的矩阵（float32，每行已归一化，第 i 行对应 _tool_names[i]），
+        # 匹配时一次矩阵-向量乘法得到所有工具的余弦相似度
+        self._tool_names: List[str] = []
+        self._tool_index: Dict[str, int] = {}
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._valid = np.zeros(0, dtype=bool)  # 零向量（简化版嵌入）的行，相似度按 0 处理
         self.embedding_dir = embedding_dir or os.path.join(
             os.path.dirname(os.path.dirname(__file__)),
             "tools/embeddings"
         )
         os.makedirs(self.embedding_dir, exist_ok=True)
+        # 嵌入向量缓存（清单 + mmap 的矩阵）
+        self._manifest: Dict[str, Dict] = {}
+        self._matrix_file: Optional[str] = None
+        self._cached_vectors: Optional[np.ndarray] = None
+        self._load_embedding_cache()
     
     def register_tool(
         self,
@@ -129,35 +129,157 @@ class ToolRegistry:
             description: 工具描述
             force_regenerate: 是否强制重新生成嵌入向量
         """
-        embedding_file = os.path.join(self.embedding_dir, f"{tool_name}.npy")
+        self.register_tools([(tool_name, tool_func, description)], force_regenerate)
+    
+    def register_tools(
+        self,
+        tools: List[Tuple[str, Callable, str]],
+        force_regenerate: bool = False
+    ):
+        """
+        批量注册工具
         
-        # 尝试加载已存在的嵌入向量
-        if os.path.exists(embedding_file) and not force_regenerate:
-            try:
-                embedding = np.load(embedding_file).tolist()
-                logging.info(f"加载工具 {tool_name} 的嵌入向量")
-            except Exception as e:
-                logging.warning(f"加载嵌入向量失败: {e}，重新生成")
-                embedding = None
-        else:
-            embedding = None
+        嵌入向量按 (模型, 工具名, 描述) 的哈希从缓存读取；缓存中没有或已过期的工具
+        一次批量编码，并只写一次缓存文件。
+        
+        Args:
+            tools: [(工具名称, 工具函数, 工具描述), ...]
+            force_regenerate: 是否强制重新生成嵌入向量
+        """
+        service = get_embedding_service()
+        model_id = service.model_id
+        embeddings: Dict[str, np.ndarray] = {}
+        stale: List[Tuple[str, str, str]] = []
+        for tool_name, _, description in tools:
+            key = tool_embedding_key(model_id, tool_name, description)
+            entry = self._manifest.get(tool_name)
+            if not force_regenerate and entry and entry["key"] == key and self._cached_vectors is not None:
+                embeddings[tool_name] = np.array(self._cached_vectors[entry["row"]], dtype=np.float32)
+            else:
+                stale.append((tool_name, description, key))
         
-        # 如果没有嵌入向量，生成新的
-        if embedding is None:
+        if stale:
             # 构建查询字符串：工具名 + 描述
-            query = f"{tool_name} {description}"
-            embedding = sentence_embedding(query)
-            
-            # 保存嵌入向量
-            np.save(embedding_file, np.array(embedding))
-            logging.info(f"为工具 {tool_name} 生成并保存嵌入向量")
+            vectors = sentence_embeddings([f"{tool_name} {description}" for tool_name, description, _ in stale])
+            for (tool_name, _, _), vector in zip(stale, vectors):
+                embeddings[tool_name] = vector
+            logging.info(f"为 {len(stale)} 个工具生成嵌入向量")
+            # 简化版嵌入（模型不可用）的零向量不写入缓存
+            if service.available:
+                self._save_embedding_cache({
+                    tool_name: (key, embeddings[tool_name]) for tool_name, _, key in stale
+                })
+        
+        for tool_name, tool_func, description in tools:
+            embedding = embeddings[tool_name].tolist()
+            # 注册工具
+            self.tools[tool_name] = {
+                "func": tool_func,
+                "description": description,
+                "embedding": embedding
+            }
+            self._set_matrix_row(tool_name, embedding)
+    
+    def _load_embedding_cache(self):
+        """读取清单，并把矩阵文件 mmap 进来（各工具的向量在注册时按行号取用）"""
+        manifest_path = os.path.join(self.embedding_dir, EMBEDDING_MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            matrix_file = manifest["matrix"]
+            vectors = np.load(os.path.join(self.embedding_dir, matrix_file), mmap_mode="r")
+            entries = manifest["tools"]
+            if vectors.ndim != 2 or any(entry["row"] >= vectors.shape[0] for entry in entries.values()):
+                raise ValueError("清单与矩阵文件不一致")
+        except Exception as e:
+            logging.warning(f"加载工具嵌入向量缓存失败: {e}，将重新生成")
+            return
+        self._manifest = entries
+        self._matrix_file = matrix_file
+        self._cached_vectors = vectors
+        logging.info(f"加载 {len(entries)} 个工具的嵌入向量缓存")
+    
+    def _save_embedding_cache(self, updates: Dict[str, Tuple[str, np.ndarray]]):
+        """
+        合并新向量后重写缓存：先写新的矩阵文件，再原子替换清单，最后删除旧矩阵文件，
+        写入中途中断时旧缓存仍然有效
+        
+        Args:
+            updates: {工具名: (缓存键, 向量)}
+        """
+        dim = next(iter(updates.values()))[1].shape[0]
+        entries, rows = {}, []
+        for tool_name, entry in self._manifest.items():
+            # 保留其它工具的缓存（维度不同的旧模型向量丢弃）
+            if tool_name in updates or self._cached_vectors is None:
+                continue
+            if self._cached_vectors.shape[1] != dim:
+                break
+            entries[tool_name] = {"key": entry["key"], "row": len(rows)}
+            rows.append(np.array(self._cached_vectors[entry["row"]], dtype=np.float32))
+        for tool_name, (key, vector) in updates.items():
+            entries[tool_name] = {"key": key, "row": len(rows)}
+            rows.append(np.asarray(vector, dtype=np.float32))
         
-        # 注册工具
-        self.tools[tool_name] = {
-            "func": tool_func,
-            "description": description,
-            "embedding": embedding
-        }
+        old_matrix_file = self._matrix_file
+        # 矩阵文件名带代号（embeddings-<n>.npy），新旧文件不会互相覆盖
+        generation = 1
+        if old_matrix_file:
+            try:
+                generation = int(os.path.splitext(old_matrix_file)[0].rsplit("-", 1)[-1]) + 1
+            except ValueError:
+                pass
+        matrix_file = f"{EMBEDDING_MATRIX_PREFIX}-{generation}.npy"
+        manifest_path = os.path.join(self.embedding_dir, EMBEDDING_MANIFEST_FILE)
+        try:
+            with open(os.path.join(self.embedding_dir, matrix_file), "wb") as f:
+                np.save(f, np.stack(rows))
+            with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"matrix": matrix_file, "dim": dim, "tools": entries}, f, ensure_ascii=False)
+            os.replace(manifest_path + ".tmp", manifest_path)
+        except Exception as e:
+            logging.warning(f"保存工具嵌入向量缓存失败: {e}")
+            return
+        
+        # 释放旧矩阵的 mmap 后再删除旧文件（Windows 下被映射的文件无法删除）
+        self._cached_vectors = None
+        self._manifest = {}
+        self._load_embedding_cache()
+        if old_matrix_file and old_matrix_file != matrix_file:
+            try:
+                os.remove(os.path.join(self.embedding_dir, old_matrix_file))
+            except OSError:
+                pass
+    
+    def _set_matrix_row(self, tool_name: str, embedding: List[float]):
+        """把工具的嵌入向量（归一化后）写入矩阵：已注册的工具替换对应行，新工具追加一行"""
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = float(np.linalg.norm(vector))
+        if norm > 0:
+            vector = vector / norm
+        
+        if self._matrix.shape[0] and self._matrix.shape[1] != vector.shape[0]:
+            # 维度变化（换了嵌入模型）：丢弃旧矩阵，用已注册工具的向量重建
+            logging.warning("工具嵌入向量维度变化，重建匹配矩阵")
+            self._tool_names, self._tool_index = [], {}
+            self._matrix = np.zeros((0, vector.shape[0]), dtype=np.float32)
+            self._valid = np.zeros(0, dtype=bool)
+            for name, info in self.tools.items():
+                if name != tool_name and len(info["embedding"]) == vector.shape[0]:
+                    self._set_matrix_row(name, info["embedding"])
+        
+        row = self._tool_index.get(tool_name)
+        if row is None:
+            self._tool_index[tool_name] = len(self._tool_names)
+            self._tool_names.append(tool_name)
+            matrix = self._matrix if self._matrix.shape[0] else np.zeros((0, vector.shape[0]), dtype=np.float32)
+            self._matrix = np.vstack([matrix, vector[np.newaxis, :]])
+            self._valid = np.append(self._valid, norm > 0)
+        else:
+            self._matrix[row] = vector
+            self._valid[row] = norm > 0
     
     def match_tools(
         self,
@@ -176,28 +298,64 @@ class ToolRegistry:
         Returns:
             [(工具名, 相似度), ...] 列表，按相似度降序排列
         """
-        if not self.tools:
-            return []
+        return self.match_tools_batch([user_query], top_k, threshold)[0]
+    
+    def match_tools_batch(
+        self,
+        user_queries: List[str],
+        top_k: int = 3,
+        threshold: float = 0.5
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        批量匹配：所有查询一次批量编码，一次矩阵乘法得到全部相似度
+        
+        Args:
+            user_queries: 用户查询列表
+            top_k: 每个查询返回top_k个工具
+            threshold: 相似度阈值（与 cosine_similarity 相同，归一化到0-1）
+        
+        Returns:
+            与 user_queries 一一对应的 [(工具名, 相似度), ...] 列表
+        """
+        if not self.tools or not user_queries or top_k <= 0:
+            return [[] for _ in user_queries]
         
-        # 生成查询的嵌入向量
-        query_embedding = sentence_embedding(user_query)
+        query_matrix = sentence_embeddings(user_queries)
+        return self._match_embeddings(query_matrix, top_k, threshold)
+    
+    def _match_embeddings(
+        self,
+        query_matrix: np.ndarray,
+        top_k: int,
+        threshold: float
+    ) -> List[List[Tuple[str, float]]]:
+        query_matrix = np.asarray(query_matrix, dtype=np.float32)
+        if query_matrix.shape[1] != self._matrix.shape[1]:
+            logging.warning(
+                f"查询向量维度 {query_matrix.shape[1]} 与工具向量维度 {self._matrix.shape[1]} 不一致，无法匹配"
+            )
+            return [[] for _ in range(query_matrix.shape[0])]
         
-        # 计算与所有工具的相似度
-        similarities = {}
-        for tool_name, tool_info in self.tools.items():
-            similarity = cosine_similarity(query_embedding, tool_info["embedding"])
-            if similarity >= threshold:
-                similarities[tool_name] = similarity
+        norms = np.linalg.norm(query_matrix, axis=1, keepdims=True)
+        query_valid = norms[:, 0] > 0
+        query_matrix = np.divide(query_matrix, norms, out=np.zeros_like(query_matrix), where=norms > 0)
         
-        # 按相似度排序
-        sorted_tools = sorted(
-            similarities.items(),
-            key=lambda x: x[1],
-            reverse=True
-        )
+        # (查询数, 工具数) 的余弦相似度，归一化到0-1；零向量的相似度为 0（与 cosine_similarity 一致）
+        scores = (query_matrix @ self._matrix.T + 1.0) / 2.0
+        scores[~query_valid, :] = 0.0
+        scores[:, ~self._valid] = 0.0
         
-        # 返回top_k
-        return sorted_tools[:top_k]
+        k = min(top_k, scores.shape[1])
+        results = []
+        for row in scores:
+            # argpartition 取出 top_k 候选（O(n)），只对这 k 个排序
+            candidates = np.argpartition(-row, k - 1)[:k] if k < row.shape[0] else np.arange(row.shape[0])
+            candidates = candidates[np.argsort(-row[candidates], kind="stable")]
+            results.append([
+                (self._tool_names[i], float(row[i]))
+                for i in candidates if row[i] >= threshold
+            ])
+        return results
     
     def get_tool(self, tool_name: str) -> Optional[Callable]:
         """获取工具函数"""
@@ -256,6 +414,24 @@ def match_tools_for_query(
     return [tool_name for tool_name, _ in matched]
 
 
+def match_tools_for_queries(
+    user_queries: List[str],
+    top_k: int = 3,
+    threshold: float = 0.5
+) -> List[List[str]]:
+    """
+    为多个查询批量匹配工具（便捷函数）
+    
+    Returns:
+        与 user_queries 一一对应的工具名称列表
+    """
+    registry = get_tool_registry()
+    return [
+        [tool_name for tool_name, _ in matched]
+        for matched in registry.match_tools_batch(user_queries, top_k, threshold)
+    ]
+
+
 if __name__ == "__main__":
     # 测试代码
     logging.basicConfig(level=logging.INFO)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志行解析微基准：对比旧实现（每行多次 re.search / upper）与 lc_agent.log_parser
+
+模拟一次完整的使用流程：读取时过滤 INFO/classpath 行，然后对同一批行做错误统计和关键词搜索。
+
+使用方法：
+    python test/bench_log_parser.py [日志文件路径]
+不指定文件时生成约 8MB 的模拟 Hadoop 日志
+"""
+
+import os
+import re
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lc_agent.log_parser import parse_log_line, parse_log_lines, _parse_log_line
+
+
+# ==================== 旧实现（从 agent.py 原样复制） ====================
+
+def legacy_should_filter_log_line(line, filter_info=True, filter_classpath=True):
+    if not line.strip():
+        return False
+    if filter_classpath:
+        if re.search(r'STARTUP_MSG:\s+classpath\s*=', line, re.IGNORECASE):
+            return True
+    if filter_info:
+        if re.search(r'\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}[,\s]+\d+\s+INFO\s+', line):
+            return True
+    return False
+
+
+def legacy_extract_timestamp(line):
+    patterns = [
+        r'\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}',
+        r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}',
+        r'\d{2}/\d{2}/\d{4}\s+\d{2}:\d{2}:\d{2}',
+    ]
+    for pattern in patterns:
+        match = re.search(pattern, line)
+        if match:
+            return match.group(0)
+    return None
+
+
+def legacy_pipeline(raw_lines):
+    kept = [line for line in raw_lines if not legacy_should_filter_log_line(line)]
+    lines = "".join(kept).split('\n')
+    errors, warnings, error_types = [], [], {}
+    for line in lines:
+        line_upper = line.upper()
+        if any(keyword in line_upper for keyword in ['ERROR', 'FATAL', 'CRITICAL', 'EXCEPTION']):
+            errors.append(legacy_extract_timestamp(line))
+        elif 'WARN' in line_upper:
+            warnings.append(legacy_extract_timestamp(line))
+    for line in lines:
+        if any(keyword in line.upper() for keyword in ['ERROR', 'FATAL', 'CRITICAL', 'EXCEPTION']):
+            for keyword in ['ERROR', 'FATAL', 'CRITICAL', 'EXCEPTION']:
+                if keyword in line.upper():
+                    error_types[keyword] = error_types.get(keyword, 0) + 1
+                    break
+    matches = sum(1 for line in lines if 'blk_' in line.lower())
+    return len(kept), len(errors), len(warnings), matches
+
+
+# ==================== 新实现 ====================
+
+def new_pipeline(raw_lines):
+    kept = [line for line in raw_lines if not parse_log_line(line).should_filter()]
+    lines = "".join(kept).split('\n')
+    errors, warnings, error_types = [], [], {}
+    for parsed in parse_log_lines(lines):
+        severity = parsed.severity
+        if severity == 'error':
+            errors.append(parsed.timestamp)
+            error_types[parsed.error_type] = error_types.get(parsed.error_type, 0) + 1
+        elif severity == 'warning':
+            warnings.append(parsed.timestamp)
+    matches = sum(1 for parsed in parse_log_lines(lines) if 'blk_' in parsed.lower)
+    return len(kept), len(errors), len(warnings), matches
+
+
+# ==================== 模拟日志 ====================
+
+def generate_hadoop_log(target_bytes=8 * 1024 * 1024, seed=42):
+    rng = random.Random(seed)
+    loggers = [
+        "org.apache.hadoop.hdfs.server.namenode.FSNamesystem",
+        "org.apache.hadoop.hdfs.server.datanode.DataNode",
+        "org.apache.hadoop.hdfs.StateChange",
+        "org.apache.hadoop.ipc.Server",
+    ]
+    lines = []
+    size = 0
+    n = 0
+    while size < target_bytes:
+        n += 1
+        ts = f"2024-01-{1 + n // 86400 % 28:02d} {n // 3600 % 24:02d}:{n // 60 % 60:02d}:{n % 60:02d},{n % 1000:03d}"
+        r = rng.random()
+        if r < 0.80:
+            line = f"{ts} INFO {rng.choice(loggers)}: BLOCK* allocate blk_{1073741825 + n}_{1000 + n}, replicas=172.18.0.{n % 250}:9866\n"
+        elif r < 0.90:
+            line = f"{ts} WARN {rng.choice(loggers)}: Slow BlockReceiver write packet to mirror took {n % 900}ms\n"
+        elif r < 0.95:
+            line = f"{ts} ERROR {rng.choice(loggers)}: IOException in offerService for blk_{1073741825 + n}\n"
+        else:
+            line = f"\tat org.apache.hadoop.hdfs.server.datanode.BPServiceActor.offerService(BPServiceActor.java:{n % 900})\n"
+        lines.append(line)
+        size += len(line)
+    return lines
+
+
+def bench(name, func, raw_lines, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        _parse_log_line.cache_clear()
+        start = time.perf_counter()
+        result = func(raw_lines)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<10} {best:8.3f}s  {len(raw_lines) / best:12,.0f} lines/s  result={result}")
+    return best, result
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "r", encoding="utf-8", errors="ignore") as f:
+            raw_lines = f.readlines()
+    else:
+        raw_lines = generate_hadoop_log()
+
+    total_bytes = sum(len(line) for line in raw_lines)
+    print(f"日志: {len(raw_lines):,} 行, {total_bytes / 1024 / 1024:.1f} MB")
+    legacy_time, legacy_result = bench("legacy", legacy_pipeline, raw_lines)
+    new_time, new_result = bench("parser", new_pipeline, raw_lines)
+    print(f"加速比: {legacy_time / new_time:.2f}x")
+    if legacy_result != new_result:
+        print(f"[WARN] 结果不一致: legacy={legacy_result}, parser={new_result}")
+
+
+if __name__ == "__main__":
+    main()